@@ -19,7 +19,8 @@ from scripts.prediction import (
   get_highest_aqi
 )
 from scripts.language_utils import get_text
-from scripts.map_helpers import stations_data, forecast_data, list_of_stations
+from scripts.data_layer import get_stations_data, get_climatology, get_station_forecast, get_snapshot
+from scripts.instrumentation import stage
 from scripts.data_handler import (
   get_current_hour_data, 
   get_all_stations, 
@@ -61,18 +62,14 @@ def create_aqi_header(aqi_range, lang):
     </div>
   """
 
+@stage('get_24hr_forecast', 'compute')
 def get_24hr_forecast(data, selected_station, metric='temperature', lang='en'):
    # Get the current time rounded to nearest hour
   current_datetime = round_to_nearest_hour(datetime.now())
-  
-  data = data.copy()
-  data = data[data['station'] == selected_station]
 
-  # get forecast_df
-  BASE_DIR = Path(__file__).resolve().parent.parent
+  # get forecast_df, cached until the forecast file changes
   acronym = STATION_ACRONYMS.get(selected_station)
-  forecast_dir = BASE_DIR / 'Dashboard_data' / 'forecast_data' / f'{acronym}_forecast.xlsx'
-  selected_forecast_data = pd.read_excel(forecast_dir, parse_dates=['datetime'])
+  selected_forecast_data = get_station_forecast(acronym)
   naive_24h_df = calculate_pollutant_time_only(selected_forecast_data, current_datetime, metric, acronym)
 
   chart = alt.Chart(naive_24h_df).mark_line(
@@ -156,12 +153,17 @@ def home():
       *{format_datetime(nearest_hour, 'MMMM d, H:00 a', locale=lang)}* - *{format_datetime(end_hour, 'MMMM d, H:00 a', locale=lang)}*
     """)
 
+  with stage('stations_and_climatology', 'load'):
+    stations_data = get_stations_data()
+    climatology = get_climatology()
+
   # get AQI ranges
-  aqi_range = get_highest_aqi(forecast_data, selected_station, True)
+  with stage('highest_index', 'compute'):
+    aqi_range = get_highest_aqi(None, selected_station, True, snapshot=get_snapshot())
 
   with st.container():
     st.markdown(create_aqi_header(aqi_range, lang), unsafe_allow_html=True)
-  wind_dir = get_wind_dir(int(naive_formula(stations_data, 'WDR', selected_station)))
+  wind_dir = get_wind_dir(int(naive_formula(stations_data, 'WDR', selected_station, climatology)))
 
   with st.container():
     st.write(f"""
@@ -169,17 +171,17 @@ def home():
         
         <div class="forecast-thw-column">
           <span class="thw-header">{get_text('temperature', lang)}</span>
-          <h3>{"{:.1f}°C".format(naive_formula(stations_data, 'TMP', selected_station))}</h3>
+          <h3>{"{:.1f}°C".format(naive_formula(stations_data, 'TMP', selected_station, climatology))}</h3>
         </div>
              
         <div class="forecast-thw-column">
           <span class="thw-header">{get_text('relative_humidity', lang)}</span>
-          <h3>{"{:.0f}%".format(naive_formula(stations_data, 'RH', selected_station))}</h3>
+          <h3>{"{:.0f}%".format(naive_formula(stations_data, 'RH', selected_station, climatology))}</h3>
         </div>
              
         <div class="forecast-thw-column">
           <span class="thw-header">{get_text('wind_speed', lang)}</span>
-          <h3>{"{:.0f} km/h".format(naive_formula(stations_data, 'WSP', selected_station))}</h3>
+          <h3>{"{:.0f} km/h".format(naive_formula(stations_data, 'WSP', selected_station, climatology))}</h3>
         </div>
 
         <div class="forecast-thw-column">
@@ -196,7 +198,7 @@ def home():
   
   today = pd.Timestamp.now().date()
   day_fig = get_24hr_forecast(stations_data, selected_station, pollutant_selection, lang)
-  with st.container():
+  with st.container(), stage('altair_chart', 'render'):
     st.altair_chart(day_fig, use_container_width=True)
 
   st.write('*The forecast data listed above is approximately 85% accurate based on multiple tests.*')
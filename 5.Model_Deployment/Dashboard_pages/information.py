@@ -5,12 +5,9 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from scripts.language_utils import get_text
 from scripts.data_handler import get_current_hour_data, get_some_stations, round_to_nearest_hour
-from scripts.map_helpers import stations_data, forecast_data
+from scripts.data_layer import get_forecast_slice, get_snapshot
 from scripts.prediction import get_highest_aqi
-
-# Get current data of stations and forecast of the stations
-data = stations_data
-forecast = forecast_data
+from scripts.instrumentation import stage
 
 df_guidelines_en = pd.read_csv(Path(__file__).resolve().parent.parent / 'Dashboard_data' / 'Merged Table Guidelines EN.csv')
 df_guidelines_es = pd.read_csv(Path(__file__).resolve().parent.parent / 'Dashboard_data' / 'Merged Table Guidelines ES.csv', encoding='latin1')
@@ -135,6 +132,10 @@ def information_page():
     lang = st.session_state.language
 
     selected_station = st.selectbox((get_text('station', lang)).capitalize(), get_some_stations())
+
+    # Forecast of the selected station, cached until the forecast files change
+    with stage('forecast_slice', 'load'):
+        forecast = get_forecast_slice(selected_station)
     formatted_date, current_time = get_date_time(lang)
     st.markdown(
                 f"""
@@ -158,10 +159,12 @@ def information_page():
                     "MER": "Merced"}
 
     # get AQI ranges
-    forecast_index = get_highest_aqi(forecast, selected_station, forecast=True)
+    with stage('highest_index', 'compute'):
+        snapshot = get_snapshot()
+        forecast_index = get_highest_aqi(None, selected_station, forecast=True, snapshot=snapshot)
 
-    # Get the time of the indexes
-    forecast_time_index = get_highest_aqi(forecast, selected_station, forecast=True, output='time')
+        # Get the time of the indexes
+        forecast_time_index = get_highest_aqi(None, selected_station, forecast=True, output='time', snapshot=snapshot)
     
     # Page title and description
     st.title(get_text('information', lang))
@@ -210,13 +213,14 @@ def information_page():
     start_hour = datetime.strptime(start_time_str, "%H:%M").hour
     end_hour = datetime.strptime(end_time_str, "%H:%M").hour
 
-    # Filter the data according to the selected station and time
-    filtered_data = forecast_data[(forecast_data['station'] == selected_station) & (forecast_data['datetime'].dt.hour >= start_hour) & (forecast_data['datetime'].dt.hour < end_hour)]
-    filtered_data = filtered_data[['datetime', 'AirQualityIndex']]
+    with stage('guidelines', 'compute'):
+        # Filter the data according to the selected station and time
+        filtered_data = forecast[(forecast['datetime'].dt.hour >= start_hour) & (forecast['datetime'].dt.hour < end_hour)]
+        filtered_data = filtered_data[['datetime', 'AirQualityIndex']]
 
-    # Merge the filtered data with the guidelines data
-    merged_data_en = pd.merge(filtered_data, df_guidelines_en, left_on='AirQualityIndex', right_on='Index', how='left')
-    merged_data_es = pd.merge(filtered_data, df_guidelines_es, left_on='AirQualityIndex', right_on='Index', how='left')
+        # Merge the filtered data with the guidelines data
+        merged_data_en = pd.merge(filtered_data, df_guidelines_en, left_on='AirQualityIndex', right_on='Index', how='left')
+        merged_data_es = pd.merge(filtered_data, df_guidelines_es, left_on='AirQualityIndex', right_on='Index', how='left')
 
     # Display the table according to the selected group and language
     if option_group == get_text('general_population', lang) and lang == 'en':
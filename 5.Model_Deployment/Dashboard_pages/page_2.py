@@ -6,21 +6,18 @@ from datetime import datetime
 import locale
 import pandas as pd
 from pathlib import Path
-from streamlit_folium import folium_static, st_folium
 from streamlit.components.v1 import html
-from scripts.map_helpers import classical_map, geojson_data, stations_data, forecast_data
-from scripts.prediction import calculate_pollutant_weighted_average, get_highest_aqi
+from scripts.map_helpers import map_html
+from scripts.data_layer import get_stations_data, get_forecast_data, get_nowcast, get_snapshot
+from scripts.prediction import get_highest_aqi
 from scripts.language_utils import get_text
 from scripts.data_handler import get_current_hour_data, load_data
 from scripts.data_handler import STATION_COORDINATES
-
-# Get current data of stations and forecast of the stations
-data = stations_data
-forecast = forecast_data
+from scripts.aqi_index import categorize, category_name
+from scripts.instrumentation import stage
 
 # Set locale to Spanish (replace 'es_MX' with your system's Spanish locale if needed)
 #locale.setlocale(locale.LC_TIME, "es_ES.UTF-8")  # Use "es_MX.UTF-8" for Mexico-specific locale
-temperature = int(data["TMP"][-1:].values[0])  # Replace with dynamic temperature value
 
 # Function to get formatted date and time in a specific language
 # def get_date_time(lang):
@@ -213,47 +210,31 @@ def air_message(index: int, population_type: str, lang: str) -> str:
     # Return the message
     return air_quality_data[index][lang][population_type]
 
-# Define pollutant thresholds as a constant dictionary
-POLLUTANT_THRESHOLDS = {
-    'CO': [5.00, 9.00, 12.00, 16.00],
-    'PM25': [45.00, 60.00, 132.00, 213.00],
-    'PM10': [15.00, 33.00, 79.00, 130.00],
-    'SO2': [0.0035, 0.0075, 0.185, 0.304],
-    'O3': [0.0058, 0.0090, 0.135, 0.175],
-    'NO2': [0.0053, 0.0106, 0.160, 0.213]
-}
-
-# Define categories as a constant list
-CATEGORIES = [f"Buena", "Aceptable", "Mala", "Muy Mala", "Extremadamente Mala"]
-
 def get_air_quality_category(pollutant, value):
     """
     Determines the air quality category based on pollutant measurements.
 
     Parameters:
         pollutant (str): The type of pollutant being measured
-        value (float): The measurement value
+        value (float): The measurement value, in the units of the station files
 
     Returns:
         str: The air quality category
     """
-    if pollutant not in POLLUTANT_THRESHOLDS:
-        raise ValueError(f"Unknown pollutant: {pollutant}")
-
-    thresholds = POLLUTANT_THRESHOLDS[pollutant]
-    
-    for i, threshold in enumerate(thresholds):
-        if value <= threshold:
-            return CATEGORIES[i]
-    
-    return CATEGORIES[-1]
+    # Same NOM breakpoints as the forecaster (raises ValueError for unknown pollutants)
+    return category_name(categorize(value, pollutant))
 
 
 def new_home():
     
     lang = st.session_state.language
 
-    data = stations_data
+    # Get current data of stations and forecast of the stations
+    with stage('stations_and_forecast', 'load'):
+        data = get_stations_data()
+        forecast = get_forecast_data()
+
+    temperature = int(data["TMP"][-1:].values[0])  # Replace with dynamic temperature value
 
     # Store the initial value of widgets in session state
     if "visibility" not in st.session_state:
@@ -355,26 +336,22 @@ def new_home():
     with col1:
         # Update map based on selected zone
         selected_zone = option
-        if selected_zone == None:
-            m = classical_map(data=geojson_data)
-            st_folium(m, width=800, height=800)
-        else:
-            filtered_geojson_data = {
-                "type": "FeatureCollection",
-                "features": [
-                    feature for feature in geojson_data["features"]
-                    if feature["properties"]["station"] == selected_zone
-                ]
-            }
-            m = classical_map(data=filtered_geojson_data)
-            st_folium(m, width=800, height=800)
+        # Rendered once per language, zone and data version, shared between sessions
+        with stage('classical_map', 'compute'):
+            rendered_map = map_html(lang, selected_zone)
+        with stage('map_html', 'render'):
+            html(rendered_map, width=800, height=800)
 
     with col2:
         
-        data = stations_data
-        
         pollutants = ['PM25', 'PM10', 'SO2', 'O3', 'NO2', 'CO']
-        pollutant_values = {pollutant: calculate_pollutant_weighted_average(data, pollutant,station=selected_zone) for pollutant in pollutants}
+        # Rolling averages of the latest readings, kept up to date by the data layer
+        if selected_zone is not None:
+            with stage('nowcast', 'compute'):
+                nowcast = get_nowcast()
+                pollutant_values = {pollutant: nowcast.average(selected_zone, pollutant) for pollutant in pollutants}
+        else:
+            pollutant_values = {pollutant: 0 for pollutant in pollutants}
             
 
         # Get the markdown for the table and recommendations
@@ -400,8 +377,10 @@ def new_home():
         info_page = info_page_file_path.split('/')[1][0:-3]
         fore_page = fore_page_file_path.split('/')[1][0:-3]
         
-        select_index = get_highest_aqi(data, selected_zone)
-        forecast_index = get_highest_aqi(forecast, selected_zone, forecast=True)
+        with stage('highest_index', 'compute'):
+            snapshot = get_snapshot()
+            select_index = get_highest_aqi(None, selected_zone, snapshot=snapshot)
+            forecast_index = get_highest_aqi(None, selected_zone, forecast=True, snapshot=snapshot)
 
         # Content inside the bordered box
         st.markdown(
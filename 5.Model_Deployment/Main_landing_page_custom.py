@@ -1,5 +1,5 @@
 import streamlit as st
-from Dashboard_pages import page_2, forecast, information
+from scripts import instrumentation
 from scripts.language_utils import get_text
 from scripts.data_handler import get_current_hour_data, get_all_stations
 from datetime import datetime
@@ -93,6 +93,10 @@ def initialize_session_state():
 def main():
     initialize_session_state()
 
+    # Imported here so the first rerun's profile shows the data the pages load at import
+    with instrumentation.stage('import_pages', 'load'):
+        from Dashboard_pages import page_2, forecast, information
+
     # Sidebar
     with st.sidebar:
         # Title with emoji
@@ -135,6 +139,9 @@ def main():
 
         # Store the index instead of the page name
         st.session_state.page_index = page_options.index(page)
+        profile = instrumentation.current()
+        if profile is not None:
+            profile.page = ('main', 'forecast', 'information')[st.session_state.page_index]
 
         # Information section
         st.markdown("---")
@@ -185,7 +192,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # One profile per rerun, logged as a JSON line and shown in the sidebar with ?debug=1
+    with instrumentation.rerun() as profile:
+        main()
+    if instrumentation.debug_enabled():
+        with st.sidebar:
+            instrumentation.render_panel(profile)
 
 
 
@@ -0,0 +1,241 @@
+'''
+  JSON API over the dashboard data, for clients that poll it without Streamlit.
+
+  Serves the latest Air and Health index of every station, the 24-hour forecast of a
+  station per pollutant and the alcaldía choropleth as GeoJSON. The responses are
+  built from the same loaders as the data layer (`scripts.data_loaders`, Streamlit is
+  not imported) once per data version, serialized, and kept as bytes with their ETag and Last-Modified; a request
+  only compares a couple of headers and returns the stored body (or a 304), already
+  gzipped when the client accepts it. The versions (file modification
+  times) are checked at most every `CHECK_INTERVAL` seconds, and a rebuild runs in a
+  worker thread so the event loop keeps serving the previous payloads meanwhile.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.api [--host 0.0.0.0] [--port 8000]
+    uvicorn scripts.api:app
+'''
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, Response
+
+from scripts.aqi_index import POLLUTANTS, NO_DATA, category_name
+from scripts.data_loaders import STATIONS, stations_version, forecast_version, load_stations_data, load_forecast_data
+from scripts.data_handler import STATION_COORDINATES
+from scripts.station_snapshot import StationSnapshot
+from scripts.interpolation import AqiSurface, municipality_centroids
+from scripts.spatial_index import municipality_stations
+from scripts.geometry import choropleth
+from scripts.instrumentation import log_event
+
+# Seconds between checks of the data files for a new version
+CHECK_INTERVAL = 30
+# How long clients and proxies may reuse a response without asking again
+CACHE_CONTROL = 'public, max-age=60'
+# Responses smaller than this are not worth compressing, bytes
+GZIP_MINIMUM_SIZE = 1000
+
+HORIZON = 24
+
+logger = logging.getLogger(__name__)
+
+
+class Payload:
+    """A serialized response with its validators."""
+
+    def __init__(self, data, modified: float):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzipped = gzip.compress(self.body) if len(self.body) >= GZIP_MINIMUM_SIZE else None
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        # HTTP dates have a resolution of one second
+        self.modified = int(modified)
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+    def not_modified(self, request: Request) -> bool:
+        """Whether the client already holds this version (If-None-Match wins over If-Modified-Since)."""
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            return self.etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since is not None:
+            try:
+                return self.modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, request: Request) -> Response:
+        headers = {'ETag': self.etag, 'Last-Modified': self.last_modified, 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+        if self.gzipped is not None and 'gzip' in request.headers.get('accept-encoding', ''):
+            return Response(self.gzipped, media_type='application/json', headers={**headers, 'Content-Encoding': 'gzip'})
+        return Response(self.body, media_type='application/json', headers=headers)
+
+
+def _time(value) -> str:
+    return pd.Timestamp(value).isoformat()
+
+
+def _values(column: pd.Series) -> list:
+    """Readings as JSON numbers, NaN as null."""
+    return [None if np.isnan(value) else round(float(value), 3) for value in column.to_numpy(dtype=float)]
+
+
+def station_payloads(history: pd.DataFrame, forecast: pd.DataFrame) -> dict:
+    """'stations' (latest index of every station) and one 'forecast/{code}' per station."""
+    snapshot = StationSnapshot.build(history, forecast)
+    stations = []
+    payloads = {}
+    for code, name in STATIONS.items():
+        entry = {'code': code, 'name': name, **STATION_COORDINATES[name], 'index': None, 'category': None, 'datetime': None}
+        if snapshot.has_history(name):
+            reading = snapshot.latest_reading(name)
+            index = int(reading['AirQualityIndex'])
+            entry.update(index=index, category=category_name(index), datetime=_time(reading['datetime']))
+        stations.append(entry)
+
+        rows = forecast[forecast['station'] == name].sort_values('datetime').head(HORIZON)
+        payloads[f'forecast/{code}'] = {
+            'code': code,
+            'name': name,
+            'datetime': [_time(value) for value in rows['datetime']],
+            'index': [int(value) for value in rows['AirQualityIndex']],
+            'pollutants': {poll: _values(rows[poll]) for poll in POLLUTANTS if poll in rows},
+        }
+    payloads['stations'] = {'stations': stations}
+    return payloads
+
+
+def choropleth_payload(history: pd.DataFrame, forecast: pd.DataFrame) -> dict:
+    """
+    Alcaldía layer with the latest index of its station, or the one interpolated from
+    the stations around it (`estimated`), null when neither is known. Both are
+    categorized from the pollutant readings the same way (see scripts/interpolation.py).
+    """
+    surface = AqiSurface.build(history, forecast, {name: STATION_COORDINATES[name] for name in STATIONS.values()},
+                               municipality_centroids())
+    properties = {}
+    for name, station in municipality_stations(tuple(STATIONS.values())).items():
+        index, estimated = None, False
+        if station is not None and surface.has_station(station) and surface.station_index(station) != NO_DATA:
+            index = surface.station_index(station)
+        elif name in surface and surface.index(name) != NO_DATA:
+            index, estimated = surface.index(name), True
+        properties[name] = {'station': station, 'index': index, 'estimated': estimated}
+    return choropleth(properties, level='low')
+
+
+def build_payloads(versions: tuple) -> dict:
+    """Every response for one data version, keyed by path under /api."""
+    start = time.perf_counter()
+    history, forecast = load_stations_data(), load_forecast_data()
+    forecast = forecast.assign(datetime=pd.to_datetime(forecast['datetime']))
+    data = {**station_payloads(history, forecast), 'choropleth': choropleth_payload(history, forecast)}
+    modified = max((mtime for mtime in sum(versions, ()) if mtime is not None), default=0) / 1e9
+    payloads = {path: Payload(value, modified) for path, value in data.items()}
+    log_event('api_payloads', seconds=round(time.perf_counter() - start, 3), bytes=sum(len(p.body) for p in payloads.values()))
+    return payloads
+
+
+class PayloadStore:
+    """
+    Payloads of the latest data version, rebuilt in a thread when the files change.
+    A failed rebuild (e.g. a forecast file read while half written) keeps the previous
+    payloads and is retried after `check_interval`.
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.versions = None
+        self.payloads = {}
+        self.checked = float('-inf')
+        # Created by `refresh` inside the running loop: before Python 3.10 a lock is bound
+        # to the event loop current when it is created, which at import is not the
+        # server's one, and the module level store may outlive a loop (restarts, tests)
+        self._lock = None
+        self._loop = None
+
+    async def get(self, path: str) -> Payload:
+        # While another request rebuilds, the previous payloads keep being served
+        refreshing = self._lock is not None and self._lock.locked()
+        if time.monotonic() - self.checked >= self.check_interval and not (self.payloads and refreshing):
+            await self.refresh()
+        if not self.payloads:
+            raise HTTPException(status_code=503, detail='The data could not be loaded yet')
+        try:
+            return self.payloads[path]
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f'Unknown resource: {path}')
+
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # No await since the check, so only one lock is created per loop
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            if time.monotonic() - self.checked < self.check_interval:
+                # Another request refreshed while this one waited
+                return
+            try:
+                versions = await asyncio.to_thread(lambda: (stations_version(), forecast_version()))
+                if versions != self.versions:
+                    self.payloads = await asyncio.to_thread(build_payloads, versions)
+                    self.versions = versions
+            except Exception:
+                logger.exception('Could not rebuild the API payloads, serving the previous ones')
+            self.checked = time.monotonic()
+
+
+store = PayloadStore()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the payloads before the first request
+    await store.refresh()
+    yield
+
+
+app = FastAPI(title='Mexico City Air Quality API', lifespan=lifespan)
+
+
+@app.get('/api/stations')
+async def stations(request: Request):
+    """Latest Air and Health index of every station."""
+    return (await store.get('stations')).response(request)
+
+
+@app.get('/api/forecast/{code}')
+async def station_forecast(code: str, request: Request):
+    """Next 24 hours of a station (by acronym, e.g. MER): index and every pollutant."""
+    return (await store.get(f'forecast/{code.upper()}')).response(request)
+
+
+@app.get('/api/choropleth')
+async def alcaldias(request: Request):
+    """Alcaldía polygons with their index, as GeoJSON."""
+    return (await store.get('choropleth')).response(request)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the air quality JSON API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+  Air and Health index (Índice AIRE Y SALUD, NOM-172-SEMARNAT-2023) categories.
+
+  Every pollutant reading falls in one of five bands, from 1 (Buena) to 5
+  (Extremadamente Mala), and the index of an hour is the worst band of its
+  pollutants. The bands are looked up with `np.searchsorted` over the breakpoints,
+  so whole columns of a station history or forecast are categorized at once.
+
+  The NOM gives O3, NO2 and SO2 in ppm while the station files (RAMA) report them in
+  ppb; `units='station'` (the default) compares against breakpoints scaled to ppb.
+'''
+import numpy as np
+import pandas as pd
+
+POLLUTANTS = ['O3', 'NO2', 'SO2', 'CO', 'PM10', 'PM25']
+
+# Upper bound (inclusive) of the Buena, Aceptable, Mala and Muy Mala bands, anything
+# above the last one is Extremadamente Mala. ppm for gases, µg/m³ for particles.
+BREAKPOINTS = {
+    "O3": [0.058, 0.090, 0.135, 0.175],
+    "NO2": [0.053, 0.106, 0.160, 0.213],
+    "SO2": [0.035, 0.075, 0.185, 0.304],
+    "CO": [5, 9, 12, 16],
+    "PM10": [45, 60, 132, 213],
+    "PM25": [15, 33, 79, 130],
+}
+
+# Factor from the NOM units to the units of the station files
+STATION_UNITS = {"O3": 1000, "NO2": 1000, "SO2": 1000, "CO": 1, "PM10": 1, "PM25": 1}
+
+_BREAKPOINTS = {
+    'nom': {poll: np.array(bounds, dtype=float) for poll, bounds in BREAKPOINTS.items()},
+    'station': {poll: np.round(np.array(bounds, dtype=float) * STATION_UNITS[poll], 9) for poll, bounds in BREAKPOINTS.items()},
+}
+
+CATEGORIES = ["Buena", "Aceptable", "Mala", "Muy Mala", "Extremadamente Mala"]
+
+# Category of missing or negative readings, lower than every band so it never wins the max
+NO_DATA = 0
+
+
+def breakpoints(pollutant: str, units: str = 'station') -> np.ndarray:
+    if pollutant not in BREAKPOINTS:
+        raise ValueError(f"Unknown pollutant: {pollutant}")
+    return _BREAKPOINTS[units][pollutant]
+
+
+def categorize(values, pollutant: str, units: str = 'station') -> np.ndarray:
+    """Band (1-5) of every reading, `NO_DATA` for missing or negative ones."""
+    values = np.asarray(values, dtype=float)
+    categories = np.searchsorted(breakpoints(pollutant, units), values, side='left') + 1
+    valid = values >= 0  # False for NaN as well
+    return np.where(valid, categories, NO_DATA).astype(np.int8)
+
+
+def pollutant_categories(df: pd.DataFrame, station: str = None, pollutants: list = POLLUTANTS, units: str = 'station') -> pd.DataFrame:
+    """
+    Band of every pollutant of a frame, one column per pollutant.
+
+    Args:
+        df: Station history or forecast. Columns are `{pollutant}_{station}` when
+            `station` is given (the station file layout), `{pollutant}` otherwise.
+    """
+    columns = {}
+    for poll in pollutants:
+        column = f'{poll}_{station}' if station else poll
+        if column in df:
+            columns[poll] = categorize(df[column].to_numpy(), poll, units)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def air_index(df: pd.DataFrame, station: str = None, pollutants: list = POLLUTANTS, units: str = 'station') -> np.ndarray:
+    """Hourly index of a frame: the worst band of its pollutants, `NO_DATA` if none was measured."""
+    categories = pollutant_categories(df, station, pollutants, units)
+    if categories.empty:
+        return np.full(len(df), NO_DATA, dtype=np.int8)
+    return categories.to_numpy().max(axis=1)
+
+
+def category_name(category: int) -> str:
+    """Spanish name of a band, as published by the NOM."""
+    return CATEGORIES[int(category) - 1] if 1 <= category <= len(CATEGORIES) else "Sin datos"
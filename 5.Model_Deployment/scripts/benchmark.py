@@ -0,0 +1,347 @@
+'''
+  Benchmarks of the forecast job and the dashboard hot paths on synthetic data.
+
+  `run` builds a throwaway workspace next to nothing in the repository: a copy of the
+  app code, synthetic station histories shaped like the `*_merged_imputed.xlsx`
+  workbooks (same columns, dtypes and length) and stub LightGBM boosters trained on
+  noise but with the real feature names and model size. Every stage is then measured
+  in a fresh process inside that workspace:
+
+    forecast_run        `prediction.forecast_stations` for the dashboard stations
+    map_helpers_import  importing `scripts.map_helpers` with cold caches
+    classical_map       building the folium map and rendering its HTML
+    get_24hr_forecast   building the altair chart of the forecast page
+    new_home            a full rerun of the home page (Streamlit AppTest)
+
+  Wall times are taken over `--repeat` runs; peak memory and allocations (net
+  allocated blocks) come from one extra run under tracemalloc, which would otherwise
+  distort the times. `--baseline` compares with an earlier `--json` result and exits
+  with status 1 when a stage got slower than the tolerance.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.benchmark run [--stages forecast_run new_home] [--repeat 5]
+                                    [--json results.json] [--baseline old.json]
+'''
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+STAGES = ['forecast_run', 'map_helpers_import', 'classical_map', 'get_24hr_forecast', 'new_home']
+
+# The dashboard pages only show these stations
+STATIONS = ['PED', 'UIZ', 'BJU', 'MER']
+POLLUTANTS = ['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2']
+
+# Rows of the station workbooks
+HISTORY_HOURS = 26788
+
+# Size of the production boosters
+TREES = 200
+LEAVES = 50
+
+# Parts of the app copied into the workspace, data is generated
+CODE = ['scripts', 'Dashboard_pages', 'Main_landing_page_custom.py']
+STATIC_DATA = ['limite-de-las-alcaldas.json', 'translations', 'Merged Table Guidelines EN.csv', 'Merged Table Guidelines ES.csv']
+
+# Typical level and daily amplitude of every measured column
+LEVELS = {
+    'PM25': (22, 10), 'PM10': (40, 18), 'SO2': (3, 2), 'O3': (25, 20), 'NO2': (30, 12), 'CO': (0.5, 0.3),
+    'RH': (50, 20), 'TMP': (18, 6), 'WDR': (180, 90), 'WSP': (2, 1),
+}
+
+
+def synthetic_history(station: str, hours: int = HISTORY_HOURS, end=None, seed: int = 0) -> pd.DataFrame:
+    """Hourly history with the columns and dtypes of a station workbook, ending at `end`."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or pd.Timestamp.now().floor('h'))
+    dates = pd.date_range(end=end, periods=hours, freq='h').astype('datetime64[ns]')
+    daily = np.sin(2 * np.pi * (dates.hour.to_numpy() - 9) / 24)
+
+    df = pd.DataFrame({'datetime': dates})
+    df['direct_radiation (W/m²)'] = np.clip(600 * daily + rng.normal(0, 50, hours), 0, None).astype('int64')
+    for column, (level, amplitude) in LEVELS.items():
+        values = level + amplitude * daily + rng.normal(0, amplitude / 3, hours)
+        df[f'{column}_{station}'] = np.round(np.clip(values, 0, None), 2)
+    df['is_festival'] = (rng.random(hours) < 0.05).astype('int64')
+    df['is_weekend'] = (dates.dayofweek >= 5).astype('int64')
+    df['AirQualityIndex'] = rng.integers(1, 6, hours).astype('int64')
+    return df
+
+
+def model_feature_names(pollutant: str, station: str) -> list:
+    """Feature names, in order, of the production model of a series."""
+    return ['direct_radiation_(W/m²)', f'RH_{station}', f'TMP_{station}', f'WDR_{station}', f'WSP_{station}',
+            'is_festival', 'is_weekend', *[f'{pollutant}_{station}_log_lag_{lag}' for lag in (1, 2, 3, 24, 48, 72)],
+            'day', 'month', 'year', 'hour', 'weekday']
+
+
+def stub_booster(pollutant: str, station: str, trees: int = TREES, leaves: int = LEAVES, seed: int = 0):
+    """Booster of production size and features, trained on noise."""
+    import lightgbm as lgb
+
+    rng = np.random.default_rng(seed)
+    features = model_feature_names(pollutant, station)
+    x = rng.random((4000, len(features)))
+    y = np.log1p(20 * x[:, 7] + rng.random(len(x)))
+    params = {'objective': 'regression', 'num_leaves': leaves, 'min_data_in_leaf': 5, 'verbose': -1, 'seed': seed}
+    return lgb.train(params, lgb.Dataset(x, y, feature_name=features), num_boost_round=trees)
+
+
+class SyntheticWeatherClient:
+    """Weather client for `WeatherProvider` that makes up hourly values instead of calling the API."""
+
+    def fetch(self, url: str, params: dict) -> list:
+        latitudes = params['latitude'] if isinstance(params['latitude'], list) else [params['latitude']]
+        frames = []
+        for i, _ in enumerate(latitudes):
+            rng = np.random.default_rng(i)
+            dates = pd.date_range(params['start_date'], pd.Timestamp(params['end_date']) + pd.Timedelta(hours=23), freq='h', tz='UTC')
+            frame = pd.DataFrame({'datetime': dates})
+            for variable in params['hourly']:
+                frame[variable] = rng.uniform(0, 30, len(dates)).astype('float32')
+            frames.append(frame)
+        return frames
+
+
+# Workspace side, run inside the copy of the app
+
+def prepare(hours: int, trees: int, seed: int):
+    """Write the synthetic station store and boosters of the workspace."""
+    from scripts import station_store
+    from scripts.model_registry import ModelRegistry
+
+    manifest = station_store.read_manifest()
+    for i, station in enumerate(STATIONS):
+        station_store.write_station(station, synthetic_history(station, hours, seed=seed + i), manifest)
+    station_store.write_manifest(manifest)
+
+    registry = ModelRegistry()
+    registry.models_dir.mkdir(parents=True, exist_ok=True)
+    for i, station in enumerate(STATIONS):
+        for j, poll in enumerate(POLLUTANTS):
+            stub_booster(poll, station, trees, seed=seed + 10 * i + j).save_model(str(registry.text_path(f'{poll}_{station}')))
+
+
+def _clear_streamlit_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def _home_page():
+    import streamlit as st
+    st.session_state['language'] = 'en'
+    from Dashboard_pages import page_2
+    page_2.new_home()
+
+
+def stage_functions() -> dict:
+    """Stage name to (setup, run) callables, setup is not timed."""
+    import streamlit as st
+    from streamlit import logger
+    # Pages run outside `streamlit run` here, which Streamlit warns about on every call
+    logger.set_log_level('error')
+    st.session_state['language'] = 'en'
+
+    def forecast_run():
+        from scripts import prediction
+        from scripts.weather_provider import WeatherProvider
+        provider = WeatherProvider(client=SyntheticWeatherClient(), cache_dir=None)
+        prediction.forecast_stations(STATIONS, POLLUTANTS, provider=provider)
+
+    def import_setup():
+        _clear_streamlit_caches()
+        sys.modules.pop('scripts.map_helpers', None)
+
+    def map_helpers_import():
+        import scripts.map_helpers  # noqa: F401
+
+    def classical_map():
+        from scripts.map_helpers import classical_map, zone_geojson
+        classical_map(zone_geojson()).get_root().render()
+
+    def get_24hr_forecast():
+        from Dashboard_pages.forecast import get_24hr_forecast
+        get_24hr_forecast(None, 'Merced', 'PM25').to_dict()
+
+    def new_home():
+        from streamlit.testing.v1 import AppTest
+        app = AppTest.from_function(_home_page, default_timeout=300)
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    nothing = lambda: None
+    return {
+        'forecast_run': (nothing, forecast_run),
+        'map_helpers_import': (import_setup, map_helpers_import),
+        'classical_map': (nothing, classical_map),
+        'get_24hr_forecast': (nothing, get_24hr_forecast),
+        'new_home': (nothing, new_home),
+    }
+
+
+def measure(setup, run, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        setup()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    # Memory on one more run, tracemalloc slows everything down
+    setup()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_min_s': min(times),
+        'wall_median_s': statistics.median(times),
+        'peak_mib': peak / 2 ** 20,
+        'net_blocks': sys.getallocatedblocks() - blocks,
+    }
+
+
+def measure_stages(stages: list, repeat: int) -> dict:
+    functions = stage_functions()
+    # The pages read the published forecast, so there must be one
+    if 'forecast_run' not in stages:
+        functions['forecast_run'][1]()
+    return {stage: measure(*functions[stage], repeat) for stage in stages}
+
+
+# Repository side
+
+def build_workspace(directory: Path) -> Path:
+    """Copy the app code and static data into `directory`, return the app root."""
+    app = directory / BASE_DIR.name
+    for name in CODE:
+        source = BASE_DIR / name
+        if source.is_dir():
+            shutil.copytree(source, app / name, ignore=shutil.ignore_patterns('__pycache__'))
+        else:
+            shutil.copy2(source, app / name)
+    (app / 'Dashboard_data').mkdir(parents=True)
+    for name in STATIC_DATA:
+        source = BASE_DIR / 'Dashboard_data' / name
+        if source.is_dir():
+            shutil.copytree(source, app / 'Dashboard_data' / name)
+        elif source.exists():
+            shutil.copy2(source, app / 'Dashboard_data' / name)
+    (directory / '2.Data_Collection').mkdir()
+    festivals = BASE_DIR.parent / '2.Data_Collection' / 'Mexico_city_data_with_festivals_Manual.csv'
+    if festivals.exists():
+        shutil.copy2(festivals, directory / '2.Data_Collection' / festivals.name)
+    return app
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Stages whose median wall time grew by more than `tolerance` over the baseline."""
+    slower = []
+    for stage, result in results['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if before and result['wall_median_s'] > before['wall_median_s'] * (1 + tolerance):
+            slower.append((stage, before['wall_median_s'], result['wall_median_s']))
+    return slower
+
+
+def report(results: dict, baseline: dict = None) -> str:
+    lines = [f"{'stage':<20} {'min s':>8} {'median s':>9} {'peak MiB':>9} {'net blocks':>11} {'vs base':>8}"]
+    for stage, result in results['stages'].items():
+        before = (baseline or {}).get('stages', {}).get(stage)
+        ratio = f"{result['wall_median_s'] / before['wall_median_s']:.2f}x" if before else ''
+        lines.append(f"{stage:<20} {result['wall_min_s']:8.3f} {result['wall_median_s']:9.3f} "
+                     f"{result['peak_mib']:9.1f} {result['net_blocks']:11d} {ratio:>8}")
+    return "\n".join(lines)
+
+
+def run(stages: list = STAGES, repeat: int = 3, hours: int = HISTORY_HOURS, trees: int = TREES, seed: int = 0, keep: bool = False) -> dict:
+    directory = Path(tempfile.mkdtemp(prefix='aqi-benchmark-'))
+    try:
+        app = build_workspace(directory)
+        module = [sys.executable, '-m', 'scripts.benchmark']
+        subprocess.run([*module, 'prepare', '--hours', str(hours), '--trees', str(trees), '--seed', str(seed)], cwd=app, check=True)
+
+        stage_results = {}
+        for stage in stages:
+            # One process per stage, so a stage never runs on the caches of another
+            out = directory / f'{stage}.json'
+            subprocess.run([*module, 'measure', '--stages', stage, '--repeat', str(repeat), '--out', str(out)], cwd=app, check=True)
+            stage_results.update(json.loads(out.read_text()))
+    finally:
+        if keep:
+            print(f"Workspace kept in {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'meta': {'stations': STATIONS, 'hours': hours, 'trees': trees, 'repeat': repeat,
+                 'python': platform.python_version(), 'machine': platform.machine(), 'date': pd.Timestamp.now().isoformat(timespec='seconds')},
+        'stages': stage_results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the forecast job and dashboard hot paths on synthetic data.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Build a synthetic workspace and measure every stage')
+    run_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    run_parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (default: 3)')
+    run_parser.add_argument('--hours', type=int, default=HISTORY_HOURS, help='Rows of every synthetic history')
+    run_parser.add_argument('--trees', type=int, default=TREES, help='Trees of every stub booster')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--json', type=Path, help='Write the results to this file')
+    run_parser.add_argument('--baseline', type=Path, help='Results of an earlier run to compare with')
+    run_parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown over the baseline (default: 0.2)')
+    run_parser.add_argument('--keep', action='store_true', help='Keep the workspace for inspection')
+
+    # Used by `run` inside the workspace
+    prepare_parser = subparsers.add_parser('prepare')
+    prepare_parser.add_argument('--hours', type=int, default=HISTORY_HOURS)
+    prepare_parser.add_argument('--trees', type=int, default=TREES)
+    prepare_parser.add_argument('--seed', type=int, default=0)
+    measure_parser = subparsers.add_parser('measure')
+    measure_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    measure_parser.add_argument('--repeat', type=int, default=3)
+    measure_parser.add_argument('--out', type=Path, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'prepare':
+        prepare(args.hours, args.trees, args.seed)
+    elif args.command == 'measure':
+        args.out.write_text(json.dumps(measure_stages(args.stages, args.repeat)))
+    elif args.command == 'run':
+        results = run(args.stages, args.repeat, args.hours, args.trees, args.seed, args.keep)
+        baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+        print(report(results, baseline))
+        if args.json:
+            args.json.write_text(json.dumps(results, indent=2))
+        if baseline:
+            slower = compare(results, baseline, args.tolerance)
+            for stage, before, after in slower:
+                print(f"Regression: {stage} {before:.3f}s -> {after:.3f}s")
+            if slower:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+'''
+  Hour-of-year climatology of the station histories.
+
+  The naive forecasts average every past reading taken on the same day of the year
+  and hour (or the same day of the month). Instead of scanning the history for each
+  hour, `Climatology` keeps running sums and counts in arrays indexed by
+  (station, day of year, hour, column) and (station, day of month, column), so a
+  24-hour naive forecast is 24 array lookups. New hourly rows are added
+  incrementally and the table is persisted next to the station store. The sums of
+  a station are rebuilt when the manifest records a different source file (mtime
+  and size) for it, so a history rewritten over the same dates is not missed.
+'''
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.station_store import STORE_DIR, read_manifest
+
+CLIMATOLOGY_PATH = STORE_DIR / 'climatology.npz'
+
+# Pollutant and weather columns of `stations_data`
+COLUMNS = ['PM25', 'PM10', 'SO2', 'O3', 'NO2', 'CO', 'RH', 'TMP', 'WDR', 'WSP', 'direct_radiation (W/m²)']
+
+
+class Climatology:
+    """Running means per (station, day of year, hour) and per (station, day of month)."""
+
+    def __init__(self, stations: list = None, columns: list = COLUMNS):
+        self.columns = list(columns)
+        self.stations = []
+        n_columns = len(self.columns)
+        self.hour_sums = np.zeros((0, 366, 24, n_columns))
+        self.hour_counts = np.zeros((0, 366, 24, n_columns), dtype=np.int32)
+        self.day_sums = np.zeros((0, 31, n_columns))
+        self.day_counts = np.zeros((0, 31, n_columns), dtype=np.int32)
+        # Last datetime added per station, older rows are skipped by `update`
+        self.last_datetime = []
+        # Source signature the sums of each station were built from, see `source_signatures`
+        self.signatures = []
+        for station in stations or []:
+            self._station_index(station)
+
+    def _station_index(self, station: str) -> int:
+        if station in self.stations:
+            return self.stations.index(station)
+        self.stations.append(station)
+        self.last_datetime.append(np.datetime64('NaT', 'ns'))
+        self.signatures.append('')
+        self.hour_sums = np.concatenate([self.hour_sums, np.zeros((1, *self.hour_sums.shape[1:]))])
+        self.hour_counts = np.concatenate([self.hour_counts, np.zeros((1, *self.hour_counts.shape[1:]), dtype=np.int32)])
+        self.day_sums = np.concatenate([self.day_sums, np.zeros((1, *self.day_sums.shape[1:]))])
+        self.day_counts = np.concatenate([self.day_counts, np.zeros((1, *self.day_counts.shape[1:]), dtype=np.int32)])
+        return len(self.stations) - 1
+
+    def _reset(self, s: int):
+        self.hour_sums[s] = 0
+        self.hour_counts[s] = 0
+        self.day_sums[s] = 0
+        self.day_counts[s] = 0
+        self.last_datetime[s] = np.datetime64('NaT', 'ns')
+
+    def update(self, df: pd.DataFrame, signatures: dict = None) -> int:
+        """
+        Add the rows of `df` (with `datetime` and `station` columns) that are newer than
+        what the table already holds for their station. Returns the number of rows added.
+
+        A station whose signature in `signatures` differs from the one its sums were
+        built from is rebuilt from all of its rows.
+        """
+        added = 0
+        for station, rows in df.groupby('station', sort=False, observed=True):
+            s = self._station_index(station)
+            if signatures is not None and signatures.get(station, '') != self.signatures[s]:
+                self._reset(s)
+                self.signatures[s] = signatures.get(station, '')
+            dates = pd.to_datetime(rows['datetime'])
+            if not np.isnat(self.last_datetime[s]):
+                newer = (dates > self.last_datetime[s]).to_numpy()
+                rows, dates = rows[newer], dates[newer]
+            if rows.empty:
+                continue
+
+            values = rows[self.columns].to_numpy(dtype=float)
+            present = ~np.isnan(values)
+            values = np.where(present, values, 0.0)
+
+            doy = dates.dt.dayofyear.to_numpy() - 1
+            hour = dates.dt.hour.to_numpy()
+            day = dates.dt.day.to_numpy() - 1
+            np.add.at(self.hour_sums[s], (doy, hour), values)
+            np.add.at(self.hour_counts[s], (doy, hour), present)
+            np.add.at(self.day_sums[s], day, values)
+            np.add.at(self.day_counts[s], day, present)
+
+            self.last_datetime[s] = dates.max().to_datetime64()
+            added += len(rows)
+        return added
+
+    def _column_index(self, column: str) -> int:
+        return self.columns.index(column)
+
+    def day_mean(self, station: str, column: str, day: int) -> float:
+        """Mean of `column` over every reading taken on this day of the month."""
+        if station not in self.stations:
+            return np.nan
+        s, c = self.stations.index(station), self._column_index(column)
+        count = self.day_counts[s, day - 1, c]
+        return self.day_sums[s, day - 1, c] / count if count else np.nan
+
+    def hourly_means(self, station: str, column: str, dates: pd.DatetimeIndex) -> np.ndarray:
+        """Mean of `column` at the day of year and hour of every given date."""
+        if station not in self.stations:
+            return np.full(len(dates), np.nan)
+        s, c = self.stations.index(station), self._column_index(column)
+        doy, hour = dates.dayofyear.to_numpy() - 1, dates.hour.to_numpy()
+        counts = self.hour_counts[s, doy, hour, c]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, self.hour_sums[s, doy, hour, c] / counts, np.nan)
+
+    def save(self, path: Path = CLIMATOLOGY_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, stations=np.array(self.stations), columns=np.array(self.columns),
+                     last_datetime=np.array(self.last_datetime, dtype='datetime64[ns]'),
+                     signatures=np.array(self.signatures, dtype=str),
+                     hour_sums=self.hour_sums, hour_counts=self.hour_counts,
+                     day_sums=self.day_sums, day_counts=self.day_counts)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path = CLIMATOLOGY_PATH) -> 'Climatology':
+        with np.load(path) as data:
+            climatology = cls(columns=data['columns'].tolist())
+            climatology.stations = data['stations'].tolist()
+            climatology.last_datetime = list(data['last_datetime'])
+            climatology.signatures = data['signatures'].tolist()
+            climatology.hour_sums = data['hour_sums']
+            climatology.hour_counts = data['hour_counts']
+            climatology.day_sums = data['day_sums']
+            climatology.day_counts = data['day_counts']
+        return climatology
+
+
+def source_signatures(manifest: dict = None) -> dict:
+    """
+    Station to the mtime and size of the source its history was ingested from, as
+    recorded in the store manifest. Appended readings keep it, a re-ingest changes it.
+    """
+    manifest = manifest if manifest is not None else read_manifest()
+    return {station: f"{entry.get('mtime_ns')}:{entry.get('size')}" for station, entry in manifest['stations'].items()}
+
+
+def load_climatology(df: pd.DataFrame, path: Path = CLIMATOLOGY_PATH, signatures: dict = None) -> Climatology:
+    """
+    Load the persisted climatology and bring it up to date with `df`.
+
+    The table is built from scratch the first time (or when its columns changed)
+    and only the rows newer than what it holds are added afterwards, except for the
+    stations whose source signature changed (by default the ones of the manifest),
+    which are rebuilt.
+    """
+    climatology = None
+    if Path(path).exists():
+        try:
+            climatology = Climatology.load(path)
+        except (OSError, ValueError, KeyError):
+            climatology = None
+    if climatology is None or climatology.columns != COLUMNS:
+        climatology = Climatology()
+
+    if climatology.update(df, signatures if signatures is not None else source_signatures()):
+        climatology.save(path)
+    return climatology
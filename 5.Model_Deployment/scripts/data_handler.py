@@ -26,6 +26,23 @@ STATION_ACRONYMS = {
     "Merced": "MER"
 }
 
+# Acronyms used by the data collection files and the models
+STATION_CODES = {
+    'AJM': 'Ajusco Medio',
+    'AJU': 'Ajusco',
+    'BJU': 'Benito Juarez',
+    'HGM': 'Hospital General de México',
+    'MER': 'Merced',
+    'MGH': 'Miguel Hidalgo',
+    'MPA': 'Milpa Alta',
+    'PED': 'Pedregal',
+    'SAG': 'San Agustin',
+    'SFE': 'Santa Fe',
+    'TLA': 'Tlalnepantla',
+    'UIZ': 'UAM Iztapalapa',
+    'XAL': 'Xalostoc'
+}
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 dummy_data = BASE_DIR / 'Dashboard_data' / 'AQI_dummy_data.xlsx'
 def load_data(file_path=dummy_data):
@@ -76,6 +93,10 @@ def get_station_coordinates(station_name):
     """Get coordinates for a specific station"""
     return STATION_COORDINATES.get(station_name)
 
+def get_station_coordinates_by_code(station_code):
+    """Get coordinates for a station acronym such as 'MER'"""
+    return STATION_COORDINATES.get(STATION_CODES.get(station_code))
+
 def get_some_stations(stations=["Benito Juarez", "Merced", "Pedregal", "UAM Iztapalapa"]):
     return list(filter(lambda x: x in stations, list(STATION_COORDINATES.keys())))
 
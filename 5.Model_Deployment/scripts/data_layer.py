@@ -0,0 +1,134 @@
+'''
+  Cached data access for the dashboard pages.
+
+  Station histories and forecasts are loaded once per process and shared between
+  sessions through Streamlit's caches. Every cached loader takes a `version` argument
+  built from the modification times of the files it reads, so a refreshed station
+  store or forecast file invalidates the cache on the next rerun; the TTLs bound how
+  long an entry lives even if nothing changed on disk.
+
+  The loaders themselves, the versions and the station list are in
+  `scripts.data_loaders`, which does not import Streamlit and is reused by other
+  processes (e.g. the JSON API).
+'''
+import pandas as pd
+import streamlit as st
+
+from scripts.data_loaders import (STATIONS, stations_version, forecast_version, load_stations_data, load_station_forecast,
+                                  load_forecast_data)
+from scripts.climatology import load_climatology
+from scripts.nowcast import NowCast
+from scripts.station_snapshot import StationSnapshot
+from scripts.interpolation import AqiSurface, municipality_centroids
+from scripts.data_handler import STATION_COORDINATES
+from scripts.instrumentation import cached
+
+# Seconds a cached entry is kept, the data behind it refreshes hourly at most
+HISTORY_TTL = 6 * 3600
+FORECAST_TTL = 3600
+
+
+# The large frames are shared as-is between sessions (no copy per rerun),
+# callers must treat them as read-only. `cached` counts the hits of every cache
+# in the rerun profile (see scripts/instrumentation.py).
+@cached('stations_data', st.cache_resource(ttl=HISTORY_TTL, show_spinner=False))
+def _cached_stations_data(codes: tuple, version: tuple) -> pd.DataFrame:
+    return load_stations_data(codes)
+
+
+@cached('forecast_data', st.cache_resource(ttl=FORECAST_TTL, show_spinner=False))
+def _cached_forecast_data(codes: tuple, version: tuple) -> pd.DataFrame:
+    return load_forecast_data(codes)
+
+
+@cached('climatology', st.cache_resource(ttl=HISTORY_TTL, show_spinner=False))
+def _cached_climatology(codes: tuple, version: tuple):
+    return load_climatology(_cached_stations_data(codes, version))
+
+
+@cached('snapshot', st.cache_resource(ttl=FORECAST_TTL, show_spinner=False))
+def _cached_snapshot(codes: tuple, version: tuple, forecast_version: tuple) -> StationSnapshot:
+    return StationSnapshot.build(_cached_stations_data(codes, version), _cached_forecast_data(codes, forecast_version))
+
+
+@cached('surface', st.cache_resource(ttl=FORECAST_TTL, show_spinner=False))
+def _cached_surface(codes: tuple, version: tuple, forecast_version: tuple) -> AqiSurface:
+    stations = {STATIONS[code]: STATION_COORDINATES[STATIONS[code]] for code in codes}
+    return AqiSurface.build(_cached_stations_data(codes, version), _cached_forecast_data(codes, forecast_version),
+                            stations, municipality_centroids())
+
+
+@cached('nowcast', st.cache_resource(show_spinner=False))
+def _cached_nowcast() -> NowCast:
+    return NowCast(list(STATIONS.values()))
+
+
+@cached('station_slice', st.cache_data(ttl=HISTORY_TTL, show_spinner=False))
+def _cached_station_slice(station: str, version: tuple) -> pd.DataFrame:
+    data = _cached_stations_data(tuple(STATIONS), version)
+    return data[data['station'] == station].reset_index(drop=True)
+
+
+@cached('forecast_slice', st.cache_data(ttl=FORECAST_TTL, show_spinner=False))
+def _cached_forecast_slice(station: str, version: tuple) -> pd.DataFrame:
+    data = _cached_forecast_data(tuple(STATIONS), version)
+    return data[data['station'] == station].reset_index(drop=True)
+
+
+@cached('station_forecast', st.cache_data(ttl=FORECAST_TTL, show_spinner=False))
+def _cached_station_forecast(code: str, version: tuple) -> pd.DataFrame:
+    return load_station_forecast(code)
+
+
+def get_stations_data() -> pd.DataFrame:
+    """History of every dashboard station (shared, do not modify)."""
+    return _cached_stations_data(tuple(STATIONS), stations_version())
+
+
+def get_forecast_data() -> pd.DataFrame:
+    """Forecast of every dashboard station (shared, do not modify)."""
+    return _cached_forecast_data(tuple(STATIONS), forecast_version())
+
+
+def get_climatology():
+    """Day/hour averages of the station histories for the naive forecasts."""
+    return _cached_climatology(tuple(STATIONS), stations_version())
+
+
+def get_snapshot() -> StationSnapshot:
+    """Latest reading and forecast range of every station, rebuilt when either file changes."""
+    return _cached_snapshot(tuple(STATIONS), stations_version(), forecast_version())
+
+
+def get_surface() -> AqiSurface:
+    """Index estimated at every alcaldía from the stations, now and for the forecast hours."""
+    return _cached_surface(tuple(STATIONS), stations_version(), forecast_version())
+
+
+def get_nowcast() -> NowCast:
+    """
+    Rolling averages of the latest readings of every station. The shared engine is
+    only fed when the histories change, and then only the rows added since.
+    """
+    nowcast = _cached_nowcast()
+    version = stations_version()
+    if nowcast.version != version:
+        # The shared history frame, sorted by station and time, no per-station copies
+        nowcast.update(_cached_stations_data(tuple(STATIONS), version))
+        nowcast.version = version
+    return nowcast
+
+
+def get_station_slice(station: str) -> pd.DataFrame:
+    """History of one station, by name (e.g. 'Merced')."""
+    return _cached_station_slice(station, stations_version())
+
+
+def get_forecast_slice(station: str) -> pd.DataFrame:
+    """Forecast of one station, by name (e.g. 'Merced')."""
+    return _cached_forecast_slice(station, forecast_version())
+
+
+def get_station_forecast(code: str) -> pd.DataFrame:
+    """Forecast file of one station, by acronym (e.g. 'MER'), in the forecaster layout."""
+    return _cached_station_forecast(code, forecast_version((code,)))
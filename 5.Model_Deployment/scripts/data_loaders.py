@@ -0,0 +1,116 @@
+'''
+  Loaders of the station histories and forecasts, shared by the dashboard data layer
+  and the JSON API.
+
+  Nothing here imports Streamlit, so processes that do not run the dashboard (the API,
+  jobs) can read the data without it; the cached getters of the dashboard are in
+  `scripts.data_layer`. The versions are built from the modification times of the
+  files the loaders read and change whenever one of them is rewritten.
+
+  Every worker keeps the full history of the dashboard stations in memory, so it is
+  loaded with the compact dtypes of `HISTORY_SCHEMA` (float32 readings, int8 flags,
+  uint8 index, categorical station) and sorted by station and time; the memory saved
+  is logged once per load.
+'''
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.station_store import MANIFEST_PATH, get_source_path, load_station_history
+from scripts import forecast_artifact
+from scripts.instrumentation import log_event
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FORECAST_DIR = BASE_DIR / 'Dashboard_data' / 'forecast_data'
+
+# Stations shown in the dashboard
+STATIONS = {"PED": "Pedregal",
+            "UIZ": "UAM Iztapalapa",
+            "BJU": "Benito Juarez",
+            "MER": "Merced"}
+
+COLUMNS = ['datetime', 'direct_radiation (W/m²)', 'PM25', 'PM10', 'SO2', 'O3', 'NO2', 'CO', 'RH', 'TMP', 'WDR', 'WSP', 'is_festival', 'is_weekend', 'AirQualityIndex', 'station']
+
+MEASUREMENTS = ['direct_radiation (W/m²)', 'PM25', 'PM10', 'SO2', 'O3', 'NO2', 'CO', 'RH', 'TMP', 'WDR', 'WSP']
+
+# dtypes of the history frame, float32 keeps the 2 decimals the stations report
+HISTORY_SCHEMA = {
+    'datetime': 'datetime64[ns]',
+    **dict.fromkeys(MEASUREMENTS, 'float32'),
+    'is_festival': 'int8',
+    'is_weekend': 'int8',
+    'AirQualityIndex': 'uint8',
+    'station': pd.CategoricalDtype(list(STATIONS.values())),
+}
+
+# Size of the last history loaded in this process, in the default and compact dtypes
+MEMORY_REPORT = {}
+
+def _mtimes(paths: list) -> tuple:
+    return tuple(path.stat().st_mtime_ns if path.exists() else None for path in paths)
+
+
+def stations_version(codes: tuple = tuple(STATIONS)) -> tuple:
+    """Changes whenever the station store or one of its workbooks is rewritten."""
+    return _mtimes([MANIFEST_PATH, *[get_source_path(code) for code in codes]])
+
+
+def forecast_path(code: str) -> Path:
+    return FORECAST_DIR / f'{code}_forecast.xlsx'
+
+
+def forecast_version(codes: tuple = tuple(STATIONS)) -> tuple:
+    """Changes whenever a forecast is published (or a legacy forecast file rewritten)."""
+    return _mtimes([forecast_artifact.manifest_path(FORECAST_DIR), *[forecast_path(code) for code in codes]])
+
+
+def _station_columns(df: pd.DataFrame, code: str) -> pd.DataFrame:
+    """Rename `{column}_{code}` columns to the shared names of `COLUMNS`."""
+    if 'index' in df.columns:
+        df = df.drop('index', axis=1)
+    df = df.rename(columns=lambda column: column[:-len(code) - 1] if column.endswith(f'_{code}') else column)
+    return df.rename(columns={'Air_index': 'AirQualityIndex'})
+
+
+def apply_schema(df: pd.DataFrame, schema: dict = HISTORY_SCHEMA) -> pd.DataFrame:
+    """Columns of `schema`, in its order and with its dtypes."""
+    return df[list(schema)].astype(schema)
+
+
+def load_stations_data(codes: tuple = tuple(STATIONS)) -> pd.DataFrame:
+    """Full hourly history of the given stations in one frame, sorted by station and time."""
+    frames = []
+    default_bytes = 0
+    for code in codes:
+        df_pollutants = _station_columns(load_station_history(code), code)
+        df_pollutants['station'] = STATIONS[code]
+        default_bytes += df_pollutants[COLUMNS].memory_usage(deep=True).sum()
+        frames.append(apply_schema(df_pollutants))
+    data = pd.concat(frames, ignore_index=True).sort_values(['station', 'datetime'], kind='stable', ignore_index=True)
+
+    compact_bytes = data.memory_usage(deep=True).sum()
+    MEMORY_REPORT.update(rows=len(data), default_mib=round(float(default_bytes) / 2 ** 20, 2), compact_mib=round(float(compact_bytes) / 2 ** 20, 2),
+                         saved_mib=round(float(default_bytes - compact_bytes) / 2 ** 20, 2))
+    log_event('stations_data_memory', **MEMORY_REPORT)
+    return data
+
+
+def load_station_forecast(code: str) -> pd.DataFrame:
+    """
+    Forecast of one station in the forecaster layout, from the published artifact or,
+    when the station is not in one, from its legacy xlsx file.
+    """
+    table = forecast_artifact.read_forecasts(FORECAST_DIR)
+    if table is not None and (table['station'] == code).any():
+        return forecast_artifact.station_frame(table, code)
+    return pd.read_excel(forecast_path(code), parse_dates=['datetime'])
+
+
+def load_forecast_data(codes: tuple = tuple(STATIONS)) -> pd.DataFrame:
+    """Forecasts of the given stations in one frame with the `COLUMNS` layout."""
+    frames = []
+    for code in codes:
+        df_pollutants_f = _station_columns(load_station_forecast(code), code)
+        df_pollutants_f['station'] = STATIONS[code]
+        frames.append(df_pollutants_f[COLUMNS])
+    return pd.concat(frames, ignore_index=True)
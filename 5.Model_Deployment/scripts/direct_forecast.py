@@ -0,0 +1,297 @@
+'''
+  Direct multi-horizon forecaster, an alternative to the recursive one.
+
+  The recursive models predict hour t+1 from lags 1-3 of their own target, so the 24
+  hours of a forecast have to be predicted one after the other. The direct models
+  take the forecast horizon as a feature instead: a row for hour t+h carries the
+  weather and calendar of t+h, the last three readings before the forecast
+  (`origin_lag_0..2`, i.e. lags h..h+2), lags 24/48/72 of t+h (always known for
+  h <= 24) and `horizon` = h. No feature depends on a prediction, so the whole
+  (series, horizon, features) block is built at once and every model predicts its
+  24 hours in a single call.
+
+  The models are trained from the station histories with the parameters and split of
+  `4.Model_Development/model_development_lightgbm.ipynb` and saved in LightGBM's text
+  format in `4.Model_Development/models/direct`, with the same `{pollutant}_{station}`
+  keys, so a `ModelRegistry` over that folder serves them.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.direct_forecast train [--stations MER BJU] [--pollutants PM25 O3]
+    python -m scripts.direct_forecast compare [--stations MER] [--origins 60]
+'''
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from scripts.forecast_engine import LAGS, WEATHER_COLUMNS, CALENDAR_FEATURES, make_predictor, RecursiveForecaster, calendar_features
+from scripts.model_registry import MODELS_DIR, ModelRegistry, model_key
+from scripts.station_store import load_station_history
+
+DIRECT_MODELS_DIR = MODELS_DIR / 'direct'
+
+# Readings before the forecast used as features, origin_lag_0 is the last one
+ORIGIN_LAGS = [0, 1, 2]
+# Lags of the forecasted hour itself, known for every horizon up to the shortest one
+TARGET_LAGS = [lag for lag in LAGS if lag >= 24]
+
+# Station independent feature layout of the direct models
+DIRECT_FEATURES = [*WEATHER_COLUMNS, *[f'origin_lag_{lag}' for lag in ORIGIN_LAGS], *[f'lag_{lag}' for lag in TARGET_LAGS],
+                   *CALENDAR_FEATURES, 'horizon']
+
+HORIZON = 24
+
+# Same training setup as the recursive models (see the model development notebook)
+TRAIN_END = '2022-12-31'
+PARAMS = {
+    'objective': 'regression',
+    'metric': 'rmse',
+    'verbosity': -1,
+    'boosting_type': 'gbdt',
+    'num_leaves': 50,
+    'learning_rate': 0.05,
+    'feature_fraction': 0.8
+}
+NUM_BOOST_ROUND = 200
+
+POLLUTANTS = ['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2']
+STATIONS = ['MER', 'BJU', 'PED', 'UIZ']
+
+
+def direct_feature_names(pollutant: str, station: str) -> list:
+    """Feature names of a direct model, named like the recursive model features."""
+    names = []
+    for feature in DIRECT_FEATURES:
+        if feature == 'direct_radiation (W/m²)':
+            names.append('direct_radiation_(W/m²)')
+        elif feature in ('RH', 'TMP', 'WDR', 'WSP'):
+            names.append(f'{feature}_{station}')
+        elif 'lag_' in feature:
+            names.append(f'{pollutant}_{station}_log_{feature}')
+        else:
+            names.append(feature)
+    return names
+
+
+def _station_weather(history: pd.DataFrame, station: str) -> pd.DataFrame:
+    """Weather columns of a station history under their `WEATHER_COLUMNS` names."""
+    return history.rename(columns={f'{column}_{station}': column for column in ('RH', 'TMP', 'WDR', 'WSP')})[WEATHER_COLUMNS]
+
+
+def training_matrix(history: pd.DataFrame, pollutant: str, station: str, horizon: int = HORIZON, end=None, origin_stride: int = 1):
+    """
+    Training rows of a direct model from a station history: one row per target hour
+    and horizon 1..`horizon`, targets up to `end` only.
+
+    Returns:
+        (features in the `DIRECT_FEATURES` layout, log1p targets)
+    """
+    target = np.log1p(history[f'{pollutant}_{station}'].to_numpy(dtype=float))
+    weather = _station_weather(history, station).to_numpy(dtype=float)
+    dates = pd.DatetimeIndex(history['datetime'])
+    calendar = calendar_features(dates)
+
+    # Lags are taken by row, as `shift` does in the notebook
+    targets = np.arange(max(max(TARGET_LAGS), horizon + max(ORIGIN_LAGS)), len(target))
+    if end is not None:
+        targets = targets[dates[targets] <= pd.Timestamp(end)]
+
+    slot = {name: i for i, name in enumerate(DIRECT_FEATURES)}
+    weather_slots = [slot[column] for column in WEATHER_COLUMNS]
+    calendar_slots = [slot[column] for column in CALENDAR_FEATURES]
+
+    blocks, labels = [], []
+    for h in range(1, horizon + 1):
+        rows = targets[(targets - h) % origin_stride == 0]
+        block = np.empty((len(rows), len(DIRECT_FEATURES)))
+        block[:, weather_slots] = weather[rows]
+        block[:, calendar_slots] = calendar[rows]
+        for lag in ORIGIN_LAGS:
+            block[:, slot[f'origin_lag_{lag}']] = target[rows - h - lag]
+        for lag in TARGET_LAGS:
+            block[:, slot[f'lag_{lag}']] = target[rows - lag]
+        block[:, slot['horizon']] = h
+        blocks.append(block)
+        labels.append(target[rows])
+
+    features, labels = np.concatenate(blocks), np.concatenate(labels)
+    keep = ~np.isnan(labels)
+    return features[keep], labels[keep]
+
+
+def train_direct_model(history: pd.DataFrame, pollutant: str, station: str, horizon: int = HORIZON, end=TRAIN_END,
+                       origin_stride: int = 1, num_boost_round: int = NUM_BOOST_ROUND) -> lgb.Booster:
+    features, labels = training_matrix(history, pollutant, station, horizon, end, origin_stride)
+    dataset = lgb.Dataset(features, label=labels, feature_name=direct_feature_names(pollutant, station))
+    return lgb.train(PARAMS, dataset, num_boost_round=num_boost_round)
+
+
+class DirectForecaster(RecursiveForecaster):
+    """
+    Forecast every (pollutant, station) series of `models` (direct models) together,
+    with the interface of `RecursiveForecaster`. Each model predicts a block of
+    `horizon` rows, for which `Booster.predict` beats the compiled backend, so it is
+    the default here.
+    """
+
+    def __init__(self, models: dict, horizon: int = 24, backend: str = 'lightgbm'):
+        super().__init__(models, horizon, backend)
+
+    def build_features(self, series: list, histories: dict, weather: dict):
+        """Lay out the complete (series, horizon, features) array and the future dates of every station."""
+        features = np.full((len(series), self.horizon, len(DIRECT_FEATURES)), np.nan)
+        slot = {name: i for i, name in enumerate(DIRECT_FEATURES)}
+        weather_slots = [slot[column] for column in WEATHER_COLUMNS]
+        calendar_slots = [slot[column] for column in CALENDAR_FEATURES]
+        horizons = np.arange(1, self.horizon + 1)
+
+        future_dates = {}
+        for station in {station for _, station in series}:
+            last_date = histories[station]['datetime'].max()
+            future_dates[station] = pd.date_range(last_date + pd.Timedelta(hours=1), periods=self.horizon, freq='h')
+
+        for s, (pollutant, station) in enumerate(series):
+            dates = future_dates[station]
+            station_weather = weather[station].set_index(pd.to_datetime(weather[station]['datetime']))
+            station_weather = station_weather[~station_weather.index.duplicated()].reindex(dates)
+            features[s][:, weather_slots] = station_weather[WEATHER_COLUMNS].to_numpy(dtype=float)
+            features[s][:, calendar_slots] = calendar_features(dates)
+            features[s][:, slot['horizon']] = horizons
+
+            history = np.log1p(histories[station][f'{pollutant}_{station}'].tail(max(LAGS)).to_numpy(dtype=float))
+            for lag in ORIGIN_LAGS:
+                features[s][:, slot[f'origin_lag_{lag}']] = history[-1 - lag]
+            for lag in TARGET_LAGS:
+                offsets = len(history) - 1 + horizons - lag
+                valid = offsets >= 0
+                features[s, valid, slot[f'lag_{lag}']] = history[offsets[valid]]
+        return features, future_dates
+
+    def forecast(self, histories: dict, weather: dict, stations: list, pollutants: list, predictor=None) -> dict:
+        """Same arguments and result as `RecursiveForecaster.forecast`, `predictor` needs `predict_block`."""
+        series = self._series(stations, pollutants)
+        if not series:
+            return {}
+        if predictor is None:
+            predictor = make_predictor(series, self.models, DIRECT_FEATURES, self.backend)
+
+        features, future_dates = self.build_features(series, histories, weather)
+        predictions = np.expm1(predictor.predict_block(features))
+
+        results = {}
+        for s, (pollutant, station) in enumerate(series):
+            if station not in results:
+                results[station] = pd.DataFrame({'datetime': future_dates[station]})
+            results[station][f'{pollutant}_{station}'] = predictions[s]
+        return results
+
+
+def train(stations: list = STATIONS, pollutants: list = POLLUTANTS, end=TRAIN_END, origin_stride: int = 1, models_dir=DIRECT_MODELS_DIR) -> list:
+    """Train and save the direct models of the given series, return the written paths."""
+    registry = ModelRegistry(models_dir)
+    registry.models_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for station in stations:
+        history = load_station_history(station)
+        for poll in pollutants:
+            booster = train_direct_model(history, poll, station, end=end, origin_stride=origin_stride)
+            path = registry.text_path(model_key(poll, station))
+            booster.save_model(str(path))
+            written.append(path)
+    return written
+
+
+def backtest(stations: list, pollutants: list, modes: dict, start=TRAIN_END, origins: int = 60, horizon: int = HORIZON) -> dict:
+    """
+    Forecast from `origins` daily origins after `start` with the observed weather and
+    score every forecaster against the observed readings.
+
+    Args:
+        modes: Name to forecaster (anything with the `RecursiveForecaster.forecast` interface)
+
+    Returns:
+        {mode: {'errors': {pollutant: array of forecast - observed}, 'seconds': [per forecast]}}
+    """
+    histories = {station: load_station_history(station) for station in stations}
+    last = min(history['datetime'].iloc[-1] for history in histories.values()) - pd.Timedelta(hours=horizon)
+    first = max(pd.Timestamp(start), max(history['datetime'].iloc[max(LAGS)] for history in histories.values()))
+    times = pd.date_range(end=last.floor('D') - pd.Timedelta(hours=1), periods=origins, freq='D')
+    times = times[times >= first]
+
+    results = {mode: {'errors': {poll: [] for poll in pollutants}, 'seconds': []} for mode in modes}
+    for origin in times:
+        recent, weather, observed = {}, {}, {}
+        for station, history in histories.items():
+            end = int(history['datetime'].searchsorted(origin, side='right'))
+            recent[station] = history.iloc[max(0, end - max(LAGS)):end]
+            future = history.iloc[end:end + horizon]
+            weather[station] = pd.concat([future[['datetime']], _station_weather(future, station)], axis=1)
+            observed[station] = future.set_index('datetime')
+
+        for mode, forecaster in modes.items():
+            start_time = time.perf_counter()
+            forecasts = forecaster.forecast(recent, weather, stations, pollutants)
+            results[mode]['seconds'].append(time.perf_counter() - start_time)
+            for station, frame in forecasts.items():
+                actual = observed[station].reindex(frame['datetime'])
+                for poll in pollutants:
+                    column = f'{poll}_{station}'
+                    if column in frame:
+                        results[mode]['errors'][poll].append(frame[column].to_numpy() - actual[column].to_numpy(dtype=float))
+
+    for result in results.values():
+        result['errors'] = {poll: np.concatenate(errors) for poll, errors in result['errors'].items() if errors}
+    return results
+
+
+def report(results: dict) -> str:
+    modes = list(results)
+    header = f"{'pollutant':<10}" + ''.join(f" {mode + ' MAE':>15} {mode + ' RMSE':>15}" for mode in modes)
+    lines = [header]
+    for poll in results[modes[0]]['errors']:
+        row = f"{poll:<10}"
+        for mode in modes:
+            errors = results[mode]['errors'][poll]
+            errors = errors[~np.isnan(errors)]
+            row += f" {np.mean(np.abs(errors)):15.3f} {np.sqrt(np.mean(errors ** 2)):15.3f}"
+        lines.append(row)
+    lines.append('')
+    for mode in modes:
+        seconds = results[mode]['seconds']
+        lines.append(f"{mode:<10} {1000 * np.median(seconds):8.1f} ms per forecast (median of {len(seconds)})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Direct multi-horizon forecast models.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Train the direct models from the station histories')
+    train_parser.add_argument('--stations', nargs='+', default=STATIONS, help=f"Station acronyms (default: {' '.join(STATIONS)})")
+    train_parser.add_argument('--pollutants', nargs='+', default=POLLUTANTS, choices=POLLUTANTS, help='Pollutants (default: all)')
+    train_parser.add_argument('--train-end', default=TRAIN_END, help=f'Last target time used for training (default: {TRAIN_END})')
+    train_parser.add_argument('--origin-stride', type=int, default=1, metavar='N', help='Only use every N-th forecast origin, for quicker training')
+
+    compare_parser = subparsers.add_parser('compare', help='Backtest the recursive and direct models side by side')
+    compare_parser.add_argument('--stations', nargs='+', default=STATIONS, help=f"Station acronyms (default: {' '.join(STATIONS)})")
+    compare_parser.add_argument('--pollutants', nargs='+', default=POLLUTANTS, choices=POLLUTANTS, help='Pollutants (default: all)')
+    compare_parser.add_argument('--start', default=TRAIN_END, help=f'First forecast origin (default: {TRAIN_END}, after the training data)')
+    compare_parser.add_argument('--origins', type=int, default=60, help='Daily forecast origins, the most recent ones (default: 60)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        for path in train(args.stations, args.pollutants, args.train_end, args.origin_stride):
+            print(path.name)
+    elif args.command == 'compare':
+        size = len(args.stations) * len(args.pollutants)
+        modes = {
+            'recursive': RecursiveForecaster(ModelRegistry(max_size=size), horizon=HORIZON),
+            'direct': DirectForecaster(ModelRegistry(DIRECT_MODELS_DIR, max_size=size), horizon=HORIZON),
+        }
+        print(report(backtest(args.stations, args.pollutants, modes, args.start, args.origins)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+'''
+  Published forecasts of every station in one Arrow artifact.
+
+  Each forecast run writes a single `forecasts-{run}.arrow` file (Arrow IPC, the
+  Feather v2 format, uncompressed so readers can memory-map it) with the rows of all
+  stations, then a `manifest.json` pointing to it with the run timestamp and the
+  versions of the models used. Both are written to temporary paths and renamed into
+  place, so a reader always sees either the previous run or the new one. The last
+  few artifacts are kept for readers still holding an older manifest.
+
+  Forecasts written as `{STATION}_forecast.xlsx` by older runs are still read when no
+  artifact has been published; `convert` publishes them as an artifact.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.forecast_artifact show
+    python -m scripts.forecast_artifact convert [--stations MER BJU]
+'''
+import os
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+from functools import lru_cache
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FORECAST_DIR = BASE_DIR / 'Dashboard_data' / 'forecast_data'
+MANIFEST_NAME = 'manifest.json'
+
+FORMAT_VERSION = 1
+
+# Artifacts kept after publishing a new one, the current one included
+KEEP_ARTIFACTS = 3
+
+POLLUTANTS = ['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2']
+WEATHER_COLUMNS = ['direct_radiation (W/m²)', 'RH', 'TMP', 'WDR', 'WSP', 'is_festival', 'is_weekend']
+
+
+def manifest_path(directory: Path = FORECAST_DIR) -> Path:
+    return Path(directory) / MANIFEST_NAME
+
+
+def read_manifest(directory: Path = FORECAST_DIR):
+    """Manifest of the current artifact, or None when nothing was published yet."""
+    try:
+        with open(manifest_path(directory), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(data: dict, path: Path):
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def to_table(frames: dict, previous: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Stack per-station forecast frames (forecaster layout, `{pollutant}_{station}`
+    columns) into one frame with a `station` column and plain pollutant columns.
+    Rows of `previous` for stations missing from `frames` are carried over.
+    """
+    rows = []
+    if previous is not None:
+        carried = previous[~previous['station'].isin(list(frames))]
+        rows.append(carried.assign(station=carried['station'].astype(str)))
+    for station, frame in frames.items():
+        frame = frame.rename(columns=lambda column: column[:-len(station) - 1] if column.endswith(f'_{station}') else column)
+        frame = frame.assign(station=station, datetime=pd.to_datetime(frame['datetime']).astype('datetime64[ns]'))
+        rows.append(frame)
+    table = pd.concat(rows, ignore_index=True)
+    columns = ['station', 'datetime'] + [c for c in WEATHER_COLUMNS if c in table] + [c for c in POLLUTANTS if c in table] + ['Air_index']
+    table = table[columns]
+    table['station'] = table['station'].astype('category')
+    return table
+
+
+def station_frame(table: pd.DataFrame, station: str) -> pd.DataFrame:
+    """Rows of one station in the forecaster layout, as the forecast files had them."""
+    rows = table[table['station'] == station].drop(columns='station').reset_index(drop=True)
+    return rows.rename(columns={poll: f'{poll}_{station}' for poll in POLLUTANTS})
+
+
+def publish(frames: dict, models: dict = None, directory: Path = FORECAST_DIR, run_time: datetime = None) -> Path:
+    """
+    Publish the forecasts of a run. Stations the run did not forecast keep their
+    rows (and model versions) from the current artifact.
+
+    Args:
+        frames: Station acronym to its forecast frame (forecaster layout)
+        models: Model key to its version, recorded in the manifest
+
+    Returns:
+        Path of the new artifact
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    run_time = run_time or datetime.now()
+    run_id = run_time.strftime('%Y%m%dT%H%M%S%f')
+    previous_manifest = read_manifest(directory) or {}
+    table = to_table(frames, read_forecasts(directory))
+
+    path = directory / f'forecasts-{run_id}.arrow'
+    tmp_path = path.with_suffix('.arrow.tmp')
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+    _write_json({
+        'format_version': FORMAT_VERSION,
+        'artifact': path.name,
+        'run_timestamp': run_time.isoformat(timespec='seconds'),
+        'stations': sorted(table['station'].unique()),
+        'rows': len(table),
+        'first_datetime': table['datetime'].min().isoformat(),
+        'last_datetime': table['datetime'].max().isoformat(),
+        'models': {**previous_manifest.get('models', {}), **(models or {})},
+    }, manifest_path(directory))
+
+    older = sorted((p for p in directory.glob('forecasts-*.arrow') if p != path), key=lambda p: p.stat().st_mtime_ns)
+    for old in older[:max(0, len(older) - KEEP_ARTIFACTS + 1)]:
+        old.unlink()
+    return path
+
+
+@lru_cache(maxsize=2)
+def _read_artifact(path: str) -> pd.DataFrame:
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def read_forecasts(directory: Path = FORECAST_DIR):
+    """Rows of the current artifact (shared, do not modify), or None when there is none."""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    path = Path(directory) / manifest['artifact']
+    if not path.exists():
+        return None
+    return _read_artifact(str(path))
+
+
+def legacy_path(station: str, directory: Path = FORECAST_DIR) -> Path:
+    return Path(directory) / f'{station}_forecast.xlsx'
+
+
+def convert(stations: list = None, directory: Path = FORECAST_DIR) -> Path:
+    """Publish the `{STATION}_forecast.xlsx` files of older runs as an artifact."""
+    directory = Path(directory)
+    stations = stations or sorted(p.name[:-len('_forecast.xlsx')] for p in directory.glob('*_forecast.xlsx'))
+    frames = {station: pd.read_excel(legacy_path(station, directory)) for station in stations}
+    run_time = datetime.fromtimestamp(max(legacy_path(station, directory).stat().st_mtime for station in stations))
+    return publish(frames, directory=directory, run_time=run_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Published forecast artifact.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('show', help='Print the manifest of the current artifact')
+    convert_parser = subparsers.add_parser('convert', help='Publish the xlsx forecast files as an artifact')
+    convert_parser.add_argument('--stations', nargs='+', help='Station acronyms, e.g. MER BJU (default: every xlsx file)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        manifest = read_manifest()
+        print(json.dumps(manifest, indent=2) if manifest else 'No forecast artifact published yet.')
+    elif args.command == 'convert':
+        print(f"Published {convert(args.stations)}")
+
+
+if __name__ == '__main__':
+    main()
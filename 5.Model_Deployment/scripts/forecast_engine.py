@@ -0,0 +1,203 @@
+'''
+  Batched recursive forecaster for the per station/pollutant LightGBM models.
+
+  Every model is trained on the same 18 features (see `4.Model_Development`):
+  weather of the station, festival/weekend flags, the log1p lags 1, 2, 3, 24, 48, 72
+  of its own target and calendar features. Only lags 1-3 depend on earlier
+  predictions, so the whole horizon is laid out once in a preallocated NumPy array of
+  shape (series, horizon, features) and each step predicts the row of every series
+  in a single batched call before feeding the results into the next lags. That call
+  goes to the compiled NumPy trees of `scripts/tree_inference.py` by default; the
+  `lightgbm` backend (`BoosterBatch`) keeps one `Booster.predict` call per series and
+  step, as many as predicting row by row, and is there as the reference.
+'''
+import warnings
+
+import numpy as np
+import pandas as pd
+
+LAGS = [1, 2, 3, 24, 48, 72]
+
+# Weather columns as returned by `get_weather_data`
+WEATHER_COLUMNS = ['direct_radiation (W/m²)', 'RH', 'TMP', 'WDR', 'WSP', 'is_festival', 'is_weekend']
+
+CALENDAR_FEATURES = ['day', 'month', 'year', 'hour', 'weekday']
+
+# Station independent feature layout, the models use a permutation of it
+FEATURES = [*WEATHER_COLUMNS, *[f'lag_{lag}' for lag in LAGS], *CALENDAR_FEATURES]
+
+# Inference backends, see scripts/tree_inference.py
+BACKENDS = ['lightgbm', 'compiled']
+DEFAULT_BACKEND = 'compiled'
+
+
+def generic_feature_name(feature: str, pollutant: str, station: str) -> str:
+    """Map a model feature such as `PM25_MER_log_lag_24` or `RH_MER` to its `FEATURES` name."""
+    lag_prefix = f'{pollutant}_{station}_log_'
+    if feature.startswith(lag_prefix):
+        return feature[len(lag_prefix):]
+    if feature == 'direct_radiation_(W/m²)':
+        return 'direct_radiation (W/m²)'
+    if feature.endswith(f'_{station}'):
+        return feature[:-len(station) - 1]
+    return feature
+
+
+def calendar_features(dates: pd.DatetimeIndex) -> np.ndarray:
+    """Calendar block (day, month, year, hour, weekday) for the given dates."""
+    return np.column_stack([dates.day, dates.month, dates.year, dates.hour, dates.weekday]).astype(float)
+
+
+def feature_permutation(names: list, pollutant: str, station: str, layout: list = FEATURES) -> np.ndarray:
+    """Positions in `layout` of the features a booster was trained with, in its order."""
+    return np.array([layout.index(generic_feature_name(name, pollutant, station)) for name in names])
+
+
+class BoosterBatch:
+    """
+    Predicts with the booster of each series.
+
+    Rows come in a shared feature layout (`FEATURES` unless another `layout` is given)
+    and are permuted into the feature order each booster was trained with. `predict`
+    still makes one `Booster.predict` call per series, so a recursive step costs as
+    much as predicting row by row: no speedup, the reference for the compiled backend.
+    """
+
+    def __init__(self, keys: list, boosters: list, layout: list = FEATURES):
+        self.keys = keys
+        self.boosters = boosters
+        self.permutations = [feature_permutation(booster.feature_name(), pollutant, station, layout)
+                             for (pollutant, station), booster in zip(keys, boosters)]
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        """One row per series, shape (series, features)."""
+        out = np.empty(len(rows))
+        for i, (booster, permutation) in enumerate(zip(self.boosters, self.permutations)):
+            out[i] = booster.predict(rows[i:i + 1, permutation])[0]
+        return out
+
+    def predict_block(self, features: np.ndarray) -> np.ndarray:
+        """Every row of every series at once, shape (series, rows, features), one call per booster."""
+        out = np.empty(features.shape[:2])
+        for i, (booster, permutation) in enumerate(zip(self.boosters, self.permutations)):
+            out[i] = booster.predict(features[i][:, permutation])
+        return out
+
+
+def make_predictor(keys: list, models, layout: list = FEATURES, backend: str = DEFAULT_BACKEND):
+    """
+    Predictor of an inference backend for the (pollutant, station) `keys` of `models`:
+    `BoosterBatch` or its compiled NumPy counterpart. Models the compiled backend does
+    not support (categorical splits, linear trees) fall back to `BoosterBatch`.
+    """
+    if backend == 'compiled':
+        # Imported here, the compiled backend builds on this module
+        from scripts.tree_inference import CompiledForest, parse_booster
+        try:
+            # A registry keeps the parsed trees on disk next to the models
+            if hasattr(models, 'trees'):
+                trees = [models.trees(f'{poll}_{station}') for poll, station in keys]
+            else:
+                trees = [parse_booster(models[f'{poll}_{station}']) for poll, station in keys]
+            return CompiledForest(keys, trees, layout)
+        except ValueError as error:
+            warnings.warn(f"Models cannot be compiled ({error}), predicting with Booster.predict")
+            backend = 'lightgbm'
+    if backend == 'lightgbm':
+        return BoosterBatch(keys, [models[f'{poll}_{station}'] for poll, station in keys], layout)
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+class RecursiveForecaster:
+    """
+    Forecast every (pollutant, station) series of `models` together.
+
+    Args:
+        models: Mapping of `{pollutant}_{station}` to a fitted booster
+        horizon: Number of hourly steps to forecast
+        backend: Inference backend of the default predictor, one of `BACKENDS`
+    """
+
+    def __init__(self, models: dict, horizon: int = 24, backend: str = DEFAULT_BACKEND):
+        self.models = models
+        self.horizon = horizon
+        self.backend = backend
+
+    def _series(self, stations: list, pollutants: list) -> list:
+        return [(poll, station) for station in stations for poll in pollutants if f'{poll}_{station}' in self.models]
+
+    def build_features(self, series: list, histories: dict, weather: dict):
+        """
+        Lay out the feature array for the whole horizon.
+
+        Returns the (series, horizon, features) array, the future dates of every station
+        and the lag_1..3 column indices that are filled in while predicting.
+        """
+        n_features = len(FEATURES)
+        features = np.full((len(series), self.horizon, n_features), np.nan)
+        lag_slots = {lag: FEATURES.index(f'lag_{lag}') for lag in LAGS}
+        weather_slots = [FEATURES.index(col) for col in WEATHER_COLUMNS]
+        calendar_slots = [FEATURES.index(col) for col in CALENDAR_FEATURES]
+        steps = np.arange(self.horizon)
+
+        future_dates = {}
+        for station in {station for _, station in series}:
+            last_date = histories[station]['datetime'].max()
+            future_dates[station] = pd.date_range(last_date + pd.Timedelta(hours=1), periods=self.horizon, freq='h')
+
+        for s, (pollutant, station) in enumerate(series):
+            dates = future_dates[station]
+            station_weather = weather[station].set_index(pd.to_datetime(weather[station]['datetime']))
+            station_weather = station_weather[~station_weather.index.duplicated()].reindex(dates)
+            features[s][:, weather_slots] = station_weather[WEATHER_COLUMNS].to_numpy(dtype=float)
+            features[s][:, calendar_slots] = calendar_features(dates)
+
+            # Lags that still point into the history, the rest are filled step by step
+            history = np.log1p(histories[station][f'{pollutant}_{station}'].tail(max(LAGS)).to_numpy(dtype=float))
+            for lag, slot in lag_slots.items():
+                known = steps < lag
+                offsets = len(history) - (lag - steps[known])
+                valid = offsets >= 0
+                features[s, steps[known][valid], slot] = history[offsets[valid]]
+
+        recursive_lags = [(lag, lag_slots[lag]) for lag in LAGS if lag < self.horizon]
+        return features, future_dates, recursive_lags
+
+    def forecast(self, histories: dict, weather: dict, stations: list, pollutants: list, predictor=None) -> dict:
+        """
+        Forecast `horizon` hours after the last row of each station history.
+
+        Args:
+            histories: Station acronym to its recent history (at least 72 rows)
+            weather: Station acronym to its weather frame (`get_weather_data` layout)
+            stations: Station acronyms to forecast
+            pollutants: Pollutants to forecast
+            predictor: Object with `predict(rows)`, defaults to the one of `backend`
+
+        Returns:
+            Mapping of station acronym to a frame with `datetime` and one
+            `{pollutant}_{station}` column per forecasted pollutant
+        """
+        series = self._series(stations, pollutants)
+        if not series:
+            return {}
+        if predictor is None:
+            predictor = make_predictor(series, self.models, backend=self.backend)
+
+        features, future_dates, recursive_lags = self.build_features(series, histories, weather)
+        predictions_log = np.empty((len(series), self.horizon))
+
+        for step in range(self.horizon):
+            predictions_log[:, step] = predictor.predict(features[:, step, :])
+            # Feed the new prediction into the lags of the following steps
+            for lag, slot in recursive_lags:
+                if step + lag < self.horizon:
+                    features[:, step + lag, slot] = predictions_log[:, step]
+
+        predictions = np.expm1(predictions_log)
+        results = {}
+        for s, (pollutant, station) in enumerate(series):
+            if station not in results:
+                results[station] = pd.DataFrame({'datetime': future_dates[station]})
+            results[station][f'{pollutant}_{station}'] = predictions[s]
+        return results
@@ -0,0 +1,187 @@
+'''
+  Prebuilt, simplified alcaldía layer for the choropleth map.
+
+  `build` simplifies the polygons of `limite-de-las-alcaldas.json` once per zoom
+  level, keeping shared borders shared, and writes each level as compact GeoJSON to
+  `Dashboard_data/geometry`. Borders are simplified as arcs, each shared arc once
+  for both of its alcaldías, and the polygons rebuilt from them, so neighbours never
+  drift apart into gaps or overlaps. This only needs shapely 2.0 (`coverage_simplify`
+  is 2.1+, which requires Python 3.10) and also closes the slivers left between
+  alcaldías in the source, which `coverage_simplify` would keep. The map then loads the prebuilt layer and only attaches
+  the properties that change between renders (`station` and `aqi`).
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.geometry build
+'''
+import os
+import json
+import argparse
+from pathlib import Path
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SOURCE_PATH = BASE_DIR / 'Dashboard_data' / 'limite-de-las-alcaldas.json'
+GEOMETRY_DIR = BASE_DIR / 'Dashboard_data' / 'geometry'
+
+# Simplification tolerance in degrees per level (~110 m, ~30 m, ~10 m)
+TOLERANCES = {
+    'low': 0.001,
+    'medium': 0.0003,
+    'high': 0.0001,
+}
+
+# Decimals kept in the coordinates, ~1 m
+PRECISION = 5
+
+# Bumped when the way layers are built changes, so older layers are not reused
+LAYER_VERSION = 2
+
+
+def level_for_zoom(zoom: float) -> str:
+    """Coarsest level that still looks right at a Leaflet zoom level."""
+    if zoom < 10:
+        return 'low'
+    if zoom < 12:
+        return 'medium'
+    return 'high'
+
+
+def layer_path(level: str) -> Path:
+    return GEOMETRY_DIR / f'alcaldias_{level}_v{LAYER_VERSION}.geojson'
+
+
+def _round_coordinates(coordinates):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(value, PRECISION) for value in coordinates]
+    return [_round_coordinates(part) for part in coordinates]
+
+
+def _owners(faces: np.ndarray, geometries: np.ndarray) -> np.ndarray:
+    """
+    Index of the polygon each face belongs to: the one covering most of it, or for a
+    gap between polygons, the owner of the face sharing the longest border with it.
+    """
+    owner = np.full(len(faces), -1)
+    covered = np.zeros(len(faces))
+    face_index, geometry_index = shapely.STRtree(geometries).query(faces, predicate='intersects')
+    areas = shapely.area(shapely.intersection(faces[face_index], geometries[geometry_index]))
+    for f, g, area in zip(face_index, geometry_index, areas):
+        if area > covered[f]:
+            owner[f], covered[f] = g, area
+    owner[covered <= 0.5 * shapely.area(faces)] = -1
+
+    # Gaps next to other gaps are assigned in a later pass
+    tree = shapely.STRtree(faces)
+    gaps = np.flatnonzero(owner < 0)
+    while len(gaps):
+        gap_index, face_index = tree.query(faces[gaps], predicate='touches')
+        shared = shapely.length(shapely.intersection(shapely.boundary(faces[gaps[gap_index]]), shapely.boundary(faces[face_index])))
+        border = {}
+        for gap, face, length in zip(gaps[gap_index], face_index, shared):
+            if owner[face] >= 0 and length > border.get(gap, (0.0, -1))[0]:
+                border[gap] = (length, owner[face])
+        if not border:
+            break
+        for gap, (_, g) in border.items():
+            owner[gap] = g
+        gaps = np.flatnonzero(owner < 0)
+    return owner
+
+
+def simplify(geometries: list, tolerance: float) -> list:
+    """Simplify the polygons together so neighbouring alcaldías keep a common border."""
+    geometries = np.asarray(geometries, dtype=object)
+    # Node every border: a shared border becomes one arc, cut where three alcaldías meet
+    arcs = shapely.get_parts(shapely.line_merge(shapely.union_all(shapely.boundary(geometries))))
+    # Arcs keep their end points, so the simplified ones still meet
+    arcs = shapely.simplify(arcs, tolerance, preserve_topology=True)
+    # Noded again in case two simplified arcs cross, the faces then cover the city exactly
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(shapely.union_all(arcs))))
+    owner = _owners(faces, geometries)
+    return [shapely.union_all(faces[owner == i]) for i in range(len(geometries))]
+
+
+def build(levels: dict = TOLERANCES) -> dict:
+    """Write one simplified layer per level and return their sizes in bytes."""
+    with open(SOURCE_PATH, encoding='utf-8') as f:
+        source = json.load(f)
+
+    names = [feature['properties']['NOMGEO'] for feature in source['features']]
+    geometries = [shape(feature['geometry']) for feature in source['features']]
+
+    GEOMETRY_DIR.mkdir(parents=True, exist_ok=True)
+    sizes = {}
+    for level, tolerance in levels.items():
+        features = []
+        for name, geometry in zip(names, simplify(geometries, tolerance)):
+            geometry = mapping(geometry)
+            features.append({
+                "type": "Feature",
+                "properties": {"NOMGEO": name},
+                "geometry": {"type": geometry["type"], "coordinates": _round_coordinates(geometry["coordinates"])},
+            })
+
+        path = layer_path(level)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        sizes[level] = path.stat().st_size
+    return sizes
+
+
+@lru_cache(maxsize=None)
+def _load_layer(level: str, mtime_ns: int) -> dict:
+    with open(layer_path(level), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_layer(level: str = 'medium') -> dict:
+    """Prebuilt layer of a level, built first if it is missing or older than the source."""
+    path = layer_path(level)
+    if not path.exists() or path.stat().st_mtime_ns < SOURCE_PATH.stat().st_mtime_ns:
+        build()
+    return _load_layer(level, path.stat().st_mtime_ns)
+
+
+def choropleth(properties: dict, level: str = 'medium') -> dict:
+    """
+    FeatureCollection of a level with per-alcaldía properties attached.
+
+    Args:
+        properties: Alcaldía name (`NOMGEO`) to the properties to add, e.g.
+            {'Coyoacan': {'station': 'Pedregal', 'aqi': 2}}
+
+    The geometries are shared with the cached layer and must not be modified.
+    """
+    layer = load_layer(level)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {**feature["properties"], **properties.get(feature["properties"]["NOMGEO"], {})},
+                "geometry": feature["geometry"],
+            }
+            for feature in layer["features"]
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the simplified alcaldía layers of the map.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help='Simplify the alcaldía polygons for every zoom level')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        for level, size in build().items():
+            print(f"{level:<7} {TOLERANCES[level]:<7} {size / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+'''
+  Per-rerun timing of the dashboard.
+
+  Every Streamlit rerun runs inside `rerun(page)`, which collects a `RerunProfile`:
+  the wall time of each stage the pages mark with `stage(name, kind)` (a context
+  manager that also works as a decorator) and, for the loaders of the data layer
+  wrapped with `cached`, how many calls were answered from Streamlit's caches.
+
+  At the end of the rerun the profile is written as one JSON log line on the
+  `scripts.instrumentation` logger; `render_panel` shows it in the sidebar when the
+  app runs with `?debug=1` in the URL or `AQI_DEBUG=1` in the environment. Outside a
+  rerun (the forecast job, benchmarks, imports) stages are not recorded. Other one-off
+  measurements go to the same logger with `log_event`.
+
+  Streamlit is only imported by the functions that need a session, so processes
+  without it (the JSON API, jobs) can use the logger and the stages.
+'''
+import os
+import json
+import time
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    # Streamlit only configures its own loggers, so the profile lines get a handler here
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# What a stage spends its time on
+KINDS = ['load', 'compute', 'render']
+
+DEBUG_ENV = 'AQI_DEBUG'
+DEBUG_PARAM = 'debug'
+
+_current = contextvars.ContextVar('rerun_profile', default=None)
+
+
+class RerunProfile:
+    """Stage durations and cache calls of one rerun."""
+
+    def __init__(self, page: str = None):
+        self.page = page
+        # {stage: {'kind', 'seconds', 'calls'}}, in the order the stages first ran
+        self.stages = {}
+        # {cache: {'calls', 'misses'}}
+        self.caches = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def add_stage(self, name: str, kind: str, seconds: float):
+        entry = self.stages.setdefault(name, {'kind': kind, 'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+
+    def cache_call(self, name: str):
+        self.caches.setdefault(name, {'calls': 0, 'misses': 0})['calls'] += 1
+
+    def cache_miss(self, name: str):
+        self.caches.setdefault(name, {'calls': 0, 'misses': 0})['misses'] += 1
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def hit_rate(self, name: str):
+        """Share of the calls to a cache answered without running the loader, None if never called."""
+        entry = self.caches[name]
+        if not entry['calls']:
+            return None
+        return max(0, entry['calls'] - entry['misses']) / entry['calls']
+
+    def by_kind(self) -> dict:
+        """Seconds spent per kind of stage."""
+        totals = dict.fromkeys(KINDS, 0.0)
+        for entry in self.stages.values():
+            totals[entry['kind']] = totals.get(entry['kind'], 0.0) + entry['seconds']
+        return totals
+
+    def as_record(self) -> dict:
+        return {
+            'event': 'rerun',
+            'page': self.page,
+            'total_ms': round(1000 * (self.seconds or 0.0), 1),
+            'kinds_ms': {kind: round(1000 * seconds, 1) for kind, seconds in self.by_kind().items()},
+            'stages': {name: {'kind': entry['kind'], 'ms': round(1000 * entry['seconds'], 1), 'calls': entry['calls']}
+                       for name, entry in self.stages.items()},
+            'caches': {name: {'calls': entry['calls'], 'misses': entry['misses'], 'hit_rate': self.hit_rate(name)}
+                       for name, entry in self.caches.items()},
+        }
+
+
+def log_event(event: str, **fields):
+    """Write one JSON log line, e.g. `log_event('cache_reload', seconds=1.2)`."""
+    logger.info(json.dumps({'event': event, **fields}))
+
+
+def current():
+    """Profile of the rerun in progress, None outside a rerun."""
+    return _current.get()
+
+
+@contextmanager
+def rerun(page: str = None):
+    """Profile the code of one rerun and log it when it ends (also when it raises)."""
+    profile = RerunProfile(page)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile.finish()
+        logger.info(json.dumps(profile.as_record()))
+
+
+@contextmanager
+def stage(name: str, kind: str = 'compute'):
+    """
+    Time a stage of the current rerun, e.g. `with stage('map', 'render'): ...` or
+    `@stage('chart')` on a function. `kind` is one of `KINDS`.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, kind, time.perf_counter() - start)
+
+
+def cached(name: str, cache):
+    """
+    Wrap a loader in a Streamlit cache decorator (e.g.
+    `st.cache_resource(ttl=3600)`) and count its calls and misses in the current
+    rerun: the loader itself only runs on a miss.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def load(*args, **kwargs):
+            profile = _current.get()
+            if profile is not None:
+                profile.cache_miss(name)
+            return func(*args, **kwargs)
+
+        cached_load = cache(load)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            profile = _current.get()
+            if profile is not None:
+                profile.cache_call(name)
+            return cached_load(*args, **kwargs)
+
+        call.clear = cached_load.clear
+        return call
+    return decorate
+
+
+def debug_enabled() -> bool:
+    if os.environ.get(DEBUG_ENV, '') not in ('', '0'):
+        return True
+    import streamlit as st
+    try:
+        return st.query_params.get(DEBUG_PARAM, '0') not in ('', '0')
+    except Exception:
+        # No Streamlit session (bare mode)
+        return False
+
+
+def render_panel(profile: RerunProfile):
+    """Stage times and cache hit rates of a finished rerun, for the sidebar."""
+    import streamlit as st
+
+    with st.expander(f"Profile: {1000 * (profile.seconds or 0.0):.0f} ms", expanded=False):
+        record = profile.as_record()
+        st.caption(" · ".join(f"{kind} {ms:.0f} ms" for kind, ms in record['kinds_ms'].items()))
+        if record['stages']:
+            st.dataframe(
+                [{'stage': name, 'kind': entry['kind'], 'ms': entry['ms'], 'calls': entry['calls']} for name, entry in record['stages'].items()],
+                hide_index=True,
+            )
+        if record['caches']:
+            st.dataframe(
+                [{'cache': name, 'calls': entry['calls'], 'misses': entry['misses'],
+                  'hit rate': '-' if entry['hit_rate'] is None else f"{entry['hit_rate']:.0%}"} for name, entry in record['caches'].items()],
+                hide_index=True,
+            )
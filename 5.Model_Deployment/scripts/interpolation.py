@@ -0,0 +1,187 @@
+'''
+  Air and Health index away from the stations, by inverse distance weighting.
+
+  Only a few alcaldías have a station of their own. `AqiSurface` estimates the
+  pollutant readings at any set of points (the alcaldía centroids by default, or the
+  cells of a grid) as the inverse distance weighted mean of the stations around them,
+  found with a KD-tree, and categorizes the estimates into the index. The weights only
+  depend on where the stations and points are, so they are computed once as a
+  (points, stations) matrix and the latest readings and all forecast hours of every
+  pollutant are interpolated with a single matrix product.
+
+  The latest readings of the stations themselves are categorized the same way, so a
+  map can colour the alcaldías with a station and the estimated ones with one
+  definition of the index (the stored `AirQualityIndex` is the city-wide published
+  one, not comparable with the estimates).
+'''
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from shapely.geometry import shape
+
+from scripts.aqi_index import POLLUTANTS, categorize, NO_DATA
+from scripts.geometry import load_layer
+
+# Distances are computed on a flat projection around Mexico City, in km
+EARTH_RADIUS = 6371.0
+REFERENCE_LATITUDE = 19.4
+
+POWER = 2
+# Stations further away than this do not count for a point, km
+MAX_DISTANCE = 25.0
+# Points closer than this to a station take its readings, km
+MIN_DISTANCE = 1e-6
+
+
+def project(lat, lon) -> np.ndarray:
+    """(lat, lon) in degrees to (x, y) in km on an equirectangular projection."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    x = np.radians(lon) * np.cos(np.radians(REFERENCE_LATITUDE)) * EARTH_RADIUS
+    y = np.radians(lat) * EARTH_RADIUS
+    return np.column_stack([x, y])
+
+
+def municipality_centroids(level: str = 'low') -> dict:
+    """Alcaldía name (`NOMGEO`) to the (lat, lon) of a point inside its polygon."""
+    centroids = {}
+    for feature in load_layer(level)['features']:
+        point = shape(feature['geometry']).representative_point()
+        centroids[feature['properties']['NOMGEO']] = (point.y, point.x)
+    return centroids
+
+
+class IDW:
+    """
+    Inverse distance weights from a set of stations to target points.
+
+    Args:
+        lat, lon: Station coordinates in degrees
+        power: Exponent of the distance in the weights
+        k: Nearest stations used per point, all by default
+        max_distance: Stations further away than this (km) are ignored
+    """
+
+    def __init__(self, lat, lon, power: float = POWER, k: int = None, max_distance: float = MAX_DISTANCE):
+        self.points = project(lat, lon)
+        self.tree = cKDTree(self.points)
+        self.power = power
+        self.k = min(k or len(self.points), len(self.points))
+        self.max_distance = max_distance
+
+    def weights(self, lat, lon) -> np.ndarray:
+        """(targets, stations) matrix of the weights, rows of points out of reach are all zero."""
+        targets = project(lat, lon)
+        distances, indexes = self.tree.query(targets, k=self.k, distance_upper_bound=self.max_distance)
+        distances, indexes = distances.reshape(len(targets), -1), indexes.reshape(len(targets), -1)
+        # Missing neighbours come back with an infinite distance and an out of range index
+        found = np.isfinite(distances)
+        weights = np.zeros((len(targets), len(self.points)))
+        rows = np.broadcast_to(np.arange(len(targets))[:, None], distances.shape)
+        weights[rows[found], indexes[found]] = np.maximum(distances[found], MIN_DISTANCE) ** -self.power
+        return weights
+
+    @staticmethod
+    def interpolate(weights: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Weighted means of `values` (stations, ...) at every target, shape (targets, ...).
+        Missing (NaN) readings are left out of the mean, NaN where no station has one.
+        """
+        flat = values.reshape(len(values), -1)
+        present = ~np.isnan(flat)
+        numerator = weights @ np.where(present, flat, 0.0)
+        denominator = weights @ present
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimates = np.where(denominator > 0, numerator / denominator, np.nan)
+        return estimates.reshape(len(weights), *values.shape[1:])
+
+
+def index_of(values: np.ndarray, pollutants: list) -> np.ndarray:
+    """Index of readings whose last axis holds `pollutants`, `NO_DATA` where none is known."""
+    categories = np.stack([categorize(values[..., p], poll) for p, poll in enumerate(pollutants)], axis=-1)
+    return categories.max(axis=-1) if len(pollutants) else np.full(values.shape[:-1], NO_DATA, dtype=np.int8)
+
+
+class AqiSurface:
+    """
+    Estimated readings and index at named points, for the latest hour and every
+    forecast hour.
+
+    Build it with `AqiSurface.build(history, forecast, stations, targets)` from frames
+    with `datetime`, `station` and one column per pollutant (the data layer layout).
+    """
+
+    def __init__(self, names: list, pollutants: list, current: np.ndarray, dates: pd.DatetimeIndex, forecast: np.ndarray,
+                 stations: list = (), station_current: np.ndarray = None):
+        self.names = list(names)
+        self.pollutants = list(pollutants)
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        # (points, pollutants) and (points, hours, pollutants)
+        self.current = current
+        self.dates = dates
+        self.forecast = forecast
+        self.current_index = index_of(current, self.pollutants)
+        self.forecast_index = index_of(forecast, self.pollutants)
+        # Latest readings of the stations, (stations, pollutants)
+        self.stations = list(stations)
+        self._station_positions = {name: i for i, name in enumerate(self.stations)}
+        if station_current is None:
+            station_current = np.full((len(self.stations), len(self.pollutants)), np.nan)
+        self.station_current = station_current
+        self.station_current_index = index_of(station_current, self.pollutants)
+
+    @classmethod
+    def build(cls, history: pd.DataFrame, forecast: pd.DataFrame, stations: dict, targets: dict,
+              pollutants: list = POLLUTANTS, horizon: int = 24, **idw_options) -> 'AqiSurface':
+        """
+        Args:
+            stations: Station name to its {'lat', 'lon'}, stations without rows are skipped
+            targets: Point name to its (lat, lon)
+        """
+        pollutants = [poll for poll in pollutants if poll in history]
+        names = [name for name in stations if (history['station'] == name).any()]
+        idw = IDW([stations[name]['lat'] for name in names], [stations[name]['lon'] for name in names], **idw_options)
+        lat, lon = zip(*targets.values()) if targets else ((), ())
+        weights = idw.weights(lat, lon)
+
+        # Latest reading of every station, (stations, pollutants)
+        latest = history.loc[history.groupby('station', observed=True)['datetime'].idxmax()]
+        current = latest.set_index('station').reindex(names)[pollutants].to_numpy(dtype=float)
+
+        # Every forecast hour of every station, (stations, hours, pollutants), over the
+        # hours that every station with a forecast covers
+        dates = pd.DatetimeIndex([])
+        upcoming = np.full((len(names), 0, len(pollutants)), np.nan)
+        if forecast is not None:
+            forecast = forecast[forecast['station'].isin(names)]
+        if forecast is not None and not forecast.empty:
+            forecast = forecast.assign(datetime=pd.to_datetime(forecast['datetime']))
+            spans = forecast.groupby('station', observed=True)['datetime'].agg(['min', 'max'])
+            dates = pd.date_range(spans['min'].max(), spans['max'].min(), freq='h')[:horizon]
+            grid = pd.MultiIndex.from_product([names, dates], names=['station', 'datetime'])
+            rows = forecast.drop_duplicates(['station', 'datetime']).set_index(['station', 'datetime'])
+            upcoming = rows.reindex(grid)[pollutants].to_numpy(dtype=float).reshape(len(names), len(dates), len(pollutants))
+
+        # Latest hour and forecast hours in one product
+        values = IDW.interpolate(weights, np.concatenate([current[:, None, :], upcoming], axis=1))
+        return cls(targets, pollutants, values[:, 0, :], dates, values[:, 1:, :], names, current)
+
+    def __contains__(self, name) -> bool:
+        return name in self._positions
+
+    def index(self, name: str) -> int:
+        """Estimated index of a point for the latest hour, `NO_DATA` if no station is in reach."""
+        return int(self.current_index[self._positions[name]])
+
+    def has_station(self, station: str) -> bool:
+        return station in self._station_positions
+
+    def station_index(self, station: str) -> int:
+        """
+        Index of the latest reading of a station, categorized from its pollutants like
+        the estimates, `NO_DATA` if none of them was measured.
+        """
+        return int(self.station_current_index[self._station_positions[station]])
+
+    def forecast_indexes(self, name: str) -> pd.Series:
+        """Estimated index of a point for every forecast hour."""
+        return pd.Series(self.forecast_index[self._positions[name]], index=self.dates)
@@ -1,345 +1,89 @@
-def get_text(key, language):
-    translations = {
-        'nav_title': {
-            'en': 'Mexico City Air and Health Index Forecast',
-            'es': 'Monitor del Índice Aire y Salud de México'
-        },
-        'select_page': {
-            'en': 'Select Page',
-            'es': 'Seleccionar página'
-        },
-        'page1': {
-            'en': 'Air and Health Index Heatmap',
-            'es': 'Mapa de Calor Índice Aire y Salud'
-        },
-        'forecast': {
-            'en': 'Forecast',
-            'es': 'Pronostico'
-        },
-        'main': {
-            'en': 'Home',
-            'es': 'Inicio'
-        },
-        'information': {
-            'en': 'Information',
-            'es': 'Información'
-        },
-        'current_aqi': {
-            'en': 'Current Air and Health Index',
-            'es': 'Índice Aire y Salud Actual'
-        },
-        'pollutant_levels': {
-            'en': 'Pollutant Levels',
-            'es': 'Niveles de Contaminantes'
-        },
-        'station_aqi': {
-            'en': 'Station Air and Health Index',
-            'es': 'Niveles del Índice Aire y Salud por Estación'
-        },
-        'refresh_map': {
-            'en': 'Refresh Map',
-            'es': 'Actualizar Mapa'
-        },
-        'aqi_heatmap': {
-            'en': 'Air and Health Index Heatmap of Mexico Monitoring Stations',
-            'es': 'Mapa de Calor Índice Aire y Salud de Estaciones de Monitoreo'
-        },
+'''
+  Translations of the dashboard text.
+
+  Each language is a `Dashboard_data/translations/{language}.json` file mapping text
+  keys to strings. The files are read and validated once at import into a frozen
+  catalog, and `get_text` lookups are memoized per (key, language).
+
+  A new language (e.g. `nah.json` for Nahuatl) only needs the keys it translates: a
+  `"_fallback": "es"` entry fills the rest from another language when the catalog
+  is loaded, so lookups stay a single dictionary access.
+'''
+import json
+from pathlib import Path
+from functools import lru_cache
+from types import MappingProxyType
+
+TRANSLATIONS_DIR = Path(__file__).resolve().parent.parent / 'Dashboard_data' / 'translations'
+
+# Language whose keys every other language is checked against
+REFERENCE_LANGUAGE = 'en'
+
+FALLBACK_KEY = '_fallback'
+
+
+def _read_language(path: Path) -> dict:
+    with open(path, encoding='utf-8') as f:
+        texts = json.load(f)
+    if not isinstance(texts, dict):
+        raise ValueError(f"{path.name}: expected an object of key to text")
+    for key, text in texts.items():
+        if not isinstance(text, str):
+            raise ValueError(f"{path.name}: text of '{key}' is not a string")
+    return texts
+
+
+def load_catalog(directory: Path = TRANSLATIONS_DIR) -> MappingProxyType:
+    """
+    Read and validate every language file of `directory`.
 
-        # AQI Status translations
-        'good': {
-            'en': 'Good',
-            'es': 'Buena'
-        },
-        'acceptable': {
-            'en': 'Acceptable',
-            'es': 'Aceptable'
-        },
-        'bad': {
-            'en': 'Bad',
-            'es': 'Mala'
-        },
-        'verybad': {
-            'en': 'Very Bad',
-            'es': 'Muy Mala'
-        },
-        'extremelybad': {
-            'en': 'Extremely Bad',
-            'es': 'Extremadamente Mala'
-        },
-        'nodata': {
-            'en': 'No data or under maintenance',
-            'es': 'Sin datos o en mantenimiento'
-        },
-        'moderate': {
-            'en': 'Moderate',
-            'es': 'Moderado'
-        },
-        'unhealthy_sensitive': {
-            'en': 'Unhealthy for Sensitive Groups',
-            'es': 'Poco saludable para grupos sensibles'
-        },
-        'unhealthy': {
-            'en': 'Unhealthy',
-            'es': 'Poco saludable'
-        },
-        'very_unhealthy': {
-            'en': 'Very Unhealthy',
-            'es': 'Muy poco saludable'
-        },
-        'hazardous': {
-            'en': 'Hazardous',
-            'es': 'Peligroso'
-        },
+    Raises ValueError for malformed files, keys missing from a language without
+    fallback, keys unknown to the reference language and unknown fallbacks.
+    """
+    raw = {path.stem: _read_language(path) for path in sorted(Path(directory).glob('*.json'))}
+    if REFERENCE_LANGUAGE not in raw:
+        raise ValueError(f"Missing the reference language file {REFERENCE_LANGUAGE}.json in {directory}")
+    reference_keys = set(raw[REFERENCE_LANGUAGE]) - {FALLBACK_KEY}
 
-        # Station translations
-        'Ajusco Medio': {
-            'en': 'Ajusco Medio',
-            'es': 'Ajusco Medio'
-        },
-        'Ajusco': {
-            'en': 'Ajusco',
-            'es': 'Ajusco'
-        },
-        'Benito Juarez': {
-            'en': 'Benito Juarez',
-            'es': 'Benito Juárez'
-        },
-        'Hospital General': {
-            'en': 'General Hospital',
-            'es': 'Hospital General de México'
-        },
-        'Merced': {
-            'en': 'Merced',
-            'es': 'Merced'
-        },
-        'Miguel Hidalgo': {
-            'en': 'Miguel Hidalgo',
-            'es': 'Miguel Hidalgo'
-        },
-        'Milpa Alta': {
-            'en': 'Milpa Alta',
-            'es': 'Milpa Alta'
-        },
-        'Pedregal': {
-            'en': 'Pedregal',
-            'es': 'Pedregal'
-        },
-        'San Agustin': {
-            'en': 'San Agustin',
-            'es': 'San Agustín'
-        },
-        'Santa Fe': {
-            'en': 'Santa Fe',
-            'es': 'Santa Fe'
-        },
-        'Tlalnepantla': {
-            'en': 'Tlalnepantla',
-            'es': 'Tlalnepantla'
-        },
-        'UAM Iztapalapa': {
-            'en': 'UAM Iztapalapa',
-            'es': 'UAM Iztapalapa'
-        },
-        'Xalostoc': {
-            'en': 'Xalostoc',
-            'es': 'Xalostoc'
-        },
-        'station': {
-            'en': 'Station',
-            'es': 'Estación'
-        },
-        'select_station': {
-            'en': 'Select Station',
-            'es': 'Seleccionar Estación'
-        },
-        'All Stations': {
-            'en': 'All Stations',
-            'es': 'Todas las Estaciones'
-        },
-        'current_forecast': {
-            'en': 'Air Quality Forecast',
-            'es': 'Pronostico de Calidad del Aire'
-        },
-        'air_quality_index': {
-            'en': 'Air and Health Index',
-            'es': 'Índice de calidad del aire'
-        },
-        'humidity': {
-            'en': 'Humidity',
-            'es': 'Humedad'
-        },
-        'relative_humidity': {
-            'en': 'Relative Humidity',
-            'es': 'Humedad relativa'
-        },
-        'pressure': {
-            'en': 'Pressure',
-            'es': 'Presión'
-        },
-        'wind_speed': {
-            'en': 'Wind Speed',
-            'es': 'Velocidad del viento'
-        },
-        'wind_direction': {
-            'en': 'Wind Direction',
-            'es': 'Dirección del viento'
-        },
-        'o3': {
-            'en': 'Ozone',
-            'es': 'Ozono'
-        },
-        'no2': {
-            'en': 'Nitrogen Dioxide',
-            'es': 'Dióxido de nitrógeno'
-        },
-        'pm10': {
-            'en': 'PM10',
-            'es': 'PM10'
-        },
-        'pm25': {
-            'en': 'PM2.5',
-            'es': 'PM2.5'
-        },
-        'co': {
-            'en': 'CO',
-            'es': 'CO'
-        },
-        'so2': {
-            'en': 'SO2',
-            'es': 'SO2'
-        },
-        'metric': {
-            'en': 'Metric',
-            'es': 'Métrica de medida'
-        },
-        'pollutants': {
-            'en': 'Pollutants',
-            'es': 'Contaminantes'
-        },
-        'temperature': {
-            'en': 'Temperature',
-            'es': 'Temperatura'
-        },
-        'time_of_day': {
-            'en': 'Time of day',
-            'es': 'Hora del día'
-        },
-        ### Main page
-        # Title
-        'title_mp': {
-            'en': 'Current Air and Health Index Map',
-            'es': 'Mapa actual del índice de aire y salud'
-        },
-        # messages for population
-        'air_and_heath_index': {
-            'en': 'Current Air and Health Index:',
-            'es': 'Índice de Aire y Salud Actual:'
-        },
-        'genaral_population': {
-            'en': 'General Population:',
-            'es': 'Población en General'
-        },
-        'sensitive_population': {
-            'en': 'Sensitive Population:',
-            'es': 'Población Sensible:'
-        },
-        'forecast_message': {
-            'en': 'Forecast Air and Health Index of 24 hours:',
-            'es': 'Pronóstico del Índice de Aire y Salud de 24 horas:'
-        },
-        'health_info': {
-            'en': 'Air and Health Index - Risk Associated',
-            'es': 'Índice de Aire y Salud - Riesgo Asociado'
-        },
-        'pollutantst': {
-            'en': 'Other Pollutants',
-            'es': 'Otros Contaminantes'
-        },
-        'pollutantst_text': {
-            'en': 'Particulate Matter',
-            'es': 'Material Particulado'
-        },
-        'second_col_poll': {
-            'en': 'Current levels',
-            'es': 'Niveles actuales'
-        },
-        'tableop': {
-            'en': 'Table of pollutants',
-            'es': 'Tabla de contaminantes'
-        },
-        'health_more_details': {
-            'en': 'Recommendations for the protection of your health:',
-            'es': 'Recomendaciones para la protección de tu salud:'
-        },
-        'click_here': {
-            'en': 'Link for more details',
-            'es': 'Enlace para más detalles'
-        },
-        'recommend': {
-            'en': 'Recommendations for:',
-            'es': 'Recomendaciones para:'
-        },
-        'municipality': {
-            'en': 'Municipality',
-            'es': 'Municipio'
-        },
-        'index': {
-            'en': 'Index',
-            'es': 'Índice'
-        }, 
-        'selectzone': {
-            'en': 'Can you select the zone?',
-            'es': '¿Puedes seleccionar la zona?'
-        },
-        'forexample': {
-            'en': 'E.g. Benito Juarez',
-            'es': 'Ej. Benito Juárez'
-        },
-        'mexicocity': {
-            'en': 'Mexico City',
-            'es': 'Ciudad de México'
-        },  
-        'best_time': {
-            'en': 'Best time to be outside',
-            'es': 'El mejor momento para estar al aire libre'
-        },
-        'worst_time': {
-            'en': 'Worst time to be outside',
-            'es': 'El peor momento para estar al aire libre'
-        },
-        'select_time': {
-            'en': 'Select time period',
-            'es': 'Seleccionar el período de tiempo'
-        },
-        'select_group': {
-            'en': 'Select group',
-            'es': 'Seleccionar grupo'
-        },
-        'selected': {
-            'en': 'Selected:',
-            'es': 'Seleccionado:'
-        },
-        'people_cardiovascular': {
-            'en': 'People with cardiovascular or respiratory diseases and those over 60 years of age',
-            'es': 'Personas con enfermedades cardiovasculares o respiratorias y mayores de 60 años'
-        },
-        'children_and_pregnant': {
-            'en': 'Children under 12 years old and pregnant people',
-            'es': 'Menores de 12 años y personas gestantes'
-        },
-        'general_population': {
-            'en': 'General population',
-            'es': 'Población en general'
-        },
-        'notes': {
-            'en': 'Data is sourced from the monitoring stations in Mexico City and the application is built following the [guidelines from the local authorities](https://dof.gob.mx/nota_detalle.php?codigo=5715154&fecha=25/01/2024#gsc.tab=0). The 24-hour forecast for the Air and Health Index is based on a machine learning model which has 85% accuracy. The Air and Health Index and associated messages are only for information purposes to warn the population. Please consider personal health conditions and stay up-to-date with local authorities and health providers.',
-            'es': 'Los datos provienen de las estaciones de monitoreo en la Ciudad de México, y la aplicación se construyó siguiendo [los lineamientos de las autoridades locales](https://dof.gob.mx/nota_detalle.php?codigo=5715154&fecha=25/01/2024#gsc.tab=0). El pronóstico a 24 horas para el Índice de Aire y Salud se basa en un modelo de aprendizaje automático con una precisión del 85%. El Índice de Aire y Salud y los mensajes asociados tienen únicamente fines informativos para alertar a la población. Por favor, considere las condiciones personales de salud y manténgase informado a través de las autoridades locales y los proveedores de salud.'
-        },
-        'information_based_on_selection': {
-            'en': 'Information based on selected station, time, and group',
-            'es': 'Información basada en la estación, tiempo y grupo seleccionados'
-        }
+    catalog = {}
 
-    }
-    
-    return translations.get(key, {}).get(language, key)
+    def resolve(language: str, seen: tuple = ()) -> dict:
+        if language in catalog:
+            return catalog[language]
+        if language not in raw:
+            raise ValueError(f"Unknown fallback language '{language}' of {seen[-1]}.json")
+        if language in seen:
+            raise ValueError(f"Fallback loop between {', '.join(seen)}")
+
+        texts = dict(raw[language])
+        fallback = texts.pop(FALLBACK_KEY, None)
+        unknown = set(texts) - reference_keys
+        if unknown:
+            raise ValueError(f"{language}.json: keys not in {REFERENCE_LANGUAGE}.json: {sorted(unknown)}")
+        if fallback is not None:
+            texts = {**resolve(fallback, seen + (language,)), **texts}
+        missing = reference_keys - set(texts)
+        if missing:
+            raise ValueError(f"{language}.json: missing keys {sorted(missing)}")
+
+        catalog[language] = MappingProxyType(texts)
+        return catalog[language]
+
+    for language in raw:
+        resolve(language)
+    return MappingProxyType(dict(sorted(catalog.items())))
+
+
+# Loaded once, fails at start-up rather than on some page
+TRANSLATIONS = load_catalog()
+
+LANGUAGES = tuple(TRANSLATIONS)
+
+
+@lru_cache(maxsize=None)
+def get_text(key, language):
+    """Text of `key` in `language`, the key itself when there is no translation."""
+    texts = TRANSLATIONS.get(language)
+    if texts is None:
+        return key
+    return texts.get(key, key)
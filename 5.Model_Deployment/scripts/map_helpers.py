@@ -1,95 +1,35 @@
-import os
 import folium
-from pathlib import Path
-from folium.plugins import HeatMap
-import pandas as pd
 import streamlit as st
 from scripts.language_utils import get_text
-from streamlit_plotly_mapbox_events import plotly_mapbox_events
-import plotly.express as px
-from scripts.data_handler import STATION_COORDINATES
+from scripts.data_layer import STATIONS, HISTORY_TTL, get_surface, stations_version, forecast_version
+from scripts.aqi_index import NO_DATA
+from scripts.station_snapshot import StationSnapshot
+from scripts.instrumentation import cached
 
 # New ones
-import json
-from shapely.geometry import shape
-from shapely.wkb import loads
-from shapely.wkt import dumps
 import branca
+from scripts.geometry import choropleth, level_for_zoom
+from scripts.spatial_index import municipality_stations
 
-# Comment out when actual data is there
-BASE_DIR = Path(__file__).resolve().parent.parent
-dashboard_data_path = BASE_DIR / 'Dashboard_data' / 'limite-de-las-alcaldas.json'
-
-with open(dashboard_data_path) as f:
-	geo_json_data = json.load(f)
-
-# Parse the GeoJSON to extract features
-features = geo_json_data["features"]
-
-# Extract the 'geometry' and 'name' into a list of dictionaries
-data = [
-    {"geometry": shape(feature["geometry"]), "NOMGEO": feature["properties"]["NOMGEO"]}
-    for feature in features
-]
-
-# Convert the list of dictionaries to a DataFrame
-df = pd.DataFrame(data)
-
-# Let's get the current levels of the pollutants from all the stations
-list_of_stations = {"PED": "Pedregal",
-                   "UIZ": "UAM Iztapalapa",
-                   "BJU": "Benito Juarez",
-                   "MER": "Merced"}
-
-# Now let's extract the info from the xlsx files
-
-# Path to the data
-BASE_DIR_D = Path(__file__).resolve().parent.parent.parent
-
-stations_data = pd.DataFrame()
-
-# Load the data
-for i in list(list_of_stations.keys()):
-    df_pollutants = pd.read_excel(BASE_DIR_D / '2. Data Collection' / f'{i}_merged_imputed.xlsx')
-    if 'index' in df_pollutants.columns:
-        df_pollutants = df_pollutants.drop('index', axis=1)
-    df_pollutants['station'] = list_of_stations[i]
-    df_pollutants.columns = ['datetime', 'direct_radiation (W/m²)',	'PM25', 'PM10',	'SO2', 'O3', 'NO2',	'CO', 'RH',	'TMP',	'WDR',	'WSP',	'is_festival',	'is_weekend',	'AirQualityIndex', 'station']
-    stations_data = pd.concat([stations_data, df_pollutants], ignore_index=True)
-
-forecast_data = pd.DataFrame()
-
-# Load the data
-for i in list(list_of_stations.keys()):
-    df_pollutants_f = pd.read_excel(BASE_DIR / 'Dashboard_data' / 'forecast_data' / f'{i}_forecast.xlsx')
-    if 'index' in df_pollutants_f.columns:
-        df_pollutants_f = df_pollutants_f.drop('index', axis=1)
-    df_pollutants_f['station'] = list_of_stations[i]
-    df_pollutants_f.columns = ['datetime', 'direct_radiation (W/m²)',	'PM25', 'PM10',	'SO2', 'O3', 'NO2',	'CO', 'RH',	'TMP',	'WDR',	'WSP',	'is_festival',	'is_weekend',	'AirQualityIndex', 'station']
-    forecast_data = pd.concat([forecast_data, df_pollutants_f], ignore_index=True)
-
-
-# Dictionary with municipality names and random AQI values
-municipalities_aqi = {
-    "Azcapotzalco": {"station": "Azcapotzalco", "aqi": "null"},
-    "Coyoacan": {"station": "Pedregal", "aqi": 0},
-    "Cuajimalpa de Morelos": {"station": "Cuajimalpa de Morelos", "aqi": "null"},
-    "Gustavo A. Madero": {"station": "Gustavo A. Madero", "aqi": "null"},
-    "Iztacalco": {"station": "Iztacalco", "aqi": "null"},
-    "Iztapalapa": {"station": "UAM Iztapalapa", "aqi": 0},
-    "La Magdalena Contreras": {"station": "La Magdalena Contreras", "aqi": "null"},
-    "Milpa Alta": {"station": "Milpa Alta", "aqi": "null"},
-    "Alvaro Obregon": {"station": "Alvaro Obregon", "aqi": "null"},
-    "Tlahuac": {"station": "Tlahuac", "aqi": "null"},
-    "Tlalpan": {"station": "Tlalpan", "aqi": "null"},
-    "Xochimilco": {"station": "Xochimilco", "aqi": "null"},
-    "Benito Juarez": {"station": "Benito Juarez", "aqi": 1},
-    "Cuauhtemoc": {"station": "Cuauhtemoc", "aqi": "null"},
-    "Miguel Hidalgo": {"station": "Miguel Hidalgo", "aqi": "null"},
-    "Venustiano Carranza": {"station": "Merced", "aqi": 1},
-}
-
-def update_municipalities_aqi(dataset, municipalities_aqi):
+# Initial zoom of the map, also picks the detail of the alcaldía polygons
+ZOOM_START = 10.6
+
+# Nothing is loaded at import: the data comes from the cached data layer when a
+# map is rendered, so importing this module stays cheap
+
+
+def base_municipalities_aqi():
+    """
+    Dictionary with municipality names and their station, found by point-in-polygon
+    from the station coordinates (see scripts/spatial_index.py), a new one per call.
+    Municipalities without a dashboard station keep their own name as station and no AQI.
+    """
+    return {
+        name: {"station": station or name, "aqi": 0 if station else "null"}
+        for name, station in municipality_stations(tuple(STATIONS.values())).items()
+    }
+
+def update_municipalities_aqi(dataset, municipalities_aqi, snapshot=None):
     """
     Update the municipalities_aqi dictionary with the latest AirQualityIndex values
     for each station based on the provided dataset.
@@ -97,99 +37,22 @@ def update_municipalities_aqi(dataset, municipalities_aqi):
     Parameters:
         dataset (pd.DataFrame): A DataFrame containing air quality data.
         municipalities_aqi (dict): A dictionary containing municipality information.
+        snapshot (StationSnapshot): Latest readings per station, built from `dataset` if not given.
 
     Returns:
         dict: Updated municipalities_aqi dictionary.
     """
-    # Ensure the datetime column is parsed correctly
-    dataset['datetime'] = pd.to_datetime(dataset['datetime'])
-
-    # Sort the dataset by datetime to get the latest entries
-    dataset = dataset.sort_values(by='datetime')
-
-    # Get the last available AirQualityIndex for each station
-    latest_aqi = dataset.groupby('station').last()['AirQualityIndex']
+    if snapshot is None:
+        snapshot = StationSnapshot.build(history=dataset)
 
     # Update the municipalities_aqi dictionary
     for municipality, data in municipalities_aqi.items():
         station = data['station']
-        if station in latest_aqi:
-            municipalities_aqi[municipality]['aqi'] = int(latest_aqi[station])
+        if snapshot.has_history(station):
+            municipalities_aqi[municipality]['aqi'] = int(snapshot.latest_index(station))
 
     return municipalities_aqi
 
-# Update the dictionary
-municipalities_aqi = update_municipalities_aqi(stations_data, municipalities_aqi)
-
-# Now let's merge with the municipalities dictionary. We need to bring 2 columns station and aqi
-df["station"] = df["NOMGEO"].map(lambda x: municipalities_aqi[x]["station"])
-df["aqi"] = df["NOMGEO"].map(lambda x: municipalities_aqi[x]["aqi"])
-
-def wkt_to_geojson(df):
-    
-    features = []
-    
-    for _, row in df.iterrows():
-        # Get geometry and convert to WKT string if needed
-        geom = row['geometry']
-        if hasattr(geom, 'wkt'):
-            wkt = geom.wkt
-        else:
-            wkt = str(geom)
-            
-        # Clean WKT string
-        wkt = wkt.replace("POLYGON ((", "").replace("MULTIPOLYGON (((", "").replace(")))", "").replace("))", "")
-        
-        # Split into coordinate pairs
-        rings = wkt.split("), (")
-        coordinates = []
-        
-        for ring in rings:
-            # Split coordinates and convert to float pairs
-            coords = ring.split(",")
-            ring_coords = []
-            
-            for coord in coords:
-                x, y = map(float, coord.strip().split())
-                ring_coords.append([x, y])
-            
-            # Close the ring by adding first coordinate at the end if needed
-            if ring_coords[0] != ring_coords[-1]:
-                ring_coords.append(ring_coords[0])
-                
-            coordinates.append(ring_coords)
-        
-        # Create GeoJSON feature
-        feature = {
-            "type": "Feature",
-            "properties": {
-                "NOMGEO": row['NOMGEO'],
-                "station": row['station'],
-                "aqi": row['aqi']
-            },
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": coordinates
-            }
-        }
-        
-        features.append(feature)
-    
-    # Create final GeoJSON structure
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-    
-    # Save to file
-    with open('cdmx_zones.geojson', 'w', encoding='utf-8') as f:
-        json.dump(geojson, f, ensure_ascii=False, indent=2)
-    
-    return geojson
-
-# Usage:
-geojson_data = wkt_to_geojson(df)
-
 #lang = st.session_state.language
 
 colormap = branca.colormap.LinearColormap(
@@ -198,13 +61,13 @@ colormap = branca.colormap.LinearColormap(
     colors=["#00e400", "#ffff00", "#ff7e00", "#ff0000", "#8f3f97"]
 )
 
-def classical_map(data):
+def classical_map(data, lang=None):
     """
     Create a classical map with markers for Mexican AQI stations.
     """
-    lang = st.session_state.language
+    lang = lang or st.session_state.language
     
-    m = folium.Map([19.3326, -99.1345], tiles="cartodbpositron", zoom_start=10.6,
+    m = folium.Map([19.3326, -99.1345], tiles="cartodbpositron", zoom_start=ZOOM_START,
             min_zoom=9,
             max_zoom=13)
 
@@ -236,7 +99,8 @@ def classical_map(data):
         style_function=lambda x: {
             "fillColor": colormap(x["properties"]["aqi"]) if isinstance(x["properties"]["aqi"], (int, float)) else "#C0C0C0",
             "color": "black",
-            "fillOpacity": 0.4,
+            # Alcaldías without a station show the interpolated index, lighter
+            "fillOpacity": 0.25 if x["properties"].get("estimated") else 0.4,
         },
         tooltip=tooltip,
         popup=popup,
@@ -245,4 +109,44 @@ def classical_map(data):
     #colormap.add_to(m)
     m
 
-    return m
\ No newline at end of file
+    return m
+
+
+def zone_geojson(zone=None, surface=None):
+    """
+    Alcaldía layer with the latest index of every municipality, only the ones of
+    `zone` (a station name) when given. Municipalities with a station get the index
+    of its latest pollutant readings, the others the index interpolated from the
+    stations around them and `estimated` set, both categorized the same way (see
+    scripts/interpolation.py).
+    """
+    aqi = base_municipalities_aqi()
+    surface = surface or get_surface()
+    for name, values in aqi.items():
+        station = values["station"]
+        if surface.has_station(station) and surface.station_index(station) != NO_DATA:
+            values["aqi"] = surface.station_index(station)
+        elif name in surface and surface.index(name) != NO_DATA:
+            values["aqi"], values["estimated"] = surface.index(name), True
+    layer = choropleth({name: {"station": values["station"], "aqi": values["aqi"], "estimated": values.get("estimated", False)}
+                        for name, values in aqi.items()},
+                       level=level_for_zoom(ZOOM_START))
+    if zone is None:
+        return layer
+    return {
+        "type": "FeatureCollection",
+        "features": [feature for feature in layer["features"] if feature["properties"]["station"] == zone],
+    }
+
+
+# The map only changes with the language, the selected zone, the hourly index and
+# the forecast behind the estimated alcaldías, so its HTML is rendered once per
+# combination and shared by every session
+@cached('map_html', st.cache_resource(ttl=HISTORY_TTL, max_entries=32, show_spinner=False))
+def _cached_map_html(lang, zone, version, forecast):
+    return classical_map(zone_geojson(zone), lang).get_root().render()
+
+
+def map_html(lang, zone=None):
+    """HTML document of the map for a language and zone, rebuilt when the station data or the forecast changes."""
+    return _cached_map_html(lang, zone, stations_version(), forecast_version())
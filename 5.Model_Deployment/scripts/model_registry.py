@@ -0,0 +1,190 @@
+'''
+  Lazy registry of the LightGBM boosters in `4.Model_Development/models`.
+
+  Boosters are loaded on first use by `{pollutant}_{station}` key and kept in a
+  bounded LRU, so importing the forecasting helpers no longer unpickles every model.
+  Models exported with `export` are stored next to the pickles in LightGBM's native
+  text format (`{pollutant}_{station}_model_.txt`) and preferred over the pickle
+  whenever they are at least as recent. The compiled inference backend keeps the
+  parsed trees of each model next to it as `{pollutant}_{station}_model_.npz`.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.model_registry export [--stations MER BJU] [--pollutants PM25 O3]
+'''
+import pickle
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import lightgbm as lgb
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODELS_DIR = BASE_DIR.parent / '4.Model_Development' / 'models'
+
+POLLUTANTS = ['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2']
+
+
+def model_key(pollutant: str, station: str) -> str:
+    return f'{pollutant}_{station}'
+
+
+class ModelRegistry:
+    """
+    Load boosters on demand and keep at most `max_size` of them in memory.
+
+    The registry behaves like a read-only mapping of `{pollutant}_{station}` keys to
+    `lgb.Booster` objects, so it can be passed wherever a dict of models is expected.
+    """
+
+    def __init__(self, models_dir: Path = MODELS_DIR, max_size: int = 32):
+        self.models_dir = Path(models_dir)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key being loaded, so concurrent misses on a key load it once
+        self._loading = {}
+
+    def pickle_path(self, key: str) -> Path:
+        return self.models_dir / f'{key}_model_.pkl'
+
+    def text_path(self, key: str) -> Path:
+        return self.models_dir / f'{key}_model_.txt'
+
+    def keys(self) -> list:
+        """Every key with a model on disk, in either format."""
+        names = {p.name[:-len('_model_.pkl')] for p in self.models_dir.glob('*_model_.pkl')}
+        names |= {p.name[:-len('_model_.txt')] for p in self.models_dir.glob('*_model_.txt')}
+        return sorted(names)
+
+    def __contains__(self, key) -> bool:
+        return key in self._cache or self.text_path(key).exists() or self.pickle_path(key).exists()
+
+    def _cached(self, key: str):
+        # Call with `self._lock` held
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def __getitem__(self, key: str) -> lgb.Booster:
+        with self._lock:
+            booster = self._cached(key)
+            if booster is not None:
+                return booster
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Other keys load in parallel, callers of the same key wait for the first one
+        with key_lock:
+            with self._lock:
+                booster = self._cached(key)
+            if booster is not None:
+                return booster
+            try:
+                booster = self._load(key)
+                with self._lock:
+                    self.misses += 1
+                    self._cache[key] = booster
+                    while len(self._cache) > self.max_size:
+                        self._cache.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return booster
+
+    def get(self, pollutant: str, station: str) -> lgb.Booster:
+        return self[model_key(pollutant, station)]
+
+    def _prefers_text(self, key: str) -> bool:
+        text_path = self.text_path(key)
+        pickle_path = self.pickle_path(key)
+        if not text_path.exists():
+            return False
+        return not pickle_path.exists() or text_path.stat().st_mtime >= pickle_path.stat().st_mtime
+
+    def _load(self, key: str) -> lgb.Booster:
+        text_path = self.text_path(key)
+        pickle_path = self.pickle_path(key)
+
+        if self._prefers_text(key):
+            return lgb.Booster(model_file=str(text_path))
+        if not pickle_path.exists():
+            raise KeyError(f"No model found for {key} in {self.models_dir}")
+
+        with open(pickle_path, 'rb') as f:
+            model = pickle.load(f)
+        # The notebooks save raw boosters, sklearn wrappers keep theirs in `booster_`
+        return model.booster_ if hasattr(model, 'booster_') else model
+
+    def version(self, key: str) -> dict:
+        """File a model is loaded from and a digest of it, to tell model versions apart."""
+        path = self.text_path(key) if self._prefers_text(key) else self.pickle_path(key)
+        if not path.exists():
+            raise KeyError(f"No model found for {key} in {self.models_dir}")
+        digest = hashlib.sha1(path.read_bytes()).hexdigest()[:12]
+        return {'file': path.name, 'sha1': digest}
+
+    def trees_path(self, key: str) -> Path:
+        return self.models_dir / f'{key}_model_.npz'
+
+    def trees(self, key: str):
+        """
+        Trees of a model parsed for the compiled inference backend, cached as
+        `{key}_model_.npz` and parsed again when the model file is newer.
+        """
+        # Imported here, only the compiled backend needs it
+        from scripts.tree_inference import Trees
+
+        source = self.text_path(key) if self._prefers_text(key) else self.pickle_path(key)
+        path = self.trees_path(key)
+        if path.exists() and source.exists() and path.stat().st_mtime >= source.stat().st_mtime:
+            return Trees.load(path)
+        trees = Trees.parse(self.model_string(key))
+        trees.save(path)
+        return trees
+
+    def model_string(self, key: str) -> str:
+        """Model in LightGBM's text format, read straight from disk when it was exported."""
+        if self._prefers_text(key):
+            return self.text_path(key).read_text(encoding='utf-8')
+        return self[key].model_to_string()
+
+    def export(self, keys: list = None) -> list:
+        """Save the given models (all by default) in LightGBM's native text format."""
+        written = []
+        for key in keys or self.keys():
+            path = self.text_path(key)
+            self[key].save_model(str(path))
+            written.append(path)
+        return written
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def cache_info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'max_size': self.max_size}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the LightGBM models used by the forecaster.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Save models in LightGBM's native text format")
+    export_parser.add_argument('--stations', nargs='+', help='Station acronyms (default: all)')
+    export_parser.add_argument('--pollutants', nargs='+', default=POLLUTANTS, help='Pollutants (default: all)')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry()
+    if args.command == 'export':
+        keys = [key for key in registry.keys()
+                if key.split('_')[0] in args.pollutants and (args.stations is None or key.split('_')[1] in args.stations)]
+        for path in registry.export(keys):
+            print(path.name)
+
+
+if __name__ == '__main__':
+    main()
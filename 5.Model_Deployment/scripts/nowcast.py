@@ -0,0 +1,186 @@
+'''
+  Rolling NowCast of the latest pollutant readings.
+
+  The home page shows, per station, the 3-hour mean of O3, NO2 and SO2, the 8-hour
+  mean of CO and the 12-hour weighted NowCast of PM2.5 and PM10. Those only depend on
+  the last 12 readings, so `NowCast` keeps them in a fixed-size ring buffer per
+  station and refreshes the averages of a station when readings are pushed: each
+  new hour costs a bounded amount of work (windows of 12 values at most) no matter
+  how long the history is, and all stations are answered from the stored results.
+'''
+import threading
+
+import numpy as np
+import pandas as pd
+
+POLLUTANTS = ['PM25', 'PM10', 'SO2', 'O3', 'NO2', 'CO']
+
+# Hours averaged per pollutant
+WINDOWS = {'PM25': 12, 'PM10': 12, 'CO': 8, 'SO2': 3, 'O3': 3, 'NO2': 3}
+BUFFER_SIZE = max(WINDOWS.values())
+
+ADJUSTMENT_FACTORS = {
+  'PM25': 0.694,
+  'PM10': 0.714
+}
+
+
+def nowcast_average(concentrations: np.ndarray, pollutant: str):
+  """
+  Average of the most recent readings of a pollutant (oldest first), as shown on the
+  home page: a rounded mean, "No info" when too many readings are missing, or the
+  adjusted weighted NowCast for particles.
+  """
+  concentrations = np.asarray(concentrations, dtype=float)[-WINDOWS.get(pollutant, 3):]
+
+  # Handle non-PM/CO cases early
+  if pollutant not in ['PM25', 'PM10', 'CO']:
+      return round(np.mean(concentrations), 3)
+
+  # Handle CO separately
+  if pollutant == 'CO':
+      if len(concentrations) < 8 or np.isnan(concentrations).sum() > len(concentrations) * 0.25:
+          return "No info"
+      return round(np.mean(concentrations), 3)
+
+  # Process PM data
+  last_three = concentrations[-3:]
+  last_three_null_count = np.isnan(last_three).sum()
+
+  # Check last three values
+  if last_three_null_count >= 2:
+      return "No info"
+
+  # Handle single null in last three values
+  if last_three_null_count == 1:
+      concentrations = concentrations.copy()
+      concentrations[-3:] = np.nan_to_num(last_three, nan=0)
+
+  # Check total null count
+  total_null_count = np.isnan(concentrations).sum()
+  if total_null_count > len(concentrations) * 0.25:
+      return "No info"
+
+  # Calculate PM average
+  try:
+      Cmax = np.nanmax(concentrations)
+      Cmin = np.nanmin(concentrations)
+      w = max(0.5, 1 - ((Cmax - Cmin) / Cmax))
+      powers = np.arange(len(concentrations)-1, -1, -1)
+      weights = w ** powers
+
+      # Missing hours count in neither sum
+      present = ~np.isnan(concentrations)
+      weighted_sum = np.sum(concentrations[present] * weights[present])
+      weight_sum = np.sum(weights[present])
+  except ValueError:
+      return 0
+
+  return int((weighted_sum / weight_sum) * ADJUSTMENT_FACTORS.get(pollutant, 1))
+
+
+class NowCast:
+    """
+    Ring buffer of the last `BUFFER_SIZE` hourly readings per station and pollutant.
+
+    Feed it with `push` (one reading) or `update` (rows of a history, only the ones
+    newer than what it holds are used) and read every average with `averages`.
+    Safe to share between threads.
+    """
+
+    def __init__(self, stations: list = None, pollutants: list = POLLUTANTS):
+        self.pollutants = list(pollutants)
+        self.stations = []
+        self._buffers = np.full((0, BUFFER_SIZE, len(self.pollutants)), np.nan)
+        # Slot the next reading goes to and readings held, per station
+        self._head = np.zeros(0, dtype=np.int64)
+        self._filled = np.zeros(0, dtype=np.int64)
+        self.last_datetime = []
+        # Free for the owner to record the data version it was last fed from
+        self.version = None
+        self._results = {}
+        self._lock = threading.RLock()
+        for station in stations or []:
+            self._station_index(station)
+
+    def _station_index(self, station: str) -> int:
+        if station in self.stations:
+            return self.stations.index(station)
+        self.stations.append(station)
+        self.last_datetime.append(np.datetime64('NaT', 'ns'))
+        self._buffers = np.concatenate([self._buffers, np.full((1, *self._buffers.shape[1:]), np.nan)])
+        self._head = np.append(self._head, 0)
+        self._filled = np.append(self._filled, 0)
+        return len(self.stations) - 1
+
+    def _window(self, s: int) -> np.ndarray:
+        """Readings held for a station, oldest first, shape (readings, pollutants)."""
+        n = self._filled[s]
+        return self._buffers[s, (self._head[s] - n + np.arange(n)) % BUFFER_SIZE]
+
+    def _refresh(self, s: int):
+        window = self._window(s)
+        self._results[self.stations[s]] = {poll: nowcast_average(window[:, p], poll) for p, poll in enumerate(self.pollutants)}
+
+    def _write(self, s: int, values: np.ndarray):
+        """Append readings (rows of `self.pollutants`) to a station's buffer."""
+        values = values[-BUFFER_SIZE:]
+        slots = (self._head[s] + np.arange(len(values))) % BUFFER_SIZE
+        self._buffers[s, slots] = values
+        self._head[s] = (self._head[s] + len(values)) % BUFFER_SIZE
+        self._filled[s] = min(BUFFER_SIZE, self._filled[s] + len(values))
+
+    def push(self, station: str, readings: dict, when=None):
+        """Add one hourly reading, `readings` maps pollutant to value (missing ones are NaN)."""
+        with self._lock:
+            s = self._station_index(station)
+            self._write(s, np.array([[readings.get(poll, np.nan) for poll in self.pollutants]], dtype=float))
+            if when is not None:
+                self.last_datetime[s] = pd.Timestamp(when).to_datetime64()
+            self._refresh(s)
+
+    def update(self, df: pd.DataFrame, station: str = None) -> int:
+        """
+        Add the rows of a history that are newer than the last one held for their station.
+
+        Args:
+            df: Rows sorted by `datetime` with the columns of `self.pollutants`, either
+                of one station (`station` given) or of several (with a `station` column)
+
+        Returns:
+            Number of rows added
+        """
+        if station is None:
+            groups = df.groupby('station', sort=False, observed=True)
+        else:
+            groups = [(station, df)]
+
+        added = 0
+        with self._lock:
+            for name, rows in groups:
+                s = self._station_index(name)
+                if rows.empty:
+                    continue
+                last = self.last_datetime[s]
+                if not np.isnat(last) and rows['datetime'].iloc[-1] <= last:
+                    continue
+                # Histories are sorted, so the new rows are found by bisection
+                start = 0 if np.isnat(last) else int(rows['datetime'].searchsorted(pd.Timestamp(last), side='right'))
+                self._write(s, rows[self.pollutants].iloc[start:].tail(BUFFER_SIZE).to_numpy(dtype=float))
+                self.last_datetime[s] = pd.Timestamp(rows['datetime'].iloc[-1]).to_datetime64()
+                self._refresh(s)
+                added += len(rows) - start
+        return added
+
+    def average(self, station: str, pollutant: str):
+        """Average of one pollutant at one station, computed as for a station without data if unknown."""
+        with self._lock:
+            results = self._results.get(station)
+        if results is None:
+            return nowcast_average(np.array([]), pollutant)
+        return results[pollutant]
+
+    def averages(self, stations: list = None) -> dict:
+        """Every average of the given stations (all by default): {station: {pollutant: value}}."""
+        with self._lock:
+            return {station: dict(self._results[station]) for station in (stations or self.stations) if station in self._results}
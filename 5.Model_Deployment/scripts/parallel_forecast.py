@@ -0,0 +1,146 @@
+'''
+  Process pool executor for the station forecasts.
+
+  Stations are independent, so each one is forecasted in its own worker process.
+  The inputs are shared instead of being pickled for every task:
+
+  - the recent histories and weather frames are packed once into a shared memory
+    block that the workers read through NumPy views
+  - the booster model strings are preloaded in the parent; forked workers inherit
+    them copy-on-write and spawned workers receive them once at start-up
+'''
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from scripts.forecast_engine import RecursiveForecaster, WEATHER_COLUMNS, DEFAULT_BACKEND
+
+# Worker process state, filled by `_init_worker` (or inherited when forking)
+_MODEL_STRINGS = {}
+_WORKER = {}
+
+
+class SharedFrames:
+    """
+    Numeric frames packed into one shared memory block.
+
+    Every frame is stored as a float64 matrix plus its `datetime` column as int64
+    nanoseconds. `layout` is the small, picklable description workers need to rebuild
+    the frames from the block.
+    """
+
+    def __init__(self, frames: dict):
+        self.layout = {}
+        n_values = n_dates = 0
+        for name, (frame, columns) in frames.items():
+            self.layout[name] = {'columns': columns, 'rows': len(frame), 'values_at': n_values, 'dates_at': n_dates}
+            n_values += len(frame) * len(columns)
+            n_dates += len(frame)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, (n_values + n_dates) * 8))
+        self.name = self.shm.name
+
+        values, dates = self.views(self.shm.buf, n_values, n_dates)
+        for name, (frame, columns) in frames.items():
+            entry = self.layout[name]
+            block = values[entry['values_at']:entry['values_at'] + entry['rows'] * len(columns)]
+            block.reshape(entry['rows'], len(columns))[:] = frame[columns].to_numpy(dtype=float)
+            dates[entry['dates_at']:entry['dates_at'] + entry['rows']] = pd.to_datetime(frame['datetime']).to_numpy(dtype='datetime64[ns]').view('int64')
+        self.sizes = (n_values, n_dates)
+
+    @staticmethod
+    def views(buffer, n_values: int, n_dates: int):
+        values = np.ndarray((n_values,), dtype=np.float64, buffer=buffer)
+        dates = np.ndarray((n_dates,), dtype=np.int64, buffer=buffer, offset=n_values * 8)
+        return values, dates
+
+    @staticmethod
+    def read(buffer, sizes: tuple, layout: dict, name: str) -> pd.DataFrame:
+        """Rebuild one frame from the shared block (the small frame is copied out)."""
+        values, dates = SharedFrames.views(buffer, *sizes)
+        entry = layout[name]
+        columns = entry['columns']
+        block = values[entry['values_at']:entry['values_at'] + entry['rows'] * len(columns)]
+        frame = pd.DataFrame(block.reshape(entry['rows'], len(columns)).copy(), columns=columns)
+        frame.insert(0, 'datetime', pd.to_datetime(dates[entry['dates_at']:entry['dates_at'] + entry['rows']].copy()))
+        return frame
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _init_worker(shm_name: str, sizes: tuple, layout: dict, model_strings: dict = None):
+    if model_strings is not None:
+        _MODEL_STRINGS.update(model_strings)
+    _WORKER['shm'] = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['sizes'] = sizes
+    _WORKER['layout'] = layout
+    _WORKER['boosters'] = {}
+
+
+def _forecast_station(station: str, pollutants: list, horizon: int, backend: str = DEFAULT_BACKEND) -> pd.DataFrame:
+    buffer = _WORKER['shm'].buf
+    history = SharedFrames.read(buffer, _WORKER['sizes'], _WORKER['layout'], f'history_{station}')
+    weather = SharedFrames.read(buffer, _WORKER['sizes'], _WORKER['layout'], f'weather_{station}')
+
+    boosters = _WORKER['boosters']
+    for poll in pollutants:
+        key = f'{poll}_{station}'
+        if key in _MODEL_STRINGS and key not in boosters:
+            boosters[key] = lgb.Booster(model_str=_MODEL_STRINGS[key])
+
+    forecaster = RecursiveForecaster(boosters, horizon=horizon, backend=backend)
+    return forecaster.forecast({station: history}, {station: weather}, [station], pollutants)[station]
+
+
+class ParallelForecastExecutor:
+    """
+    Forecast stations in `workers` processes.
+
+    `forecast` has the same signature and result as `RecursiveForecaster.forecast`,
+    so the two are interchangeable.
+    """
+
+    def __init__(self, models, workers: int, horizon: int = 24, backend: str = DEFAULT_BACKEND):
+        self.models = models
+        self.workers = workers
+        self.horizon = horizon
+        self.backend = backend
+
+    def forecast(self, histories: dict, weather: dict, stations: list, pollutants: list) -> dict:
+        keys = [f'{poll}_{station}' for station in stations for poll in pollutants if f'{poll}_{station}' in self.models]
+        if hasattr(self.models, 'model_string'):
+            model_strings = {key: self.models.model_string(key) for key in keys}
+        else:
+            model_strings = {key: self.models[key].model_to_string() for key in keys}
+
+        frames = {}
+        for station in stations:
+            target_columns = [f'{poll}_{station}' for poll in pollutants if f'{poll}_{station}' in histories[station]]
+            frames[f'history_{station}'] = (histories[station], target_columns)
+            frames[f'weather_{station}'] = (weather[station], WEATHER_COLUMNS)
+        shared = SharedFrames(frames)
+
+        # Forked workers inherit the model strings, spawned ones get them once
+        if 'fork' in mp.get_all_start_methods():
+            context = mp.get_context('fork')
+            _MODEL_STRINGS.clear()
+            _MODEL_STRINGS.update(model_strings)
+            initargs = (shared.name, shared.sizes, shared.layout)
+        else:
+            context = mp.get_context('spawn')
+            initargs = (shared.name, shared.sizes, shared.layout, model_strings)
+
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(stations)), mp_context=context,
+                                     initializer=_init_worker, initargs=initargs) as executor:
+                futures = {station: executor.submit(_forecast_station, station, pollutants, self.horizon, self.backend) for station in stations}
+                return {station: future.result() for station, future in futures.items()}
+        finally:
+            _MODEL_STRINGS.clear()
+            shared.close()
@@ -1,17 +1,25 @@
 import pandas as pd
-import numpy as np
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # other libraries
-import openmeteo_requests
-import requests_cache
-import pandas as pd
-from retry_requests import retry
-import numpy as np
-import pickle
-from datetime import datetime, timedelta
 import lightgbm as lgb
+import time
+import asyncio
+import argparse
+from contextlib import contextmanager
+from scripts.station_store import load_window, list_source_stations, read_manifest
+from scripts.forecast_engine import RecursiveForecaster, BACKENDS, DEFAULT_BACKEND
+from scripts.direct_forecast import DirectForecaster, DIRECT_MODELS_DIR
+from scripts.model_registry import ModelRegistry, MODELS_DIR
+from scripts.parallel_forecast import ParallelForecastExecutor
+from scripts.weather_provider import default_provider
+from scripts.weather_fetcher import fetch_weather, day_after, CONCURRENCY, TIMEOUT
+from scripts.data_handler import get_station_coordinates_by_code
+from scripts.nowcast import ADJUSTMENT_FACTORS, nowcast_average
+from scripts.station_snapshot import StationSnapshot
+from scripts.forecast_artifact import publish
+from scripts.aqi_index import BREAKPOINTS, categorize, air_index, NO_DATA
 
 # Log handling
 lgb.basic._log_info = lambda *args, **kwargs: None
@@ -20,21 +28,19 @@ lgb.basic._log_info = lambda *args, **kwargs: None
 import warnings
 warnings.filterwarnings("ignore")
 
-ADJUSTMENT_FACTORS = {
-  'PM25': 0.694,
-  'PM10': 0.714
-}
-
-def naive_formula(df: pd.DataFrame, column: str, station=None) -> int:
+def naive_formula(df: pd.DataFrame, column: str, station=None, climatology=None) -> int:
   """
     Use historical data and simple average to return a naive prediction for the model.
+    When a `Climatology` of `df` is given the average is looked up instead of scanned.
   """
-  if station != None:
-    df = df[df["station"] == station]
-  else:
+  if station is None:
     return 0
   
   current_date = datetime.today().day
+  if climatology is not None:
+    return climatology.day_mean(station, column, current_date)
+
+  df = df[df["station"] == station]
   data_points = df[df['datetime'].dt.day == current_date]
   naive_average = data_points[column].mean()
   return naive_average
@@ -43,7 +49,8 @@ def naive_formula_24h(
   df: pd.DataFrame, 
   current_datetime: datetime, 
   column: str, 
-  station=None
+  station=None,
+  climatology=None
 ) -> pd.DataFrame:
     """
     Use historical data to return naive predictions for the next 24 hours based on historical averages.
@@ -53,10 +60,20 @@ def naive_formula_24h(
         current_datetime: The reference datetime to start predictions from
         column: The column to make predictions for
         station: Optional station filter
+        climatology: Optional `Climatology` of `df`, used for O(24) lookups when a station is given
         
     Returns:
         DataFrame with predictions for next 24 hours
     """
+    if station is not None and climatology is not None:
+        hours = pd.date_range(pd.Timestamp(current_datetime), periods=24, freq='h')
+        predictions = climatology.hourly_means(station, column, hours) * ADJUSTMENT_FACTORS.get(column, 1)
+        return pd.DataFrame({
+            'datetime': hours,
+            'formatted_time': hours.strftime('%H:00'),
+            f'predicted_{column}': predictions
+        })
+
     if station is not None:
         df = df[df["station"] == station]
     
@@ -94,57 +111,13 @@ def calculate_pollutant_weighted_average(df: pd.DataFrame, pollutant: str, adjus
   """
   Calculate weighted average concentrations for different pollutants.
   """
-  if station != None:
+  if station is not None:
     df = df[df["station"] == station]
   else:
       return 0
-  
-  # Handle non-PM/CO cases early
-  if pollutant not in ['PM25', 'PM10', 'CO']:
-      return round(np.mean(df[pollutant][-3:].values), 3)
-  
-  # Get appropriate window size and data
-  window_size = 8 if pollutant == 'CO' else 12
-  concentrations = df[pollutant][-window_size:].values
-  
-  # Handle CO separately
-  if pollutant == 'CO':
-      if len(concentrations) < 8 or np.isnan(concentrations).sum() > len(concentrations) * 0.25:
-          return "No info"
-      return round(np.mean(concentrations), 3)
-  
-  # Process PM data
-  last_three = concentrations[-3:]
-  last_three_null_count = np.isnan(last_three).sum()
-  
-  # Check last three values
-  if last_three_null_count >= 2:
-      return "No info"
-  
-  # Handle single null in last three values
-  if last_three_null_count == 1:
-      concentrations = concentrations.copy()
-      concentrations[-3:] = np.nan_to_num(last_three, nan=0)
-  
-  # Check total null count
-  total_null_count = np.isnan(concentrations).sum()
-  if total_null_count > len(concentrations) * 0.25:
-      return "No info"
-  
-  # Calculate PM average
-  try:
-      Cmax = np.nanmax(concentrations)
-      Cmin = np.nanmin(concentrations)
-      w = max(0.5, 1 - ((Cmax - Cmin) / Cmax))
-      powers = np.arange(len(concentrations)-1, -1, -1)
-      weights = w ** powers
-      
-      weighted_sum = np.sum(concentrations * weights)
-      weight_sum = np.sum(weights)
-  except ValueError:
-      return 0
 
-  return int((weighted_sum / weight_sum) * ADJUSTMENT_FACTORS.get(pollutant, 1))
+  # Same averages as the dashboard's rolling `NowCast`
+  return nowcast_average(df[pollutant][-12:].values, pollutant)
 
 def calculate_pollutant_time_only(
     forecast_df: pd.DataFrame, 
@@ -192,120 +165,73 @@ def calculate_pollutant_time_only(
     print(f"Error processing pollutants: {e}")
   
     
-def get_highest_aqi(df, station=None, forecast=False, output=None):
-  # Ensure datetime is in proper format
-  df['datetime'] = pd.to_datetime(df['datetime'])
+def get_highest_aqi(df=None, station=None, forecast=False, output=None, snapshot=None):
+  """
+    Latest index of a station (the highest across stations when `station` is None), or
+    the [lowest, highest] forecasted index with `forecast=True`; `output='time'` returns
+    the matching times instead ([highest, lowest] for forecasts).
+
+    Answered from a `StationSnapshot`, built from `df` when none is given (`df` is not
+    needed with a snapshot).
+  """
+  if snapshot is None:
+    snapshot = StationSnapshot.build(forecast=df) if forecast else StationSnapshot.build(history=df)
 
   # Check station
   if station is None and forecast==False:
-      # Get the last row for each station based on datetime
-      last_rows = df.sort_values('datetime').groupby('station').last().reset_index()
-
-      # Find the station with the highest AirQualityIndex
-      highest_aqi_row = last_rows.loc[last_rows['AirQualityIndex'].idxmax()]
-
-      # Extract the station name and AQI value
-      #highest_station = highest_aqi_row['station']
-      highest_aqi = highest_aqi_row['AirQualityIndex']
+      # Latest row of the station with the highest AirQualityIndex
+      highest_aqi_row = snapshot.highest_latest()
 
       if output is None:
-        return highest_aqi
+        return highest_aqi_row['AirQualityIndex']
       elif output == 'time':
          return highest_aqi_row['datetime']
 
   # Check station
   if station is None and forecast:
-      # Let's get the data from that station
-      lowest_fore = df.loc[df["AirQualityIndex"].idxmin()]
-      max_fore = df.loc[df["AirQualityIndex"].idxmax()]
-
-      highest_aqi_fore = max_fore['AirQualityIndex']
-      lowest_aqi_fore = lowest_fore['AirQualityIndex']
-
-      low_max = [lowest_aqi_fore, highest_aqi_fore]
+      fore = snapshot.forecast_range()
 
       if output is None:
-        return low_max
+        return [fore['low'], fore['high']]
       elif output == 'time':
-        return [max_fore['datetime'], lowest_fore['datetime']]
-  
-  elif station in list(df["station"].values) and forecast == False:
-      # Let's get the data from that station
-      filter_station = df[df["station"] == station].iloc[-1:, -2].values[0]
-
-      return filter_station
-  
-  elif station in list(df["station"].values) and forecast:
-      # Let's get the data from that station
-      lowest_fore = df.loc[df[df["station"] == station]["AirQualityIndex"].idxmin()]
-      max_fore = df.loc[df[df["station"] == station]["AirQualityIndex"].idxmax()]
+        return [fore['high_time'], fore['low_time']]
 
-      highest_aqi_fore = max_fore['AirQualityIndex']
-      lowest_aqi_fore = lowest_fore['AirQualityIndex']
+  elif snapshot.has_history(station) and forecast == False:
+      return snapshot.latest_index(station)
 
-      low_max = [lowest_aqi_fore, highest_aqi_fore]
+  elif snapshot.has_forecast(station) and forecast:
+      fore = snapshot.forecast_range(station)
 
       if output is None:
-        return low_max
+        return [fore['low'], fore['high']]
       elif output == 'time':
-        return [max_fore['datetime'], lowest_fore['datetime']]
-  
-  elif station not in df.columns:
-      "No data for selected station"
+        return [fore['high_time'], fore['low_time']]
+
+  elif station is not None:
+      # No data for the selected station
       return 6
-  
+
 
 # Jesus' prediction function to generate forecast excel files
 
 
 # Let's get the forecast of the weather data
-# We are going to use the Open-Meteo API to get them
-def get_weather_data(start_date, end_date):
-	# Setup the Open-Meteo API client with cache and retry on error
-	cache_session = requests_cache.CachedSession('.cache', expire_after = -1)
-	retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-	openmeteo = openmeteo_requests.Client(session = retry_session)
-
-	url = "https://archive-api.open-meteo.com/v1/archive"
-	params = {
-		"latitude": 19.4326, # Mexico City latitude
-		"longitude": 99.1332, # Mexico City longitude
-		"start_date": start_date,
-		"end_date": end_date,
-		"hourly": ["temperature_2m", "relative_humidity_2m", "wind_speed_10m", "wind_direction_10m", "direct_radiation"] # Variables to retrieve and used in training
-	}
-	responses = openmeteo.weather_api(url, params=params)
-	response = responses[0]
-
-	# Process hourly data
-	hourly = response.Hourly()
-	hourly_temperature_2m = hourly.Variables(0).ValuesAsNumpy()
-	hourly_relative_humidity_2m = hourly.Variables(1).ValuesAsNumpy()
-	hourly_wind_speed_10m = hourly.Variables(2).ValuesAsNumpy()
-	hourly_wind_direction_10m = hourly.Variables(3).ValuesAsNumpy()
-	hourly_direct_radiation = hourly.Variables(4).ValuesAsNumpy()
-
-	hourly_data = {"date": pd.date_range(
-		start = pd.to_datetime(hourly.Time(), unit = "s", utc = True),
-		end = pd.to_datetime(hourly.TimeEnd(), unit = "s", utc = True),
-		freq = pd.Timedelta(seconds = hourly.Interval()),
-		inclusive = "left"
-	)}
-
-	hourly_data["direct_radiation"] = hourly_direct_radiation
-	hourly_data["relative_humidity_2m"] = hourly_relative_humidity_2m
-	hourly_data["temperature_2m"] = hourly_temperature_2m
-	hourly_data["wind_direction_10m"] = hourly_wind_direction_10m
-	hourly_data["wind_speed_10m"] = hourly_wind_speed_10m
-
-	hourly_dataframe = pd.DataFrame(data = hourly_data)
-	hourly_dataframe.columns = ["datetime", "direct_radiation (W/m²)", "RH", "TMP", "WDR", "WSP"]
+# We are going to use the Open-Meteo API to get them, through the cached weather provider
+WEATHER_COLUMNS = ["datetime", "direct_radiation (W/m²)", "RH", "TMP", "WDR", "WSP"]
+
+def _station_weather_frame(weather):
+	hourly_dataframe = weather[WEATHER_COLUMNS].copy()
 	
 	hourly_dataframe["is_festival"] = 1
 	hourly_dataframe["is_weekend"] = 0
 	
 	return hourly_dataframe
 
+def get_weather_data(start_date, end_date, latitude=19.4326, longitude=-99.1332, provider=None):
+	"""Hourly weather between two dates for one location, Mexico City by default."""
+	provider = provider or default_provider
+	return _station_weather_frame(provider.get(latitude, longitude, start_date, end_date))
+
 
 # Function to have time features in the dataframe
 def preprocess_data(df):
@@ -371,139 +297,191 @@ def create_future_data_with_lags(current_data, target_col='PM25_MER', future_ste
 
 # Function to calculate the Air and Health Index for each pollutant
 def check_pollution(value, pollutant):
-    categories = {
-        "O3": [(0, 0.058), (0.058, 0.09), (0.09, 0.135), (0.135, 0.175), (0.175, float('inf'))],
-        "NO2": [(0, 0.053), (0.053, 0.106), (0.106, 0.16), (0.16, 0.213), (0.213, float('inf'))],
-        "SO2": [(0, 0.035), (0.035, 0.075), (0.075, 0.185), (0.185, 0.304), (0.304, float('inf'))],
-        "CO": [(0, 5), (5, 9), (9, 12), (12, 16), (16, float('inf'))],
-        "PM10": [(0, 45), (45, 60), (60, 132), (132, 213), (213, float('inf'))],
-        "PM25": [(0, 15), (15, 33), (33, 79), (79, 130), (130, float('inf'))]
-    }
-
-    if pollutant not in categories:
+    """Category (1-5) of a single reading in NOM units, see `scripts.aqi_index` for whole columns."""
+    if pollutant not in BREAKPOINTS:
         return "Unknown pollutant"
 
-    for i, (low, high) in enumerate(categories[pollutant], start=1):
-        if low <= value <= high:
-            return i  # Return category (1-5)
+    category = int(categorize(value, pollutant, units='nom'))
+    if category == NO_DATA:
+        return "Invalid value"
+    return category  # Return category (1-5)
 
-    return "Invalid value"
-
-# Path to the models
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
+# Where the dashboard reads the forecasts from
+FORECAST_DIR = Path(__file__).resolve().parent.parent / 'Dashboard_data' / 'forecast_data'
 
 # Let's get the list of the pollutants
 pollutants = ['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2']
 
 # List of our stations
 stations = ['MER', 'BJU', 'PED', 'UIZ']
-#BASE_DIR / 'Dashboard_data' / 'current_data' / f'{i}_merged_imputed.xlsx'
-# Load all models at once at the beginning
-models = {
-    f"{poll}_{station}": lgb.Booster(model_str=pickle.load(open(BASE_DIR / '4. Model Development' / 'models' / f"{poll}_{station}_model_.pkl", "rb"))._handle)
-    for station in stations
-    for poll in pollutants
-}
-
-for station_name in stations:
-    
-    # Let's load our dataset
-    current_data = pd.read_excel(BASE_DIR / '2. Data Collection' / f"{station_name}_merged_imputed.xlsx")
-    
-    # We need only 72 hours from our previous dataset
-    last_rows = current_data.tail(72)
-    
-    # Let's get the last date of the current data
-    last_date = last_rows['datetime'].max().strftime('%Y-%m-%d')
 
-    # Get hourly data from weather api
-    hourly_dataframe = get_weather_data(last_date, last_date) # Because it is the same date
+# Recursive: the notebook models, one hour after the other. Direct: horizon-as-feature
+# models (see scripts/direct_forecast.py), all 24 hours at once.
+MODES = ['recursive', 'direct']
 
-    # Let's remove the first from the hourly_data
-    #hourly_dataframe = hourly_dataframe.iloc[1:, :]
-    
-    # Convert to datetime and format
-    hourly_dataframe['datetime'] = pd.to_datetime(hourly_dataframe['datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
-    
-    for polls in pollutants:
-        # We are going to process the last 72 hours of the current data
-        future_data = create_future_data_with_lags(
-            current_data=last_rows,
-            target_col=f'{polls}_{station_name}',
-            future_steps=24,
-            lags=[1, 2, 3, 24, 48, 72])
-        
-        future_data['datetime'] = pd.to_datetime(future_data['datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
 
-        # Merge the dataframes
-        df = pd.merge(hourly_dataframe, future_data, on='datetime', how='left').sort_values(by="datetime")
-        
-        # Let's load the model for the pollutants and station
-        model_out = models[f"{polls}_{station_name}"]
-        
-        expected_features = model_out.feature_name()
+class StageTimer:
+    """Collect wall times of the forecast stages, e.g. `with timer('weather'): ...`"""
 
-        #df = merged_data.sort_values(by="datetime")  # Ensure chronological order
+    def __init__(self):
+        self.durations = {}
 
-        # Create a new column for predictions
-        df[f"{polls}_PRED"] = np.nan
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage] = self.durations.get(stage, 0.0) + time.perf_counter() - start
 
-        # remove the datetime column
-        df = df.drop(columns=['datetime'])
+    def merge(self, durations: dict):
+        for stage, seconds in durations.items():
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
 
-        # Let's rename the columns to include MER
-        df = df.rename(columns={'direct_radiation (W/m²)': 'direct_radiation_(W/m²)', 'RH': f'RH_{station_name}', 'TMP': f'TMP_{station_name}', 'WDR': f'WDR_{station_name}', 'WSP': f'WSP_{station_name}'})
-        
-        # I need to use log transformation to my lag features
-        lag_columns = [f'{polls}_{station_name}_log_lag_1', f'{polls}_{station_name}_log_lag_2', f'{polls}_{station_name}_log_lag_3', f'{polls}_{station_name}_log_lag_24', f'{polls}_{station_name}_log_lag_48', f'{polls}_{station_name}_log_lag_72']
-        df[lag_columns] = np.log1p(df[lag_columns])
-        
-        # 1. First, identify all rows that need prediction
-        mask_needs_prediction = pd.isna(df[f"{polls}_PRED"])
-        indices_to_predict = df[mask_needs_prediction].index
+    def report(self) -> str:
+        return "\n".join(f"  {stage:<10} {seconds:8.2f}s" for stage, seconds in self.durations.items())
 
 
-        # 2. Process these rows in sequence (necessary because of the lag dependencies)
-        for i in indices_to_predict:
-            # Extract features more efficiently (slicing is faster than to_frame().T)
-            input_data = df.loc[i:i, expected_features].astype(float)
-            
-            try:
-                # Make prediction
-                predicted_pm25_log = model_out.predict(input_data)[0]
-            except Exception as e:
-                print(f"Error at index {i}: {e}")
-            
-            
-            predicted_pm25 = np.expm1(predicted_pm25_log)
-            
-            # Store prediction using .at (faster than .loc for single values)
-            df.at[i, f"{polls}_PRED"] = predicted_pm25
-            
-            # Update future lag values more efficiently
-            for lag in range(1, 4):
-                future_idx = i + lag
-                if future_idx < len(df):
-                    df.at[future_idx, f"{polls}_{station_name}_log_lag_{lag}"] = predicted_pm25_log
-
-        hourly_dataframe[f"{polls}_{station_name}"] = df[f"{polls}_PRED"]
-
-    hourly_dataframe["Air_index"] = np.nan
-
-    # Let's iterate through the pollutants columns and check their pollution levels, then storage the max value of each iteration
-    for poll in pollutants:
-        # Let's create one variable that will storage the max value of each iteration
-        max_value = 0
-        for i in range(len(hourly_dataframe)):
-            value = hourly_dataframe.loc[i, f"{poll}_{station_name}"]
-            category = check_pollution(value, poll)
-            if category == "Invalid value":
-                continue
-            if category == "Unknown pollutant":
-                continue
-            if category > max_value:
-                max_value = category
-        hourly_dataframe["Air_index"] = max_value
-
-    # Save the dataframe
-    hourly_dataframe.to_excel(BASE_DIR / '5. Model Deployment' / 'Dashboard_data' / 'forecast_data' / f"{station_name}_forecast.xlsx", index=False)
\ No newline at end of file
+async def _load_inputs(station_list: list, provider=None, concurrency: int = CONCURRENCY, timeout: float = TIMEOUT):
+    provider = provider or default_provider
+    coordinates = {station_name: get_station_coordinates_by_code(station_name) for station_name in station_list}
+
+    def weather_requests(last_datetimes: dict) -> dict:
+        # Weather for the 24 hours that follow the last date of the current data
+        return {station_name: (coordinates[station_name]['lat'], coordinates[station_name]['lon'], *day_after(last_datetime))
+                for station_name, last_datetime in last_datetimes.items()}
+
+    # The manifest already knows where every window ends, so the weather is requested
+    # while the windows are read
+    manifest = read_manifest()
+    expected = {station_name: manifest['stations'][station_name]['last_datetime'] for station_name in station_list
+                if 'last_datetime' in manifest['stations'].get(station_name, {})}
+    weather_task = asyncio.create_task(fetch_weather(provider, weather_requests(expected), concurrency, timeout))
+
+    # We need only 72 hours from our previous dataset, published by the hourly ingestion
+    windows = await asyncio.gather(*[asyncio.to_thread(load_window, station_name) for station_name in station_list])
+    histories = dict(zip(station_list, windows))
+    weather = await weather_task
+
+    # Windows that end on another date than the manifest said (or that it does not know)
+    late = {station_name: history['datetime'].max() for station_name, history in histories.items()
+            if station_name not in expected or day_after(expected[station_name]) != day_after(history['datetime'].max())}
+    if late:
+        weather.update(await fetch_weather(provider, weather_requests(late), concurrency, timeout))
+
+    frames = {}
+    for station_name in station_list:
+        frame = _station_weather_frame(weather[station_name])
+        frame['datetime'] = frame['datetime'].dt.tz_localize(None)
+        frames[station_name] = frame
+    return histories, frames
+
+
+def load_inputs(station_list: list, provider=None, concurrency: int = CONCURRENCY, timeout: float = TIMEOUT):
+    """
+    Return the last 72 hours of every station and the weather of the day after them.
+
+    The weather is requested while the windows are read, in one bulk request for the
+    stations that end on the same date (see scripts/weather_fetcher.py); stations with a
+    cached response get it at once while it is refreshed in the background.
+    """
+    return asyncio.run(_load_inputs(station_list, provider, concurrency, timeout))
+
+
+def build_forecast_frame(station_name: str, forecast: pd.DataFrame, weather: pd.DataFrame, pollutant_list: list) -> pd.DataFrame:
+    """Put the predicted pollutants next to the weather of the forecasted hours."""
+    station_weather = weather.drop_duplicates('datetime').set_index('datetime')
+    hourly_dataframe = station_weather.reindex(forecast['datetime']).reset_index()
+    for polls in pollutant_list:
+        hourly_dataframe[f"{polls}_{station_name}"] = forecast[f"{polls}_{station_name}"].values
+    hourly_dataframe['datetime'] = hourly_dataframe['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Worst category of the predicted pollutants at every hour
+    hourly_dataframe["Air_index"] = air_index(hourly_dataframe, station_name, pollutant_list)
+
+    return hourly_dataframe
+
+
+def forecast_stations(station_list: list, pollutant_list: list, models=None, timer: StageTimer = None, parallel: int = 1, provider=None, mode: str = 'recursive',
+                      backend: str = None) -> dict:
+    """
+    Forecast the next 24 hours of the given stations and publish them as the forecast
+    artifact, together with the versions of the models used.
+
+    With `parallel` > 1 stations are forecasted in a pool of worker processes,
+    otherwise all of them are forecasted together in this process. `mode='direct'`
+    uses the direct multi-horizon models, which need no process pool. `backend`
+    picks how the boosters are evaluated (see scripts/tree_inference.py), by default
+    the compiled trees for the recursive steps and `Booster.predict` for the direct
+    blocks.
+
+    Returns a mapping of station acronym to the saved forecast frame.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown forecast mode: {mode}")
+    backend = backend or ('lightgbm' if mode == 'direct' else DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    models_dir = DIRECT_MODELS_DIR if mode == 'direct' else MODELS_DIR
+    models = models if models is not None else ModelRegistry(models_dir, max_size=len(station_list) * len(pollutant_list))
+    timer = timer or StageTimer()
+
+    # Collect the last 72 hours and the weather of every station
+    with timer('inputs'):
+        histories, weather = load_inputs(station_list, provider)
+
+    if mode == 'direct':
+        # Every hour of every series from one predict call per model
+        forecaster = DirectForecaster(models, horizon=24, backend=backend)
+    elif parallel > 1 and len(station_list) > 1:
+        forecaster = ParallelForecastExecutor(models, workers=parallel, horizon=24, backend=backend)
+    else:
+        # Forecast every station and pollutant together, one batched prediction per hour
+        forecaster = RecursiveForecaster(models, horizon=24, backend=backend)
+    with timer('predict'):
+        forecasts = forecaster.forecast(histories, weather, station_list, pollutant_list)
+
+    frames = {}
+    with timer('save'):
+        for station_name in station_list:
+            frames[station_name] = build_forecast_frame(station_name, forecasts[station_name], weather[station_name], pollutant_list)
+        keys = [f'{poll}_{station_name}' for station_name in station_list for poll in pollutant_list]
+        versions = {key: models.version(key) for key in keys if key in models} if hasattr(models, 'version') else {}
+        # One artifact for every station, swapped in atomically
+        publish(frames, versions, directory=FORECAST_DIR)
+
+    return frames
+
+
+def run(station_list: list = None, pollutant_list: list = None, parallel: int = 1, mode: str = 'recursive', backend: str = None) -> StageTimer:
+    """Run the forecast batch job and return the timings of its stages."""
+    station_list = station_list or stations
+    pollutant_list = pollutant_list or pollutants
+    if station_list == ['all']:
+        station_list = list_source_stations()
+
+    timer = StageTimer()
+    with timer('total'):
+        forecast_stations(station_list, pollutant_list, timer=timer, parallel=parallel, mode=mode, backend=backend)
+    return timer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Air and Health Index forecast batch job.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Forecast the next 24 hours and write the forecast files')
+    run_parser.add_argument('--stations', nargs='+', default=stations, help=f"Station acronyms or 'all' (default: {' '.join(stations)})")
+    run_parser.add_argument('--pollutants', nargs='+', default=pollutants, choices=pollutants, help='Pollutants (default: all)')
+    run_parser.add_argument('--parallel', type=int, default=1, metavar='N', help='Forecast stations in N worker processes')
+    run_parser.add_argument('--mode', default='recursive', choices=MODES, help='Recursive (notebook) or direct multi-horizon models (default: recursive)')
+    run_parser.add_argument('--backend', choices=BACKENDS, help='Booster.predict or the compiled NumPy trees (default: compiled, lightgbm for --mode direct)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        timer = run(args.stations, args.pollutants, parallel=args.parallel, mode=args.mode, backend=args.backend)
+        print(f"Forecasted {', '.join(args.stations)} for {', '.join(args.pollutants)} ({args.mode})")
+        print(timer.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+'''
+  Point to alcaldía and nearest station lookups.
+
+  `SpatialIndex` keeps a shapely `STRtree` over the alcaldía polygons of
+  `limite-de-las-alcaldas.json` and a SciPy KD-tree over the stations as unit vectors
+  on the sphere, where the straight-line (chord) distance orders points exactly like
+  the great-circle distance and converts to it with `2 R asin(d / 2)`. Both take
+  single points or whole arrays of them.
+
+  The alcaldía of every station comes from the same lookup, so the station of each
+  alcaldía on the map is derived from the coordinates instead of kept by hand.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.spatial_index lookup 19.4326 -99.1332 [-k 3]
+    python -m scripts.spatial_index stations
+'''
+import json
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from scipy.spatial import cKDTree
+
+from scripts.geometry import SOURCE_PATH
+from scripts.data_handler import STATION_COORDINATES
+
+EARTH_RADIUS = 6371.0
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """(lat, lon) in degrees to points on the unit sphere, shape (n, 3)."""
+    lat, lon = np.radians(np.atleast_1d(np.asarray(lat, dtype=float))), np.radians(np.atleast_1d(np.asarray(lon, dtype=float)))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+class SpatialIndex:
+    """
+    Alcaldía and nearest stations of any point.
+
+    Args:
+        polygons: Alcaldía name to its shapely geometry (lon/lat)
+        stations: Station name to its {'lat', 'lon'}
+    """
+
+    def __init__(self, polygons: dict, stations: dict):
+        self.names = np.array(list(polygons), dtype=object)
+        self.tree = shapely.STRtree(list(polygons.values()))
+        self.stations = np.array(list(stations), dtype=object)
+        self.station_lat = np.array([c['lat'] for c in stations.values()], dtype=float)
+        self.station_lon = np.array([c['lon'] for c in stations.values()], dtype=float)
+        self.station_tree = cKDTree(unit_vectors(self.station_lat, self.station_lon))
+
+    @classmethod
+    def build(cls, source=SOURCE_PATH, stations: dict = None) -> 'SpatialIndex':
+        with open(source, encoding='utf-8') as f:
+            features = json.load(f)['features']
+        polygons = {feature['properties']['NOMGEO']: shape(feature['geometry']) for feature in features}
+        return cls(polygons, STATION_COORDINATES if stations is None else stations)
+
+    def alcaldias(self, lat, lon) -> np.ndarray:
+        """Alcaldía of every point, None outside Mexico City (points on a border take either side)."""
+        points = shapely.points(np.atleast_1d(lon), np.atleast_1d(lat))
+        found = np.full(len(points), None, dtype=object)
+        point_index, polygon_index = self.tree.query(points, predicate='intersects')
+        # Keep one polygon per point, the first found
+        first = np.unique(point_index, return_index=True)[1]
+        found[point_index[first]] = self.names[polygon_index[first]]
+        return found
+
+    def alcaldia(self, lat: float, lon: float):
+        return self.alcaldias(lat, lon)[0]
+
+    def nearest_stations(self, lat, lon, k: int = 1):
+        """
+        The `k` closest stations of every point.
+
+        Returns:
+            (names, distances in km), both of shape (points, k)
+        """
+        k = min(k, len(self.stations))
+        chords, indexes = self.station_tree.query(unit_vectors(lat, lon), k=k)
+        chords, indexes = chords.reshape(-1, k), indexes.reshape(-1, k)
+        return self.stations[indexes], chord_to_km(chords)
+
+    def station_alcaldias(self) -> dict:
+        """Station name to the alcaldía it stands in, None for stations outside the city."""
+        return dict(zip(self.stations, self.alcaldias(self.station_lat, self.station_lon)))
+
+
+@lru_cache(maxsize=4)
+def default_index(stations: tuple = None) -> SpatialIndex:
+    """Index over the alcaldías and the given station names (every known station by default), built once."""
+    coordinates = STATION_COORDINATES if stations is None else {name: STATION_COORDINATES[name] for name in stations}
+    return SpatialIndex.build(stations=coordinates)
+
+
+def municipality_stations(stations: tuple = None) -> dict:
+    """Alcaldía name to the station standing in it (the first one by name if several), for the given stations."""
+    index = default_index(stations)
+    by_alcaldia = {}
+    for station, alcaldia in sorted(index.station_alcaldias().items()):
+        if alcaldia is not None:
+            by_alcaldia.setdefault(alcaldia, station)
+    return {name: by_alcaldia.get(name) for name in index.names}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Alcaldía and nearest station lookups.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    lookup_parser = subparsers.add_parser('lookup', help='Alcaldía and nearest stations of a point')
+    lookup_parser.add_argument('lat', type=float)
+    lookup_parser.add_argument('lon', type=float)
+    lookup_parser.add_argument('-k', type=int, default=3, help='Nearest stations to list (default: 3)')
+    subparsers.add_parser('stations', help='Alcaldía of every station')
+    args = parser.parse_args(argv)
+
+    index = default_index()
+    if args.command == 'lookup':
+        print(f"Alcaldía: {index.alcaldia(args.lat, args.lon) or 'outside Mexico City'}")
+        names, distances = index.nearest_stations(args.lat, args.lon, args.k)
+        for name, distance in zip(names[0], distances[0]):
+            print(f"  {name:<30} {distance:6.2f} km")
+    elif args.command == 'stations':
+        for station, alcaldia in index.station_alcaldias().items():
+            print(f"{station:<30} {alcaldia or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+  Per-station snapshot of the latest reading and the forecast range.
+
+  The pages ask the same questions on every render: what is the latest Air and
+  Health index of a station (or the worst one across stations) and what are the
+  lowest and highest forecasted indexes and when. `StationSnapshot` answers them
+  from a small table built once from the history and forecast frames, instead of
+  sorting and filtering those frames on each call.
+'''
+import pandas as pd
+
+INDEX_COLUMN = 'AirQualityIndex'
+
+
+def _forecast_range(rows: pd.DataFrame) -> dict:
+    """Lowest and highest index of a forecast with their times (first occurrence wins)."""
+    low = rows.loc[rows[INDEX_COLUMN].idxmin()]
+    high = rows.loc[rows[INDEX_COLUMN].idxmax()]
+    return {'low': low[INDEX_COLUMN], 'low_time': low['datetime'],
+            'high': high[INDEX_COLUMN], 'high_time': high['datetime']}
+
+
+class StationSnapshot:
+    """
+    Latest reading and forecast range per station, by station name.
+
+    Build it with `StationSnapshot.build(history, forecast)` from frames with
+    `datetime`, `station` and `AirQualityIndex` columns; either frame may be omitted.
+    The input frames are not modified.
+    """
+
+    def __init__(self, latest: dict = None, forecast: dict = None, overall_forecast: dict = None):
+        # {station: last row of its history as a dict}
+        self.latest = latest or {}
+        # {station: {'low', 'low_time', 'high', 'high_time'}}
+        self.forecast = forecast or {}
+        # Same as a `forecast` entry, over the forecasts of every station
+        self.overall_forecast = overall_forecast
+
+    @classmethod
+    def build(cls, history: pd.DataFrame = None, forecast: pd.DataFrame = None) -> 'StationSnapshot':
+        latest = {}
+        if history is not None and not history.empty:
+            dates = pd.to_datetime(history['datetime'])
+            last_rows = history.assign(datetime=dates).loc[dates.groupby(history['station'], observed=True).idxmax()]
+            latest = {row['station']: row for row in last_rows.to_dict('records')}
+
+        ranges, overall = {}, None
+        if forecast is not None and not forecast.empty:
+            forecast = forecast.assign(datetime=pd.to_datetime(forecast['datetime']))
+            ranges = {station: _forecast_range(rows) for station, rows in forecast.groupby('station', sort=False, observed=True)}
+            overall = _forecast_range(forecast)
+        return cls(latest, ranges, overall)
+
+    def has_history(self, station: str) -> bool:
+        return station in self.latest
+
+    def has_forecast(self, station: str) -> bool:
+        return station in self.forecast
+
+    def latest_reading(self, station: str) -> dict:
+        """Last history row of a station."""
+        return self.latest[station]
+
+    def latest_index(self, station: str):
+        return self.latest[station][INDEX_COLUMN]
+
+    def highest_latest(self) -> dict:
+        """Latest row of the station whose latest index is the highest (first by name on ties)."""
+        return max((self.latest[station] for station in sorted(self.latest)), key=lambda row: row[INDEX_COLUMN])
+
+    def forecast_range(self, station: str = None) -> dict:
+        """Forecast range of a station, or over every station when `station` is None."""
+        return self.overall_forecast if station is None else self.forecast[station]
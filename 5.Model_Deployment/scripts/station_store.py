@@ -0,0 +1,372 @@
+'''
+  Columnar copy of the station histories kept in `2.Data_Collection`.
+
+  The `{STATION}_merged_imputed.xlsx` workbooks are the source of truth, but parsing
+  them with openpyxl takes seconds per station. `ingest` converts every workbook once
+  into Parquet files partitioned by station and year, and `load_station_history`
+  reads those back, falling back to Excel only when the columnar copy is missing or
+  older than its workbook.
+
+  New hourly readings are appended without touching the history: `append_readings`
+  imputes the hours missing since the last stored one, writes the new rows as an
+  extra Parquet part and publishes the last 72 hours as a small window file, which is
+  what the forecaster reads. Readings are picked up from CSV files dropped in
+  `Dashboard_data/incoming` (named `{STATION}_*.csv`) or from a given file.
+  Re-ingesting a changed workbook replaces the appended parts, the workbook stays
+  the source of truth.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.station_store ingest [--stations MER BJU] [--force]
+    python -m scripts.station_store append [--file readings.csv --station MER]
+'''
+import os
+import json
+import argparse
+import warnings
+from pathlib import Path
+from functools import lru_cache
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_COLLECTION_DIR = BASE_DIR.parent / '2.Data_Collection'
+STORE_DIR = BASE_DIR / 'Dashboard_data' / 'station_store'
+MANIFEST_PATH = STORE_DIR / 'manifest.json'
+WINDOW_DIR = STORE_DIR / 'window'
+INCOMING_DIR = BASE_DIR / 'Dashboard_data' / 'incoming'
+FESTIVALS_PATH = DATA_COLLECTION_DIR / 'Mexico_city_data_with_festivals_Manual.csv'
+
+# Hours of history the forecaster needs (largest lag)
+WINDOW_HOURS = 72
+
+SOURCE_SUFFIX = '_merged_imputed.xlsx'
+
+# City-wide published index: taken from the readings when they carry it, carried
+# forward otherwise, never interpolated nor computed from the station's pollutants
+INDEX_COLUMN = 'AirQualityIndex'
+# Columns of the stored rows that readings may leave out
+OPTIONAL_COLUMNS = ['is_festival', 'is_weekend', INDEX_COLUMN]
+
+
+def get_source_path(station: str) -> Path:
+    """Path to the Excel workbook of a station, e.g. `MER_merged_imputed.xlsx`."""
+    return DATA_COLLECTION_DIR / f'{station}{SOURCE_SUFFIX}'
+
+
+def list_source_stations() -> list:
+    """Station acronyms that have a workbook in `2.Data_Collection`."""
+    return sorted(p.name[:-len(SOURCE_SUFFIX)] for p in DATA_COLLECTION_DIR.glob(f'*{SOURCE_SUFFIX}'))
+
+
+def read_manifest() -> dict:
+    """Return the ingest manifest, or an empty one if nothing was ingested yet."""
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'stations': {}}
+
+
+def write_manifest(manifest: dict):
+    """Write the manifest through a temporary file so readers never see half of it."""
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _source_signature(path: Path) -> dict:
+    stat = path.stat()
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _station_dir(station: str) -> Path:
+    return STORE_DIR / f'station={station}'
+
+
+def _partition_files(station: str) -> list:
+    return sorted(_station_dir(station).glob('year=*/*.parquet'))
+
+
+def window_path(station: str) -> Path:
+    return WINDOW_DIR / f'{station}.parquet'
+
+
+def _write_parquet(df: pd.DataFrame, path: Path):
+    """Write through a temporary file so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.parquet.tmp')
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def publish_window(station: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Publish the last `WINDOW_HOURS` rows of `df` as the station's window file."""
+    window = df.tail(WINDOW_HOURS).reset_index(drop=True)
+    _write_parquet(window, window_path(station))
+    return window
+
+
+def read_source(station: str) -> pd.DataFrame:
+    """Parse the Excel workbook of a station into a typed frame."""
+    df = pd.read_excel(get_source_path(station))
+    if 'index' in df.columns:
+        df = df.drop('index', axis=1)
+    df['datetime'] = pd.to_datetime(df['datetime']).astype('datetime64[ns]')
+    return df.sort_values('datetime', kind='stable').reset_index(drop=True)
+
+
+def write_station(station: str, df: pd.DataFrame, manifest: dict, signature: dict = None):
+    """Replace the columnar copy of a station with `df` and record it in the manifest."""
+    for old_file in _partition_files(station):
+        old_file.unlink()
+
+    for year, part in df.groupby(df['datetime'].dt.year, sort=True):
+        year_dir = _station_dir(station) / f'year={year}'
+        year_dir.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(year_dir / 'part-00000.parquet', index=False)
+    publish_window(station, df)
+
+    manifest['stations'][station] = {
+        'source': get_source_path(station).name,
+        **(signature or {'mtime_ns': None, 'size': None}),
+        'rows': len(df),
+        'columns': list(df.columns),
+        'last_datetime': df['datetime'].max().isoformat(),
+    }
+
+
+def ingest_station(station: str, manifest: dict = None) -> int:
+    """
+    Convert one workbook into `station=<code>/year=<yyyy>/part-00000.parquet` files.
+
+    Returns the number of rows written. The manifest is updated in place when given,
+    otherwise it is read and written here.
+    """
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = read_manifest()
+
+    signature = _source_signature(get_source_path(station))
+    df = read_source(station)
+
+    # Replace any previous copy of this station
+    write_station(station, df, manifest, signature)
+    if own_manifest:
+        write_manifest(manifest)
+    return len(df)
+
+
+def ingest(stations: list = None, force: bool = False) -> dict:
+    """Ingest the given stations (all by default), skipping the ones already fresh."""
+    manifest = read_manifest()
+    written = {}
+    for station in stations or list_source_stations():
+        if not force and not is_stale(station, manifest):
+            continue
+        written[station] = ingest_station(station, manifest)
+    write_manifest(manifest)
+    return written
+
+
+def is_stale(station: str, manifest: dict = None) -> bool:
+    """True when the columnar copy is missing or no longer matches its workbook."""
+    manifest = manifest or read_manifest()
+    entry = manifest['stations'].get(station)
+    if entry is None or not _partition_files(station):
+        return True
+    source = get_source_path(station)
+    if not source.exists():
+        # Nothing newer to fall back to
+        return False
+    signature = _source_signature(source)
+    return entry['mtime_ns'] != signature['mtime_ns'] or entry['size'] != signature['size']
+
+
+def load_station_history(station: str, columns: list = None) -> pd.DataFrame:
+    """
+    Load the full hourly history of a station.
+
+    Reads the Parquet partitions when they are fresh and falls back to the Excel
+    workbook otherwise.
+    """
+    if is_stale(station):
+        warnings.warn(f"Columnar copy of {station} is missing or stale, reading Excel instead. "
+                      "Run `python -m scripts.station_store ingest` to refresh it.")
+        df = read_source(station)
+        return df[columns] if columns is not None else df
+
+    parts = [pd.read_parquet(path, columns=columns) for path in _partition_files(station)]
+    return pd.concat(parts, ignore_index=True)
+
+
+def load_window(station: str) -> pd.DataFrame:
+    """
+    Last `WINDOW_HOURS` rows of a station. Reads the published window when it is
+    current and the tail of the full history otherwise.
+    """
+    manifest = read_manifest()
+    entry = manifest['stations'].get(station)
+    path = window_path(station)
+    if entry is not None and 'last_datetime' in entry and path.exists() and not is_stale(station, manifest):
+        window = pd.read_parquet(path)
+        if not window.empty and window['datetime'].iloc[-1] == pd.Timestamp(entry['last_datetime']):
+            return window
+    return load_station_history(station).tail(WINDOW_HOURS).reset_index(drop=True)
+
+
+@lru_cache(maxsize=1)
+def _festival_calendar() -> pd.Series:
+    """`is_festival` flag per hour of the manually curated festival calendar."""
+    if not FESTIVALS_PATH.exists():
+        return pd.Series(dtype='int64')
+    calendar = pd.read_csv(FESTIVALS_PATH, parse_dates=['timestamp'])
+    return calendar.drop_duplicates('timestamp').set_index('timestamp')['is_festival']
+
+
+def impute_new_rows(previous: pd.DataFrame, readings: pd.DataFrame, station: str) -> pd.DataFrame:
+    """
+    Put new readings of `station` on the hourly grid that follows `previous` (the
+    stored rows they continue) and fill their gaps.
+
+    `readings` must have `datetime` and every measurement column of `previous`
+    (values may be missing), and no column `previous` does not have. Missing
+    measurements are interpolated linearly from the last stored row to the next
+    reading and carried forward after the last one; `is_weekend` and `is_festival`
+    come from the calendar, and the published index is carried forward to the hours
+    the readings do not give it for. Only the new rows are returned, with the
+    columns and dtypes of `previous`.
+
+    Raises:
+        ValueError: When columns of `readings` are missing or unknown
+    """
+    unknown = [column for column in readings.columns if column not in previous.columns]
+    missing = [column for column in previous.columns if column not in readings.columns and column not in OPTIONAL_COLUMNS]
+    if unknown or missing:
+        raise ValueError(f"Readings of {station} do not match its stored columns: "
+                         f"unknown {unknown}, missing {missing}")
+
+    last = previous['datetime'].iloc[-1]
+    readings = readings.reindex(columns=previous.columns)
+    readings['datetime'] = pd.to_datetime(readings['datetime']).dt.floor('h').astype('datetime64[ns]')
+    readings = readings[readings['datetime'] > last].drop_duplicates('datetime', keep='last')
+    if readings.empty:
+        return readings
+
+    hours = pd.date_range(last + pd.Timedelta(hours=1), readings['datetime'].max(), freq='h')
+    new = readings.set_index('datetime').reindex(hours)
+    new.index.name = 'datetime'
+
+    measured = [column for column in previous.columns if column != 'datetime' and column not in OPTIONAL_COLUMNS]
+    anchored = pd.concat([previous.tail(1).set_index('datetime')[measured], new[measured].astype(float)])
+    new[measured] = anchored.interpolate(method='linear', limit_area='inside').ffill().iloc[1:].to_numpy()
+
+    new['is_weekend'] = (hours.dayofweek >= 5).astype('int64')
+    festivals = _festival_calendar().reindex(hours)
+    new['is_festival'] = festivals.fillna(new['is_festival']).fillna(0).to_numpy()
+    if INDEX_COLUMN in previous:
+        new[INDEX_COLUMN] = new[INDEX_COLUMN].ffill().fillna(previous[INDEX_COLUMN].iloc[-1]).to_numpy()
+
+    new = new.reset_index()[list(previous.columns)]
+    for column, dtype in previous.dtypes.items():
+        if column != 'datetime' and pd.api.types.is_integer_dtype(dtype):
+            new[column] = new[column].round()
+        new[column] = new[column].astype(dtype)
+    return new
+
+
+def _next_part_path(station: str, year: int) -> Path:
+    year_dir = _station_dir(station) / f'year={year}'
+    numbers = [int(path.stem.split('-')[1]) for path in year_dir.glob('part-*.parquet')]
+    return year_dir / f'part-{max(numbers, default=-1) + 1:05d}.parquet'
+
+
+def append_readings(station: str, readings: pd.DataFrame, manifest: dict = None) -> int:
+    """
+    Append hourly readings of a station in the station file layout.
+
+    Only rows newer than the store are used, the hours between them are imputed.
+    The new rows are written as one extra part per year and the window is
+    republished, without reading the rest of the history. Returns the rows added.
+    """
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = read_manifest()
+    if station not in manifest['stations'] or is_stale(station, manifest):
+        ingest_station(station, manifest)
+
+    previous = load_window(station)
+    new = impute_new_rows(previous, readings, station)
+    if new.empty:
+        return 0
+
+    for year, part in new.groupby(new['datetime'].dt.year, sort=True):
+        _write_parquet(part, _next_part_path(station, year))
+    publish_window(station, pd.concat([previous, new], ignore_index=True))
+
+    entry = manifest['stations'][station]
+    entry['rows'] += len(new)
+    entry['last_datetime'] = new['datetime'].iloc[-1].isoformat()
+    if own_manifest:
+        write_manifest(manifest)
+    return len(new)
+
+
+def _read_readings(path: Path) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+
+
+def append_incoming(directory: Path = INCOMING_DIR) -> dict:
+    """
+    Append every `{STATION}_*.csv` (or `.parquet`) file dropped in `directory`, oldest
+    first, and move the files to `directory/processed`.
+    """
+    directory = Path(directory)
+    files = sorted((path for pattern in ('*.csv', '*.parquet') for path in directory.glob(pattern)),
+                   key=lambda path: path.stat().st_mtime_ns)
+    manifest = read_manifest()
+    added = {}
+    for path in files:
+        station = path.name.split('_')[0]
+        added[station] = added.get(station, 0) + append_readings(station, _read_readings(path), manifest)
+        write_manifest(manifest)
+        processed = directory / 'processed' / path.name
+        processed.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, processed)
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Columnar store for the station histories.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = subparsers.add_parser('ingest', help='Convert the Excel workbooks into Parquet partitions')
+    ingest_parser.add_argument('--stations', nargs='+', help='Station acronyms, e.g. MER BJU (default: all)')
+    ingest_parser.add_argument('--force', action='store_true', help='Rewrite stations that are already fresh')
+    append_parser = subparsers.add_parser('append', help='Append new hourly readings and publish the 72-hour windows')
+    append_parser.add_argument('--file', type=Path, help='CSV or Parquet file of readings (default: the files in Dashboard_data/incoming)')
+    append_parser.add_argument('--station', help='Station acronym of --file')
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        written = ingest(args.stations, force=args.force)
+        for station, rows in written.items():
+            print(f"{station}: {rows} rows")
+        if not written:
+            print('Columnar store is up to date.')
+
+    elif args.command == 'append':
+        if args.file is not None:
+            if args.station is None:
+                parser.error('--file requires --station')
+            added = {args.station: append_readings(args.station, _read_readings(args.file))}
+        else:
+            added = append_incoming()
+        for station, rows in added.items():
+            print(f"{station}: {rows} new rows")
+        if not added:
+            print('No readings to append.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+'''
+  Inference backends for the LightGBM boosters.
+
+  The forecasters predict through a predictor object with `predict(rows)` and
+  `predict_block(features)`, made by `make_predictor` for a backend:
+
+  - `lightgbm`: `BoosterBatch`, one `Booster.predict` call per series.
+  - `compiled`: `CompiledForest`, the trees of every booster in flat NumPy arrays,
+    evaluated for all series at once. Each call walks every tree one level per step
+    with a few vectorized gathers, so it skips the per-call validation and C API
+    round trip of `Booster.predict`, which dominate for one row of 18 features.
+
+  The trees are read from the booster's text model (the same trees as `dump_model()`,
+  much faster to produce) and follow LightGBM's numerical decision rules, including
+  the missing value types; categorical splits and linear trees are not supported.
+
+  Usage (from `5.Model_Deployment`):
+    python -m scripts.tree_inference compare [--stations MER BJU] [--pollutants PM25 O3] [--rows 500]
+'''
+import time
+import weakref
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.forecast_engine import BoosterBatch, FEATURES, BACKENDS, feature_permutation
+
+# Missing value types of a split (bits 2-3 of `decision_type`)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+CATEGORICAL_MASK = 1
+DEFAULT_LEFT_MASK = 2
+# LightGBM reads input values this close to zero as zero, whatever the split (its
+# `kZeroThreshold`, a float literal, so not exactly 1e-35)
+ZERO_THRESHOLD = float(np.float32(1e-35))
+
+
+class Trees:
+    """
+    The trees of one booster as flat arrays, in LightGBM's own encoding: `children`
+    holds the (left, right) pair of every split, a negative child `~i` is leaf `i` of
+    `value`, and `roots` the first split of each tree (or `~leaf` for one-leaf trees).
+    `feature_names` are the booster's, in the order `feature` refers to.
+    """
+
+    def __init__(self, feature_names, roots, feature, threshold, children, default_left, missing, value):
+        self.feature_names = feature_names
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.default_left = default_left
+        self.missing = missing
+        self.value = value
+
+    @classmethod
+    def parse(cls, model_string: str) -> 'Trees':
+        """Trees of a model in LightGBM's text format."""
+        header, *blocks = model_string.split('\nTree=')
+        if 'num_tree_per_iteration=1' not in header:
+            raise ValueError("Only single-output models can be compiled")
+        feature_names = next(line for line in header.splitlines() if line.startswith('feature_names='))
+        feature_names = np.array(feature_names.split('=', 1)[1].split())
+        fields = {name: [] for name in ['split_feature', 'threshold', 'decision_type', 'left_child', 'right_child', 'leaf_value']}
+        roots, splits, leaves = [], 0, 0
+        for block in blocks:
+            tree = dict(line.split('=', 1) for line in block.split('end of trees')[0].splitlines()[1:] if '=' in line)
+            if int(tree.get('num_cat', 0)) or int(tree.get('is_linear', 0)):
+                raise ValueError("Categorical splits and linear trees are not supported")
+            size = int(tree['num_leaves'])
+            roots.append(splits if size > 1 else ~leaves)
+            if size > 1:
+                # Children are numbered within the tree, shift them to the whole model
+                for side in ('left_child', 'right_child'):
+                    child = np.array(tree[side].split(), dtype=np.int64)
+                    fields[side].append(np.where(child >= 0, child + splits, child - leaves))
+                for name in ('split_feature', 'threshold', 'decision_type'):
+                    fields[name].append(tree[name])
+            fields['leaf_value'].append(tree['leaf_value'])
+            splits, leaves = splits + size - 1, leaves + size
+
+        # One conversion per field, the numbers dominate the parsing time
+        def numbers(name, dtype):
+            return np.array(' '.join(fields[name]).split(), dtype=dtype)
+
+        decision = numbers('decision_type', np.int64)
+        if (decision & CATEGORICAL_MASK).any():
+            raise ValueError("Categorical splits are not supported")
+        empty = np.zeros(0, dtype=np.int64)
+        children = np.column_stack([np.concatenate(fields['left_child'] or [empty]),
+                                    np.concatenate(fields['right_child'] or [empty])]).reshape(-1)
+        return cls(feature_names, np.array(roots, dtype=np.int64), numbers('split_feature', np.int64), numbers('threshold', float), children,
+                   (decision & DEFAULT_LEFT_MASK) > 0, (decision >> 2) & 3, numbers('leaf_value', float))
+
+    def save(self, path):
+        """Write the arrays as an uncompressed `.npz`, swapped in atomically."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **{name: getattr(self, name) for name in ARRAYS})
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path) -> 'Trees':
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in ARRAYS})
+
+
+ARRAYS = ['feature_names', 'roots', 'feature', 'threshold', 'children', 'default_left', 'missing', 'value']
+
+# Parsed trees of every booster seen in this process
+_parsed = weakref.WeakKeyDictionary()
+
+
+def parse_booster(booster) -> Trees:
+    if booster not in _parsed:
+        _parsed[booster] = Trees.parse(booster.model_to_string())
+    return _parsed[booster]
+
+
+def _shift(nodes: np.ndarray, splits: int, leaves: int) -> np.ndarray:
+    """Node references of one booster moved behind the splits and leaves of the previous ones."""
+    return np.where(nodes >= 0, nodes + splits, nodes - leaves)
+
+
+class CompiledForest:
+    """
+    Drop-in replacement of `BoosterBatch` that evaluates the trees of every series
+    together in NumPy (see the module docstring). It only needs the parsed trees, so
+    with the ones cached by `ModelRegistry.trees` the boosters are never loaded.
+    """
+
+    def __init__(self, keys: list, forests: list, layout: list = FEATURES):
+        self.keys = keys
+        self.permutations = [feature_permutation(trees.feature_names, pollutant, station, layout)
+                             for (pollutant, station), trees in zip(keys, forests)]
+        splits = np.cumsum([0, *[len(trees.feature) for trees in forests]])
+        leaves = np.cumsum([0, *[len(trees.value) for trees in forests]])
+        # Split features are mapped from each booster's order to the shared layout
+        self.feature = np.concatenate([permutation[trees.feature] for trees, permutation in zip(forests, self.permutations)])
+        self.threshold = np.concatenate([trees.threshold for trees in forests])
+        self.children = np.concatenate([_shift(trees.children, s, l) for trees, s, l in zip(forests, splits, leaves)])
+        self.default_left = np.concatenate([trees.default_left for trees in forests])
+        self.missing = np.concatenate([trees.missing for trees in forests])
+        self.value = np.concatenate([trees.value for trees in forests])
+        self.roots = np.concatenate([_shift(trees.roots, s, l) for trees, s, l in zip(forests, splits, leaves)])
+        self._breadth_first()
+        # Series of every tree, the trees of a series are contiguous
+        self.tree_series = np.repeat(np.arange(len(forests)), [len(trees.roots) for trees in forests])
+        self.tree_starts = np.cumsum([0, *[len(trees.roots) for trees in forests[:-1]]])
+        # Without missing value handling NaN counts as zero, which can be done once per call
+        self.plain = not self.missing.any()
+
+    def _breadth_first(self):
+        """
+        Renumber the splits level by level across all trees, so the first levels, which
+        every row visits, sit together in memory instead of spread over the whole forest.
+        """
+        pairs = self.children.reshape(-1, 2)
+        levels, frontier = [], self.roots[self.roots >= 0]
+        while len(frontier):
+            levels.append(frontier)
+            children = pairs[frontier].reshape(-1)
+            frontier = children[children >= 0]
+        order = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+        renumber = np.empty(len(order), dtype=np.int64)
+        renumber[order] = np.arange(len(order))
+
+        def moved(nodes):
+            nodes = nodes.copy()
+            nodes[nodes >= 0] = renumber[nodes[nodes >= 0]]
+            return nodes
+
+        self.children = moved(pairs[order]).reshape(-1)
+        self.roots = moved(self.roots)
+        self.feature, self.threshold = self.feature[order], self.threshold[order]
+        self.default_left, self.missing = self.default_left[order], self.missing[order]
+
+    def _goes_right(self, node: np.ndarray, values: np.ndarray) -> np.ndarray:
+        if self.plain:
+            return values > self.threshold.take(node)
+        missing = self.missing[node]
+        nan = np.isnan(values)
+        values = np.where(nan & (missing != MISSING_NAN), 0.0, values)
+        default = ((missing == MISSING_ZERO) & (values == 0)) | ((missing == MISSING_NAN) & nan)
+        return np.where(default, ~self.default_left[node], ~(values <= self.threshold[node]))
+
+    def predict_block(self, features: np.ndarray) -> np.ndarray:
+        """Every row of every series at once, shape (series, rows, features)."""
+        series, rows, width = features.shape
+        flat = np.ascontiguousarray(features, dtype=float).reshape(-1)
+        flat = np.where(np.abs(flat) <= ZERO_THRESHOLD, 0.0, flat)
+        if self.plain:
+            flat = np.where(np.isnan(flat), 0.0, flat)
+
+        # Walk every (tree, row) down one level per pass, dropping the ones at a leaf
+        node = np.repeat(self.roots, rows)
+        # Position of the first value of each row in `flat`
+        offset = ((self.tree_series[:, None] * rows + np.arange(rows)) * width).reshape(-1)
+        position = np.arange(len(node))
+        leaf = np.empty(len(node), dtype=np.int64)
+        while True:
+            done = node < 0
+            finished = np.count_nonzero(done)
+            if finished:
+                leaf[position[done]] = ~node[done]
+                if finished == len(node):
+                    break
+                active = np.flatnonzero(~done)
+                node, offset, position = node.take(active), offset.take(active), position.take(active)
+            goes_right = self._goes_right(node, flat.take(offset + self.feature.take(node)))
+            node = self.children.take(2 * node + goes_right)
+        return np.add.reduceat(self.value.take(leaf).reshape(-1, rows), self.tree_starts, axis=0)
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        """One row per series, shape (series, features)."""
+        return self.predict_block(rows[:, None, :])[:, 0]
+
+
+def _compare(keys: list, boosters: list, rows: np.ndarray, horizon: int = 24, repeat: int = 50) -> dict:
+    """
+    Largest difference to `Booster.predict` over `rows`, and milliseconds per call of
+    both backends for one row per series (a recursive step) and `horizon` rows per
+    series (a direct forecast).
+    """
+    reference, compiled = BoosterBatch(keys, boosters), CompiledForest(keys, [parse_booster(booster) for booster in boosters])
+    block = np.repeat(rows[None], len(keys), axis=0)
+    difference = np.abs(reference.predict_block(block) - compiled.predict_block(block)).max()
+
+    timings = {}
+    for name, predictor in [('lightgbm', reference), ('compiled', compiled)]:
+        for shape, call in [('step', lambda i: predictor.predict(block[:, i % len(rows)])),
+                            ('block', lambda i: predictor.predict_block(block[:, i % len(rows):][:, :horizon]))]:
+            start = time.perf_counter()
+            for i in range(repeat):
+                call(i)
+            timings[f'{name}_{shape}_ms'] = 1000 * (time.perf_counter() - start) / repeat
+    return {'max_abs_diff': float(difference), **timings}
+
+
+def compare(stations: list, pollutants: list, rows: int = 500, seed: int = 0) -> dict:
+    """
+    Parity and latency of the compiled backend against `Booster.predict` for the
+    recursive models of the given stations, on rows of their station history laid out
+    as the forecaster does.
+    """
+    from scripts.model_registry import ModelRegistry, model_key
+    from scripts.station_store import load_station_history
+    from scripts.forecast_engine import LAGS, WEATHER_COLUMNS, CALENDAR_FEATURES, calendar_features
+
+    registry = ModelRegistry()
+    keys = [(poll, station) for station in stations for poll in pollutants if model_key(poll, station) in registry]
+    boosters = [registry[model_key(poll, station)] for poll, station in keys]
+
+    # Real feature rows of the first station (lags of its first pollutant), a few with missing values
+    poll, station = keys[0]
+    history = load_station_history(station)
+    history = history.rename(columns=lambda column: column[:-len(station) - 1] if column.endswith(f'_{station}') else column)
+    target = np.log1p(history[poll].to_numpy(dtype=float))
+    picks = np.random.default_rng(seed).choice(np.arange(max(LAGS), len(history)), size=rows, replace=False)
+    table = np.empty((rows, len(FEATURES)))
+    table[:, :len(WEATHER_COLUMNS)] = history[WEATHER_COLUMNS].to_numpy(dtype=float)[picks]
+    for i, lag in enumerate(LAGS):
+        table[:, len(WEATHER_COLUMNS) + i] = target[picks - lag]
+    table[:, len(FEATURES) - len(CALENDAR_FEATURES):] = calendar_features(pd.DatetimeIndex(history['datetime'].iloc[picks]))
+    table[::50, len(WEATHER_COLUMNS)] = np.nan
+    return _compare(keys, boosters, table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the inference backends.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compare_parser = subparsers.add_parser('compare', help='Parity and latency of the compiled backend against Booster.predict')
+    compare_parser.add_argument('--stations', nargs='+', default=['MER', 'BJU', 'PED', 'UIZ'])
+    compare_parser.add_argument('--pollutants', nargs='+', default=['CO', 'NO2', 'O3', 'PM10', 'PM25', 'SO2'])
+    compare_parser.add_argument('--rows', type=int, default=500, help='History rows to predict (default: 500)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        result = compare(args.stations, args.pollutants, args.rows)
+        print(f"Backends: {', '.join(BACKENDS)}")
+        print(f"Largest difference to Booster.predict: {result['max_abs_diff']:.3g}")
+        print(f"{'backend':<10} {'step ms':>10} {'24 rows ms':>11}")
+        for backend in ('lightgbm', 'compiled'):
+            print(f"{backend:<10} {result[f'{backend}_step_ms']:10.2f} {result[f'{backend}_block_ms']:11.2f}")
+
+
+if __name__ == '__main__':
+    main()
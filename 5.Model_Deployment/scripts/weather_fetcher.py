@@ -0,0 +1,140 @@
+'''
+  Concurrent weather requests for many stations.
+
+  `fetch_weather` asks a `WeatherProvider` for the weather of many stations without
+  waiting on them one after the other: the stations that need the same dates share
+  one bulk `get_many` request (usually all of them), and the requests for different
+  dates run at the same time. Each request runs in a worker thread (the provider and
+  its clients are blocking), at most `concurrency` at a time and each bounded by
+  `timeout` seconds.
+
+  Stale while revalidate: when every station of a request already has a cached
+  response, however old, it is returned right away and the request is sent in the
+  background (one per request at a time) to refresh the cache for the next run, so
+  upstream latency never holds up a forecast that has something to work with. Only
+  stations with nothing cached wait for the request, and if it fails or times out the
+  stations that do have a response get it; a timed-out request keeps running in its
+  thread and, if it succeeds, fills the cache as well.
+'''
+import asyncio
+import warnings
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from scripts.weather_provider import HOURLY_VARIABLES
+
+# Requests in flight at the same time
+CONCURRENCY = 4
+# Seconds a request may take, retries of the client included
+TIMEOUT = 30.0
+
+# Threads of the requests. Not the loop's default executor, which `asyncio.run` waits
+# for on exit, so a timed-out request does not hold up its caller
+_executor = ThreadPoolExecutor(max_workers=2 * CONCURRENCY, thread_name_prefix='weather')
+
+# Background refreshes in flight, by provider and request
+_refreshing = {}
+_refreshing_lock = threading.Lock()
+
+
+class WeatherUnavailable(RuntimeError):
+    """Raised when a station has neither a fresh nor a cached response."""
+
+
+def last_good_frames(provider, locations: dict, start_date, end_date, variables: list = HOURLY_VARIABLES):
+    """Last good response of every location, None if one of them has none."""
+    frames = {}
+    for name, (lat, lon) in locations.items():
+        frames[name] = provider.last_good(lat, lon, start_date, end_date, variables)
+        if frames[name] is None:
+            return None
+    return frames
+
+
+def _refresh(provider, key: tuple, locations: dict, start_date, end_date, variables: list):
+    try:
+        provider.get_many(locations, start_date, end_date, variables)
+    except Exception as error:
+        warnings.warn(f"Weather refresh for {', '.join(locations)} failed ({error!r}), the last good responses stay cached")
+    finally:
+        with _refreshing_lock:
+            _refreshing.pop(key, None)
+
+
+def refresh_in_background(provider, locations: dict, start_date, end_date, variables: list = HOURLY_VARIABLES):
+    """
+    Send the request for `locations` in a worker thread to refresh the provider's
+    cache, unless the same request is already in flight. Returns its future.
+    """
+    key = (provider, tuple(locations.values()), str(start_date), str(end_date), tuple(variables))
+    with _refreshing_lock:
+        future = _refreshing.get(key)
+        if future is None or future.done():
+            future = _refreshing[key] = _executor.submit(_refresh, provider, key, locations, start_date, end_date, variables)
+        return future
+
+
+async def fetch_locations(provider, semaphore: asyncio.Semaphore, locations: dict, start_date, end_date,
+                          timeout: float = TIMEOUT, variables: list = HOURLY_VARIABLES) -> dict:
+    """
+    Weather of locations that need the same dates. If all of them have a cached
+    response it is returned at once and refreshed in the background, otherwise they
+    wait for one bulk request to `provider`, falling back to the last good responses
+    if it fails or takes longer than `timeout`.
+
+    Args:
+        locations: Name to (latitude, longitude)
+
+    Returns:
+        Mapping of the same names to weather frames
+    """
+    loop = asyncio.get_running_loop()
+    # The disk cache is read in a thread as well
+    cached = await loop.run_in_executor(_executor, last_good_frames, provider, locations, start_date, end_date, variables)
+    if cached is not None:
+        refresh_in_background(provider, locations, start_date, end_date, variables)
+        return cached
+
+    async with semaphore:
+        try:
+            request = functools.partial(provider.get_many, locations, start_date, end_date, variables)
+            return await asyncio.wait_for(loop.run_in_executor(_executor, request), timeout)
+        except Exception as error:
+            frames = {}
+            for name, (lat, lon) in locations.items():
+                frames[name] = provider.last_good(lat, lon, start_date, end_date, variables)
+                if frames[name] is None:
+                    raise WeatherUnavailable(f"No weather for {name} ({lat}, {lon}) from {start_date} to {end_date}: {error!r}") from error
+            warnings.warn(f"Weather request for {', '.join(locations)} failed ({error!r}), using the last good responses")
+            return frames
+
+
+async def fetch_weather(provider, requests: dict, concurrency: int = CONCURRENCY, timeout: float = TIMEOUT,
+                        variables: list = HOURLY_VARIABLES) -> dict:
+    """
+    Weather of many locations, one bulk request per date range, fetched concurrently.
+
+    Args:
+        requests: Name to (latitude, longitude, start_date, end_date)
+
+    Returns:
+        Mapping of the same names to weather frames (the provider layout)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    groups = {}
+    for name, (lat, lon, start_date, end_date) in requests.items():
+        groups.setdefault((start_date, end_date), {})[name] = (lat, lon)
+    results = await asyncio.gather(*[
+        fetch_locations(provider, semaphore, locations, *dates, timeout=timeout, variables=variables) for dates, locations in groups.items()
+    ])
+    frames = {name: frame for result in results for name, frame in result.items()}
+    return {name: frames[name] for name in requests}
+
+
+def day_after(last_datetime) -> tuple:
+    """('YYYY-MM-DD', 'YYYY-MM-DD') of the date of `last_datetime` and the next one, the forecast inputs."""
+    last_date = pd.Timestamp(last_datetime).normalize()
+    return last_date.strftime('%Y-%m-%d'), (last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
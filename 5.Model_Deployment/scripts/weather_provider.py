@@ -0,0 +1,256 @@
+'''
+  Cached access to the Open-Meteo hourly weather used as model input.
+
+  `WeatherProvider` answers requests keyed by (latitude, longitude, variables, date
+  range) from an in-process cache, then from an on-disk cache, and only then from the
+  API. Archive and forecast responses expire after different TTLs, and `get_many`
+  fetches every location that is not cached in one multi-location request.
+
+  The HTTP side is pluggable: `OpenMeteoClient` talks to the real API and
+  `RecordedClient` serves responses recorded as JSON files, so the forecaster can run
+  offline against a fixed set of inputs.
+'''
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from datetime import date, timedelta
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = BASE_DIR / 'Dashboard_data' / 'weather_cache'
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Variables to retrieve and used in training
+HOURLY_VARIABLES = ["temperature_2m", "relative_humidity_2m", "wind_speed_10m", "wind_direction_10m", "direct_radiation"]
+
+# Names of the variables in the station files
+COLUMN_NAMES = {
+    "direct_radiation": "direct_radiation (W/m²)",
+    "relative_humidity_2m": "RH",
+    "temperature_2m": "TMP",
+    "wind_direction_10m": "WDR",
+    "wind_speed_10m": "WSP",
+}
+
+# The archive lags a few days behind, more recent dates come from the forecast API
+ARCHIVE_DELAY_DAYS = 5
+
+# Seconds before a cached response is fetched again
+ARCHIVE_TTL = 7 * 24 * 3600
+FORECAST_TTL = 3600
+
+
+def request_key(url: str, params: dict) -> str:
+    """Stable hash of a request, used for the caches and the recordings."""
+    payload = json.dumps({'url': url, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class OpenMeteoClient:
+    """
+    Fetch hourly variables from the Open-Meteo API, one frame per location.
+    `base_url` (e.g. 'http://127.0.0.1:8080') replaces the scheme and host of the API
+    URLs, to talk to a mirror or a local stub.
+    """
+
+    def __init__(self, retries: int = 5, backoff_factor: float = 0.2, base_url: str = None):
+        # Imported here so the recorded client works without the API packages
+        import requests
+        import openmeteo_requests
+        from retry_requests import retry
+
+        retry_session = retry(requests.Session(), retries=retries, backoff_factor=backoff_factor)
+        self.openmeteo = openmeteo_requests.Client(session=retry_session)
+        self.base_url = base_url
+
+    def fetch(self, url: str, params: dict) -> list:
+        if self.base_url is not None:
+            url = self.base_url.rstrip('/') + urlsplit(url).path
+        responses = self.openmeteo.weather_api(url, params=params)
+        frames = []
+        for response in responses:
+            hourly = response.Hourly()
+            frame = pd.DataFrame({"datetime": pd.date_range(
+                start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
+                end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
+                freq=pd.Timedelta(seconds=hourly.Interval()),
+                inclusive="left"
+            )})
+            for i, variable in enumerate(params["hourly"]):
+                frame[variable] = hourly.Variables(i).ValuesAsNumpy()
+            frames.append(frame)
+        return frames
+
+
+class RecordedClient:
+    """
+    Serve recorded responses from `{request_key}.json` files in `directory`.
+
+    When `upstream` is given, requests without a recording are fetched from it and
+    recorded, which is how recordings are made in the first place.
+    """
+
+    def __init__(self, directory: Path, upstream=None):
+        self.directory = Path(directory)
+        self.upstream = upstream
+
+    def path(self, url: str, params: dict) -> Path:
+        return self.directory / f'{request_key(url, params)}.json'
+
+    def fetch(self, url: str, params: dict) -> list:
+        path = self.path(url, params)
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                recording = json.load(f)
+            return [pd.DataFrame({**location, 'datetime': pd.to_datetime(location['datetime'], utc=True)})
+                    for location in recording['locations']]
+
+        if self.upstream is None:
+            raise KeyError(f"No recorded response for {url} with {params}")
+        frames = self.upstream.fetch(url, params)
+        self.record(url, params, frames)
+        return frames
+
+    def record(self, url: str, params: dict, frames: list):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        locations = []
+        for frame in frames:
+            location = {column: frame[column].tolist() for column in frame.columns if column != 'datetime'}
+            location['datetime'] = frame['datetime'].dt.strftime('%Y-%m-%dT%H:%M:%SZ').tolist()
+            locations.append(location)
+        with open(self.path(url, params), 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'params': params, 'locations': locations}, f)
+
+
+class WeatherProvider:
+    """
+    Hourly weather for one or many locations with memory and disk caches.
+
+    Frames are returned in the station file layout: `datetime` (UTC) followed by
+    the columns of `COLUMN_NAMES`.
+    """
+
+    def __init__(self, client=None, cache_dir: Path = CACHE_DIR, archive_ttl: float = ARCHIVE_TTL, forecast_ttl: float = FORECAST_TTL):
+        self._client = client
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.ttls = {'archive': archive_ttl, 'forecast': forecast_ttl}
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # The real client is only built when a request misses every cache
+        if self._client is None:
+            self._client = OpenMeteoClient()
+        return self._client
+
+    @staticmethod
+    def source(end_date) -> str:
+        """'archive' for dates the archive already covers, 'forecast' otherwise."""
+        end_date = pd.Timestamp(end_date).date()
+        return 'archive' if end_date <= date.today() - timedelta(days=ARCHIVE_DELAY_DAYS) else 'forecast'
+
+    @staticmethod
+    def _location_params(lat: float, lon: float, start_date: str, end_date: str, variables: list) -> dict:
+        return {
+            "latitude": round(float(lat), 4),
+            "longitude": round(float(lon), 4),
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "hourly": list(variables),
+        }
+
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}.parquet'
+
+    def _cached(self, key: str, kind: str):
+        ttl = self.ttls[kind]
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and now - entry[0] <= ttl:
+            return entry[1]
+
+        if self.cache_dir is not None:
+            path = self._cache_path(key)
+            if path.exists() and now - path.stat().st_mtime <= ttl:
+                frame = pd.read_parquet(path)
+                with self._lock:
+                    self._memory[key] = (path.stat().st_mtime, frame)
+                return frame
+        return None
+
+    def _store(self, key: str, frame: pd.DataFrame):
+        with self._lock:
+            self._memory[key] = (time.time(), frame)
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._cache_path(key).with_suffix('.parquet.tmp')
+            frame.to_parquet(tmp_path, index=False)
+            tmp_path.replace(self._cache_path(key))
+
+    def last_good(self, lat: float, lon: float, start_date, end_date, variables: list = HOURLY_VARIABLES):
+        """Most recent cached frame for a request regardless of its age, or None."""
+        key = request_key(self.source(end_date), self._location_params(lat, lon, start_date, end_date, variables))
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None:
+            return entry[1]
+        if self.cache_dir is not None and self._cache_path(key).exists():
+            return pd.read_parquet(self._cache_path(key))
+        return None
+
+    def get(self, lat: float, lon: float, start_date, end_date, variables: list = HOURLY_VARIABLES) -> pd.DataFrame:
+        """Hourly weather of one location between two dates (both inclusive)."""
+        return self.get_many({'location': (lat, lon)}, start_date, end_date, variables)['location']
+
+    def get_many(self, locations: dict, start_date, end_date, variables: list = HOURLY_VARIABLES) -> dict:
+        """
+        Hourly weather of several locations between the same dates.
+
+        Args:
+            locations: Name to (latitude, longitude)
+            start_date, end_date: Dates as 'YYYY-MM-DD' strings or date objects
+
+        Returns:
+            Mapping of the same names to weather frames
+        """
+        kind = self.source(end_date)
+        url = ARCHIVE_URL if kind == 'archive' else FORECAST_URL
+
+        results = {}
+        missing = {}
+        for name, (lat, lon) in locations.items():
+            key = request_key(kind, self._location_params(lat, lon, start_date, end_date, variables))
+            frame = self._cached(key, kind)
+            if frame is None:
+                missing[name] = (key, lat, lon)
+            else:
+                results[name] = frame
+
+        if missing:
+            # One request for every location that missed the caches
+            params = {
+                "latitude": [round(float(lat), 4) for _, lat, _ in missing.values()],
+                "longitude": [round(float(lon), 4) for _, _, lon in missing.values()],
+                "start_date": str(start_date),
+                "end_date": str(end_date),
+                "hourly": list(variables),
+            }
+            frames = self.client.fetch(url, params)
+            for (name, (key, _, _)), frame in zip(missing.items(), frames):
+                frame = frame.rename(columns=COLUMN_NAMES)
+                self._store(key, frame)
+                results[name] = frame
+
+        return {name: results[name] for name in locations}
+
+
+# Shared by the forecaster in this process
+default_provider = WeatherProvider()
@@ -0,0 +1,59 @@
+'''
+  Payload store of the JSON API, without the data files.
+'''
+import sys
+import asyncio
+import subprocess
+from pathlib import Path
+
+import pytest
+
+# FastAPI is the optional `api` extra, its test client needs httpx
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+from fastapi.testclient import TestClient  # noqa: E402
+
+from scripts import api  # noqa: E402
+
+
+@pytest.fixture
+def payloads(monkeypatch) -> list:
+    """Fake versions and payloads, the versions each rebuild was asked for are recorded."""
+    builds = []
+
+    def build_payloads(versions):
+        builds.append(versions)
+        return {'stations': api.Payload({'stations': [], 'versions': versions}, 0)}
+
+    monkeypatch.setattr(api, 'stations_version', lambda: (1,))
+    monkeypatch.setattr(api, 'forecast_version', lambda: (2,))
+    monkeypatch.setattr(api, 'build_payloads', build_payloads)
+    return builds
+
+
+def test_api_does_not_import_streamlit():
+    code = 'import sys, scripts.api; sys.exit("streamlit" in sys.modules)'
+    assert subprocess.run([sys.executable, '-c', code], cwd=Path(api.__file__).parents[1]).returncode == 0
+
+
+def test_concurrent_refreshes_in_successive_loops(payloads):
+    # Built outside any loop, like the module level store
+    store = api.PayloadStore(check_interval=0)
+
+    async def contend():
+        # The second refresh waits on the lock while the first rebuilds
+        await asyncio.gather(store.refresh(), store.refresh())
+
+    for _ in range(2):
+        asyncio.run(contend())
+    assert payloads == [((1,), (2,))]
+
+
+def test_requests_are_served_and_revalidated(payloads, monkeypatch):
+    monkeypatch.setattr(api, 'store', api.PayloadStore())
+
+    with TestClient(api.app) as client:
+        response = client.get('/api/stations')
+        assert response.status_code == 200 and response.json()['versions'] == [[1], [2]]
+        assert client.get('/api/stations', headers={'If-None-Match': response.headers['etag']}).status_code == 304
+        assert client.get('/api/forecast/XYZ').status_code == 404
@@ -0,0 +1,37 @@
+'''
+  Incremental updates of the hour-of-year climatology.
+'''
+import numpy as np
+import pandas as pd
+
+from scripts.climatology import Climatology, load_climatology
+
+
+def history(value: float, hours: int = 48, station: str = 'MER') -> pd.DataFrame:
+    df = pd.DataFrame({'datetime': pd.date_range('2024-01-01', periods=hours, freq='h'), 'station': station})
+    for column in Climatology().columns:
+        df[column] = value
+    return df
+
+
+def test_new_rows_are_added_incrementally(tmp_path):
+    path = tmp_path / 'climatology.npz'
+    load_climatology(history(1.0, hours=24), path, signatures={'MER': 'a'})
+    climatology = load_climatology(history(1.0, hours=48).assign(PM25=3.0), path, signatures={'MER': 'a'})
+
+    # The first day keeps its sums, only the second one is read from the new rows
+    means = climatology.hourly_means('MER', 'PM25', pd.date_range('2024-01-01', periods=48, freq='h'))
+    assert np.allclose(means[:24], 1.0)
+    assert np.allclose(means[24:], 3.0)
+
+
+def test_rewritten_history_is_rebuilt(tmp_path):
+    path = tmp_path / 'climatology.npz'
+    load_climatology(history(1.0), path, signatures={'MER': 'a', 'BJU': 'b'})
+
+    # Same dates, other values: only a new source signature tells them apart
+    same = load_climatology(history(2.0), path, signatures={'MER': 'a', 'BJU': 'b'})
+    assert same.day_mean('MER', 'PM25', 1) == 1.0
+    rewritten = load_climatology(history(2.0), path, signatures={'MER': 'c', 'BJU': 'b'})
+    assert rewritten.day_mean('MER', 'PM25', 1) == 2.0
+    assert Climatology.load(path).day_mean('MER', 'PM25', 1) == 2.0
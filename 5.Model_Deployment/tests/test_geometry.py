@@ -0,0 +1,44 @@
+'''
+  Shared borders of the simplified alcaldía layers.
+'''
+import json
+
+import pytest
+import shapely
+from shapely.geometry import box, shape
+
+from scripts.geometry import SOURCE_PATH, TOLERANCES, simplify
+
+
+def holes(geometry) -> int:
+    return sum(len(polygon.interiors) for polygon in shapely.get_parts(geometry))
+
+
+@pytest.fixture(scope='module')
+def alcaldias() -> list:
+    with open(SOURCE_PATH, encoding='utf-8') as f:
+        return [shape(feature['geometry']) for feature in json.load(f)['features']]
+
+
+@pytest.mark.parametrize('tolerance', TOLERANCES.values())
+def test_simplified_alcaldias_tile_the_city(alcaldias, tolerance):
+    simplified = simplify(alcaldias, tolerance)
+    union = shapely.union_all(simplified)
+
+    assert all(geometry.is_valid and not geometry.is_empty for geometry in simplified)
+    assert sum(geometry.area for geometry in simplified) - union.area < 1e-12
+    assert union.geom_type == 'Polygon' and holes(union) == 0
+    assert shapely.get_num_coordinates(simplified).sum() < shapely.get_num_coordinates(alcaldias).sum()
+    for original, geometry in zip(alcaldias, simplified):
+        assert abs(geometry.area - original.area) < 0.01 * original.area
+
+
+def test_gap_between_polygons_is_closed():
+    left, right = box(0, 0, 1, 1), box(1.001, 0, 2, 1)
+    # A third polygon around both, so the sliver between them is an interior gap
+    frame = box(-1, -1, 3, 2).difference(box(0, 0, 2, 1))
+    simplified = simplify([left, right, frame], 1e-6)
+
+    assert holes(shapely.union_all(simplified)) == 0
+    assert shapely.union_all(simplified).area == pytest.approx(box(-1, -1, 3, 2).area)
+    assert simplified[0].area + simplified[1].area == pytest.approx(2.0)
@@ -0,0 +1,49 @@
+'''
+  Index of the stations and of the points interpolated between them.
+'''
+import numpy as np
+import pandas as pd
+
+from scripts.aqi_index import NO_DATA, air_index
+from scripts.interpolation import AqiSurface
+
+STATIONS = {'A': {'lat': 19.40, 'lon': -99.20}, 'B': {'lat': 19.40, 'lon': -99.10}}
+# One point on each station and one halfway
+TARGETS = {'on A': (19.40, -99.20), 'on B': (19.40, -99.10), 'between': (19.40, -99.15)}
+
+
+def frame(station: str, start: str, hours: int, **readings) -> pd.DataFrame:
+    return pd.DataFrame({'datetime': pd.date_range(start, periods=hours, freq='h'), 'station': station,
+                         **{poll: np.full(hours, value) for poll, value in readings.items()}})
+
+
+def test_stations_and_estimates_share_the_index():
+    history = pd.concat([frame('A', '2024-03-01', 3, PM25=10.0, O3=95.0, AirQualityIndex=5),
+                         frame('B', '2024-03-01', 3, PM25=60.0, O3=np.nan, AirQualityIndex=1)], ignore_index=True)
+    surface = AqiSurface.build(history, None, STATIONS, TARGETS, pollutants=['PM25', 'O3'])
+    latest = history.groupby('station').tail(1).set_index('station')
+
+    for station in STATIONS:
+        # Categorized from the pollutants, not the stored published index
+        assert surface.station_index(station) == air_index(latest.loc[[station]], pollutants=['PM25', 'O3'])[0]
+        assert surface.station_index(station) == surface.index(f'on {station}')
+    assert not surface.has_station('C')
+
+
+def test_station_without_readings_has_no_index():
+    history = pd.concat([frame('A', '2024-03-01', 3, PM25=10.0), frame('B', '2024-03-01', 3, PM25=np.nan)], ignore_index=True)
+    surface = AqiSurface.build(history, None, STATIONS, TARGETS, pollutants=['PM25'])
+
+    assert surface.station_index('B') == NO_DATA
+    assert surface.index('on B') == surface.index('on A') != NO_DATA
+
+
+def test_forecast_hours_cover_every_station():
+    history = pd.concat([frame('A', '2024-03-01', 3, PM25=10.0), frame('B', '2024-03-01', 3, PM25=20.0)], ignore_index=True)
+    # B's forecast starts two hours after A's and ends one hour before it
+    forecast = pd.concat([frame('A', '2024-03-01 03:00', 24, PM25=10.0), frame('B', '2024-03-01 05:00', 21, PM25=20.0)], ignore_index=True)
+    surface = AqiSurface.build(history, forecast, STATIONS, TARGETS, pollutants=['PM25'])
+
+    assert list(surface.dates) == list(pd.date_range('2024-03-01 05:00', '2024-03-02 01:00', freq='h'))
+    assert not np.isnan(surface.forecast).any()
+    assert (surface.forecast_indexes('between') != NO_DATA).all()
@@ -0,0 +1,55 @@
+'''
+  Concurrent lookups in the model registry.
+
+  `_load` is slowed down and counted, so the threads that miss on a key at the same
+  time overlap while the first one is still loading it.
+'''
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.model_registry import ModelRegistry
+
+
+class SlowRegistry(ModelRegistry):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loads = []
+        self.load_lock = threading.Lock()
+
+    def _load(self, key: str):
+        with self.load_lock:
+            self.loads.append(key)
+        time.sleep(0.2)
+        return object()
+
+
+def lookups(registry: ModelRegistry, keys: list) -> list:
+    barrier = threading.Barrier(len(keys))
+
+    def lookup(key):
+        barrier.wait()
+        return registry[key]
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+        return list(executor.map(lookup, keys))
+
+
+def test_concurrent_misses_load_a_key_once(tmp_path):
+    registry = SlowRegistry(tmp_path)
+    boosters = lookups(registry, ['PM25_MER'] * 8)
+
+    assert registry.loads == ['PM25_MER']
+    assert all(booster is boosters[0] for booster in boosters)
+    assert registry.cache_info()['misses'] == 1
+    assert registry.cache_info()['hits'] == 7
+
+
+def test_different_keys_load_in_parallel(tmp_path):
+    registry = SlowRegistry(tmp_path)
+    start = time.perf_counter()
+    lookups(registry, ['PM25_MER', 'O3_MER', 'CO_BJU', 'SO2_BJU'])
+
+    assert sorted(registry.loads) == ['CO_BJU', 'O3_MER', 'PM25_MER', 'SO2_BJU']
+    assert time.perf_counter() - start < 0.6
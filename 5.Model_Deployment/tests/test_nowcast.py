@@ -0,0 +1,62 @@
+'''
+  NowCast averages of windows with missing hours.
+'''
+import numpy as np
+import pandas as pd
+
+from scripts.nowcast import ADJUSTMENT_FACTORS, NowCast, nowcast_average
+
+# 12 hourly PM2.5 readings, oldest first
+READINGS = np.array([30.0, 32.0, 35.0, 40.0, 38.0, 36.0, 34.0, 33.0, 31.0, 29.0, 28.0, 27.0])
+
+
+def weighted(concentrations: np.ndarray) -> float:
+    """NowCast over the hours that have a reading, before the PM2.5 adjustment."""
+    present = ~np.isnan(concentrations)
+    w = max(0.5, 1 - (np.nanmax(concentrations) - np.nanmin(concentrations)) / np.nanmax(concentrations))
+    weights = w ** np.arange(len(concentrations) - 1, -1, -1)
+    return np.sum(concentrations[present] * weights[present]) / np.sum(weights[present])
+
+
+def test_complete_window():
+    assert nowcast_average(READINGS, 'PM25') == int(weighted(READINGS) * ADJUSTMENT_FACTORS['PM25'])
+
+
+def test_missing_hour_before_the_last_three_is_left_out():
+    window = READINGS.copy()
+    window[[2, 5]] = np.nan
+
+    # Both the reading and its weight are dropped, the other hours keep their weights
+    assert nowcast_average(window, 'PM25') == int(weighted(window) * ADJUSTMENT_FACTORS['PM25'])
+    assert nowcast_average(window, 'PM25') != nowcast_average(np.nan_to_num(window), 'PM25')
+
+
+def test_one_missing_hour_in_the_last_three_counts_as_zero():
+    window = READINGS.copy()
+    window[-2] = np.nan
+    filled = window.copy()
+    filled[-2] = 0.0
+
+    assert nowcast_average(window, 'PM25') == int(weighted(filled) * ADJUSTMENT_FACTORS['PM25'])
+
+
+def test_too_many_missing_hours():
+    recent = READINGS.copy()
+    recent[[-1, -3]] = np.nan
+    assert nowcast_average(recent, 'PM25') == "No info"
+
+    older = READINGS.copy()
+    older[[0, 2, 4, 6]] = np.nan
+    assert nowcast_average(older, 'PM25') == "No info"
+
+
+def test_ring_buffer_matches_the_window():
+    window = READINGS.copy()
+    window[3] = np.nan
+    history = pd.DataFrame({'datetime': pd.date_range('2024-01-01', periods=20, freq='h')})
+    history['PM25'] = np.concatenate([np.full(8, 100.0), window])
+
+    nowcast = NowCast(pollutants=['PM25'])
+    nowcast.update(history.iloc[:10], 'MER')
+    nowcast.update(history, 'MER')
+    assert nowcast.average('MER', 'PM25') == nowcast_average(window, 'PM25')
@@ -0,0 +1,53 @@
+'''
+  Imputation of appended hourly readings.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.station_store import impute_new_rows
+
+
+@pytest.fixture
+def previous() -> pd.DataFrame:
+    """Last stored hours of a station, with the published index."""
+    return pd.DataFrame({
+        'datetime': pd.date_range('2024-03-01', periods=3, freq='h'),
+        'PM25_MER': [10.0, 12.0, 14.0],
+        'O3_MER': [0.02, 0.03, 0.04],
+        'is_festival': [0, 0, 0],
+        'is_weekend': [0, 0, 0],
+        'AirQualityIndex': [2, 2, 3],
+    })
+
+
+def test_gap_is_interpolated_and_the_index_carried_forward(previous):
+    readings = pd.DataFrame({'datetime': ['2024-03-01 05:00'], 'PM25_MER': [20.0], 'O3_MER': [np.nan]})
+    new = impute_new_rows(previous, readings, 'MER')
+
+    assert list(new['datetime']) == list(pd.date_range('2024-03-01 03:00', periods=3, freq='h'))
+    assert np.allclose(new['PM25_MER'], [16.0, 18.0, 20.0])
+    assert np.allclose(new['O3_MER'], 0.04)
+    # The stored index is the published one, it is never recomputed per station
+    assert list(new['AirQualityIndex']) == [3, 3, 3]
+    assert (new.dtypes == previous.dtypes).all()
+
+
+def test_published_index_of_the_readings_is_kept(previous):
+    readings = pd.DataFrame({'datetime': ['2024-03-01 04:00', '2024-03-01 05:00'], 'PM25_MER': [20.0, 22.0],
+                             'O3_MER': [0.05, 0.06], 'AirQualityIndex': [4, np.nan]})
+    new = impute_new_rows(previous, readings, 'MER')
+
+    assert list(new['AirQualityIndex']) == [3, 4, 4]
+
+
+@pytest.mark.parametrize('columns', [
+    ['datetime', 'PM25', 'O3_MER'],
+    ['datetime', 'PM25_MER'],
+    ['datetime', 'PM25_MER', 'O3_MER', 'NO2_MER'],
+])
+def test_readings_with_other_columns_are_rejected(previous, columns):
+    readings = pd.DataFrame({column: [1.0] for column in columns}).assign(datetime=['2024-03-01 04:00'])
+
+    with pytest.raises(ValueError, match='MER'):
+        impute_new_rows(previous, readings, 'MER')
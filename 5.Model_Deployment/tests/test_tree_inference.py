@@ -0,0 +1,120 @@
+'''
+  Parity of the compiled trees with `Booster.predict`.
+
+  Small boosters are trained on synthetic data with the feature names of the station
+  models, in a shuffled order, and with each missing value type: NaN (the default
+  with missing training values), Zero (`zero_as_missing`) and None (`use_missing`
+  off). A constant target gives one-leaf trees. The rows fed to both backends hit
+  NaNs, zeros, values around LightGBM's zero threshold and the split thresholds
+  themselves.
+'''
+import numpy as np
+import lightgbm as lgb
+import pytest
+
+from scripts.forecast_engine import BoosterBatch, FEATURES, WEATHER_COLUMNS, feature_permutation
+from scripts.tree_inference import CompiledForest, Trees, parse_booster, MISSING_NONE, MISSING_ZERO, MISSING_NAN, ZERO_THRESHOLD
+
+TOLERANCE = 1e-9
+
+# (pollutant, station) of each booster and its training parameters
+MODELS = {
+    ('PM25', 'MER'): {},
+    ('PM10', 'MER'): {'zero_as_missing': True},
+    ('O3', 'BJU'): {'use_missing': False},
+    ('CO', 'BJU'): {'constant': True},
+}
+
+
+def model_feature_names(pollutant: str, station: str, rng) -> list:
+    """Feature names as in the trained models, in a random order."""
+    names = []
+    for feature in FEATURES:
+        if feature == 'direct_radiation (W/m²)':
+            names.append('direct_radiation_(W/m²)')
+        elif feature in WEATHER_COLUMNS:
+            names.append(f'{feature}_{station}')
+        elif feature.startswith('lag_'):
+            names.append(f'{pollutant}_{station}_log_{feature}')
+        else:
+            names.append(feature)
+    return list(rng.permutation(names))
+
+
+def train(params: dict, names: list, rng) -> lgb.Booster:
+    n = 400
+    X = rng.normal(size=(n, len(names)))
+    X[rng.random(X.shape) < 0.15] = np.nan
+    X[rng.random(X.shape) < 0.1] = 0.0
+    if params.pop('constant', False):
+        y = np.full(n, 2.0)
+    else:
+        y = np.nan_to_num(X[:, 0], nan=3) + np.where(X[:, 1] == 0, -2, 0) + rng.normal(scale=0.1, size=n)
+    params = {'objective': 'regression', 'verbose': -1, 'num_leaves': 15, 'min_data_in_leaf': 5, **params}
+    return lgb.train(params, lgb.Dataset(X, y, feature_name=names), num_boost_round=30)
+
+
+@pytest.fixture(scope='module')
+def boosters():
+    rng = np.random.default_rng(0)
+    keys = list(MODELS)
+    return keys, [train(dict(params), model_feature_names(*key, rng), rng) for key, params in MODELS.items()]
+
+
+def edge_rows(keys: list, boosters: list, rows: int, seed: int = 1) -> np.ndarray:
+    """(series, rows, features) in `FEATURES` order, drawn from the split thresholds and edge values."""
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(len(keys), rows, len(FEATURES)))
+    edges = np.array([np.nan, 0.0, -0.0, 1e-36, -1e-36, 1e-35, ZERO_THRESHOLD, -ZERO_THRESHOLD, 1e-30])
+    for s, ((pollutant, station), booster) in enumerate(zip(keys, boosters)):
+        trees = parse_booster(booster)
+        columns = feature_permutation(booster.feature_name(), pollutant, station)[trees.feature]
+        for column in range(len(FEATURES)):
+            pool = np.concatenate([edges, trees.threshold[columns == column]])
+            picked = rng.random(rows) < 0.6
+            features[s, picked, column] = rng.choice(pool, picked.sum())
+    return features
+
+
+def test_boosters_cover_the_decision_rules(boosters):
+    keys, models = boosters
+    trees = [parse_booster(booster) for booster in models]
+
+    assert {MISSING_NAN} == set(trees[0].missing)
+    assert {MISSING_ZERO} == set(trees[1].missing)
+    assert {MISSING_NONE} == set(trees[2].missing)
+    assert (trees[3].roots < 0).all()
+    default_left = np.concatenate([tree.default_left for tree in trees[:2]])
+    assert default_left.any() and not default_left.all()
+
+
+def test_predict_block_matches_booster(boosters):
+    keys, models = boosters
+    features = edge_rows(keys, models, rows=300)
+    compiled = CompiledForest(keys, [parse_booster(booster) for booster in models]).predict_block(features)
+    expected = BoosterBatch(keys, models).predict_block(features)
+
+    assert np.abs(compiled - expected).max() < TOLERANCE
+
+
+def test_predict_matches_booster(boosters):
+    keys, models = boosters
+    features = edge_rows(keys, models, rows=50, seed=2)
+    compiled = CompiledForest(keys, [parse_booster(booster) for booster in models])
+    batch = BoosterBatch(keys, models)
+
+    for step in range(features.shape[1]):
+        rows = features[:, step, :]
+        assert np.abs(compiled.predict(rows) - batch.predict(rows)).max() < TOLERANCE
+
+
+def test_saved_trees_predict_the_same(boosters, tmp_path):
+    keys, models = boosters
+    loaded = []
+    for i, booster in enumerate(models):
+        parse_booster(booster).save(tmp_path / f'{i}.npz')
+        loaded.append(Trees.load(tmp_path / f'{i}.npz'))
+    features = edge_rows(keys, models, rows=100, seed=3)
+
+    expected = BoosterBatch(keys, models).predict_block(features)
+    assert np.abs(CompiledForest(keys, loaded).predict_block(features) - expected).max() < TOLERANCE
@@ -0,0 +1,195 @@
+'''
+  Concurrent weather fetching against a local Open-Meteo stub.
+
+  The stub is an `http.server` on a thread that answers like the Open-Meteo API (one
+  size-prefixed FlatBuffers message per location), so `OpenMeteoClient` runs for real
+  and only the host changes. Every hourly variable of a location is its latitude plus
+  the variable's position, which tells the frames apart.
+'''
+import time
+import asyncio
+import threading
+from concurrent.futures import wait
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import flatbuffers
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.weather_provider import OpenMeteoClient, WeatherProvider
+from scripts import weather_fetcher
+from scripts.weather_fetcher import fetch_weather, WeatherUnavailable
+
+START_DATE = '2024-01-01'
+END_DATE = '2024-01-02'
+
+
+def location_message(lat: float, lon: float, start_date: str, end_date: str, variables: list) -> bytes:
+    """One location of a weather API response, in the layout of `openmeteo_sdk.WeatherApiResponse`."""
+    hours = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1), freq='h', inclusive='left')
+    builder = flatbuffers.Builder(1024)
+    series = []
+    for i in range(len(variables)):
+        values = builder.CreateNumpyVector(np.full(len(hours), lat + i, dtype=np.float32))
+        builder.StartObject(4)
+        builder.PrependUOffsetTRelativeSlot(3, values, 0)
+        series.append(builder.EndObject())
+    builder.StartVector(4, len(series), 4)
+    for offset in reversed(series):
+        builder.PrependUOffsetTRelative(offset)
+    variables_vector = builder.EndVector()
+
+    builder.StartObject(4)
+    builder.PrependInt64Slot(0, int(hours[0].timestamp()), 0)
+    builder.PrependInt64Slot(1, int(hours[-1].timestamp()) + 3600, 0)
+    builder.PrependInt32Slot(2, 3600, 0)
+    builder.PrependUOffsetTRelativeSlot(3, variables_vector, 0)
+    hourly = builder.EndObject()
+
+    builder.StartObject(12)
+    builder.PrependFloat32Slot(0, lat, 0)
+    builder.PrependFloat32Slot(1, lon, 0)
+    builder.PrependUOffsetTRelativeSlot(11, hourly, 0)
+    builder.FinishSizePrefixed(builder.EndObject())
+    return bytes(builder.Output())
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        stub = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        with stub.lock:
+            stub.requests.append(query)
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            time.sleep(stub.delay)
+            if stub.status != 200:
+                self.send_error(stub.status)
+                return
+            lats = [float(value) for values in query['latitude'] for value in values.split(',')]
+            lons = [float(value) for values in query['longitude'] for value in values.split(',')]
+            variables = [value for values in query['hourly'] for value in values.split(',')]
+            body = b''.join(location_message(lat, lon, query['start_date'][0], query['end_date'][0], variables)
+                            for lat, lon in zip(lats, lons))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with stub.lock:
+                stub.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests, server.in_flight, server.max_in_flight = [], 0, 0
+    server.delay, server.status = 0.0, 200
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_provider(stub) -> WeatherProvider:
+    # Nothing is fresh, every fetch goes to the stub but the last response stays known
+    client = OpenMeteoClient(retries=0, base_url=stub.url)
+    return WeatherProvider(client, cache_dir=None, archive_ttl=0, forecast_ttl=0)
+
+
+def requests_for(count: int, same_dates: bool = True) -> dict:
+    """`count` stations, on the same dates or each on its own end date."""
+    requests = {}
+    for i in range(count):
+        end_date = END_DATE if same_dates else (pd.Timestamp(END_DATE) + pd.Timedelta(days=i)).strftime('%Y-%m-%d')
+        requests[f'S{i}'] = (19.0 + i / 10, -99.0, START_DATE, end_date)
+    return requests
+
+
+def test_stations_on_the_same_dates_share_one_request(stub):
+    requests = requests_for(4)
+    weather = asyncio.run(fetch_weather(make_provider(stub), requests))
+
+    assert len(stub.requests) == 1
+    assert list(weather) == list(requests)
+    for name, (lat, *_) in requests.items():
+        assert np.allclose(weather[name]['TMP'], lat)
+        assert len(weather[name]) == 48
+
+
+def test_requests_in_flight_are_bounded(stub):
+    stub.delay = 0.2
+    requests = requests_for(6, same_dates=False)
+    weather = asyncio.run(fetch_weather(make_provider(stub), requests, concurrency=2))
+
+    assert len(stub.requests) == 6
+    assert stub.max_in_flight == 2
+    assert list(weather) == list(requests)
+
+
+def wait_for_refreshes():
+    wait(list(weather_fetcher._refreshing.values()))
+
+
+def test_cached_response_is_served_while_refreshing(stub):
+    provider = make_provider(stub)
+    requests = requests_for(2)
+    fresh = asyncio.run(fetch_weather(provider, requests))
+
+    # Expired, so it is returned at once and fetched again in the background
+    stub.delay = 1.0
+    start = time.perf_counter()
+    weather = asyncio.run(fetch_weather(provider, requests))
+    assert time.perf_counter() - start < 0.5
+    for name in requests:
+        pd.testing.assert_frame_equal(weather[name], fresh[name])
+
+    # A second run while the refresh is in flight does not send another request
+    asyncio.run(fetch_weather(provider, requests))
+    wait_for_refreshes()
+    assert len(stub.requests) == 2
+
+
+def test_failed_refresh_keeps_the_cached_response(stub):
+    provider = make_provider(stub)
+    requests = requests_for(2)
+    fresh = asyncio.run(fetch_weather(provider, requests))
+
+    stub.status = 500
+    with pytest.warns(UserWarning, match='stay cached'):
+        weather = asyncio.run(fetch_weather(provider, requests))
+        wait_for_refreshes()
+    for name, (lat, lon, start_date, end_date) in requests.items():
+        pd.testing.assert_frame_equal(weather[name], fresh[name])
+        pd.testing.assert_frame_equal(provider.last_good(lat, lon, start_date, end_date), fresh[name])
+
+
+def test_uncached_station_waits_for_the_timeout(stub):
+    provider = make_provider(stub)
+    cached = requests_for(2)
+    asyncio.run(fetch_weather(provider, cached))
+    requests = {**cached, 'new': (21.0, -99.0, START_DATE, END_DATE)}
+
+    stub.delay = 2.0
+    start = time.perf_counter()
+    with pytest.raises(WeatherUnavailable, match='new'):
+        asyncio.run(fetch_weather(provider, requests, timeout=0.3))
+    assert time.perf_counter() - start < 1.5
+
+
+def test_failure_without_last_good_raises(stub):
+    stub.status = 500
+    with pytest.raises(WeatherUnavailable):
+        asyncio.run(fetch_weather(make_provider(stub), requests_for(2)))